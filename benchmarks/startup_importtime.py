@@ -0,0 +1,64 @@
+'''
+Measures how long registering the node packages takes at startup, using python -X importtime.
+
+    python benchmarks/startup_importtime.py
+
+Runs registration once with eager imports and once from the node manifest, and lists the slowest imports.
+'''
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SNIPPET = """
+from src.graph.registry import NODE_REGISTRY
+NODE_REGISTRY.use_manifest = {use_manifest}
+NODE_REGISTRY.register_modules("src/nodes")
+NODE_REGISTRY.register_modules("custom_nodes")
+"""
+
+
+def run(use_manifest: bool) -> tuple[float, list[tuple[int, str]]]:
+    start = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", SNIPPET.format(use_manifest=use_manifest)],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    elapsed = time.perf_counter() - start
+    if process.returncode != 0:
+        raise RuntimeError(process.stderr)
+
+    imports = []
+    for line in process.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, package = line[len("import time:"):].split("|")
+        # nested imports are indented by two spaces per level
+        imports.append((int(cumulative), package[1:].rstrip()))
+    return elapsed, imports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup import time of the node registry")
+    parser.add_argument("--top", type=int, default=15, help="number of slowest imports to show")
+    args = parser.parse_args()
+
+    for label, use_manifest in (("eager", False), ("manifest", True)):
+        if use_manifest:
+            # writes the manifest if it is missing or out of date
+            run(True)
+        elapsed, imports = run(use_manifest)
+        top_level = [(cumulative, package) for cumulative, package in imports if not package.startswith(" ")]
+        print(f"{label}: {elapsed:.2f}s wall, {sum(cumulative for cumulative, _ in top_level) / 1e6:.2f}s in imports, {len(imports)} modules")
+        for cumulative, package in sorted(top_level, reverse=True)[:args.top]:
+            print(f"    {cumulative / 1e6:8.3f}s  {package.strip()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+'''
+Times the Tags nodes on tag dictionaries and on a TagMatrix.
+
+    python benchmarks/tag_matrix.py --images 1000000 --list-images 100000
+
+The matrix is generated directly in CSR layout, the dictionaries are the first --list-images rows of it.
+'''
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from src.nodes.tagger.tag_matrix import TagMatrix
+from src.nodes.tagger.tags_nodes import JoinTagsNode, FilterTagsByValueNode, ConvertTagsToStringNode, FilterFilesByTagNode
+
+
+def random_matrix(images: int, tags: int, vocabulary: int, seed: int) -> TagMatrix:
+    rng = np.random.default_rng(seed)
+    counts = rng.integers(tags // 2, tags * 3 // 2 + 1, size=images)
+    indptr = np.zeros(images + 1, dtype=np.int64)
+    np.cumsum(counts, out=indptr[1:])
+    indices = rng.zipf(1.3, size=indptr[-1]) % (vocabulary - 1) + 1
+    indices[indptr[:-1]] = 0
+    values = rng.random(indptr[-1])
+    names = ["score"] + [f"tag_{column}" for column in range(1, vocabulary)]
+    # the dictionaries could not hold a tag twice
+    return TagMatrix(names, indptr, indices, values).deduplicate()
+
+
+def run_node(node_cls, **inputs) -> float:
+    node = node_cls()
+    start = time.perf_counter()
+    node.run(**{**node.default_inputs, **inputs})
+    return time.perf_counter() - start
+
+
+def benchmark(label: str, tags, other_tags, images: list[str]):
+    timings = {
+        "filter tags by value": run_node(FilterTagsByValueNode, tags=tags, tag_value=0.5, filter_mode="greater"),
+        "filter files by tag": run_node(FilterFilesByTagNode, images=images, tags=tags, tag_key="score", tag_value=0.5, filter_mode="greater"),
+        "join tags": run_node(JoinTagsNode, tags1=tags, tags2=other_tags, value_mode="max", position="value desc"),
+        "convert to string": run_node(ConvertTagsToStringNode, tags=tags, sort_mode="value desc"),
+    }
+    for name, elapsed in timings.items():
+        print(f"{label:>20} {name:>22}: {elapsed:8.3f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tags nodes on dictionaries and on a TagMatrix")
+    parser.add_argument("--images", type=int, default=1000000, help="images of the matrix")
+    parser.add_argument("--list-images", type=int, default=100000, help="images of the dictionaries")
+    parser.add_argument("--tags", type=int, default=30, help="average tags per image")
+    parser.add_argument("--vocabulary", type=int, default=10000, help="number of distinct tags")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    matrix = random_matrix(args.images, args.tags, args.vocabulary, args.seed)
+    other = random_matrix(args.images, args.tags, args.vocabulary, args.seed + 1)
+    images = [f"image_{i}.png" for i in range(args.images)]
+    print(f"{args.images} images, {matrix.nnz} tags, vocabulary of {len(matrix.vocabulary)}")
+
+    count = min(args.list_images, args.images)
+    tags = matrix.select_rows(np.arange(count)).to_dicts()
+    other_tags = other.select_rows(np.arange(count)).to_dicts()
+    benchmark(f"{count} dicts", tags, other_tags, images[:count])
+    benchmark(f"{args.images} matrix", matrix, other, images)
+
+
+if __name__ == "__main__":
+    main()
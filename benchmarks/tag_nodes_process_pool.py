@@ -0,0 +1,76 @@
+'''
+Compares the execution policies of the tag nodes on a synthetic tag-heavy workflow.
+
+    python benchmarks/tag_nodes_process_pool.py --images 20000 --tags 60
+
+Runs Load Tags From Strings -> Filter Tags By Value -> Convert Tags To String once per policy
+and checks that every policy produces the same strings.
+'''
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from src.graph.execution import execute_node, get_process_pool, worker_count
+from src.nodes.tagger.tags_nodes import LoadTagsFromStringsNode, FilterTagsByValueNode, ConvertTagsToStringNode
+
+
+def make_tag_strings(images: int, tags: int, vocabulary: int, seed: int) -> list[str]:
+    rng = random.Random(seed)
+    words = [f"tag_{i}_{rng.choice(['hair', 'eyes', 'dress', 'sky', 'smile'])}" for i in range(vocabulary)]
+    return [", ".join(rng.sample(words, tags)) for _ in range(images)]
+
+
+def run_workflow(policy: str, tag_strings: list[str]) -> tuple[float, list[str]]:
+    load = LoadTagsFromStringsNode()
+    filter_tags = FilterTagsByValueNode()
+    convert = ConvertTagsToStringNode()
+    for node in (load, filter_tags, convert):
+        node.execution_policy = policy
+
+    start = time.perf_counter()
+    tags = execute_node(load, {**load.default_inputs, "tags": tag_strings})["tags"]
+    remaining = execute_node(filter_tags, {**filter_tags.default_inputs, "tags": tags, "tag_value": 0.5})["remaining_tags"]
+    strings = execute_node(convert, {**convert.default_inputs, "tags": remaining, "sort_mode": "alphabetical asc"})["tags_string"]
+    return time.perf_counter() - start, strings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Execution policies of the tag nodes")
+    parser.add_argument("--images", type=int, default=20000, help="number of tag strings")
+    parser.add_argument("--tags", type=int, default=60, help="tags per string")
+    parser.add_argument("--vocabulary", type=int, default=5000, help="number of distinct tags")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per policy, the best one is reported")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    tag_strings = make_tag_strings(args.images, args.tags, args.vocabulary, args.seed)
+    print(f"{args.images} images x {args.tags} tags, {worker_count()} workers")
+
+    # starting the workers and importing the node modules in them is a one time cost
+    warm_up = time.perf_counter()
+    run_workflow("process", tag_strings[:1000])
+    print(f"process pool start: {time.perf_counter() - warm_up:.2f}s")
+
+    expected = None
+    for policy in ("inline", "thread", "process"):
+        best = None
+        for _ in range(args.repeat):
+            elapsed, strings = run_workflow(policy, tag_strings)
+            best = elapsed if best is None else min(best, elapsed)
+        if expected is None:
+            expected = strings
+        elif strings != expected:
+            raise RuntimeError(f"{policy} produced different results")
+        print(f"{policy:>8}: {best:.3f}s")
+
+    get_process_pool().shutdown()
+
+
+if __name__ == "__main__":
+    main()
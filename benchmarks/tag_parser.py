@@ -0,0 +1,105 @@
+'''
+Compares the shared tag parser with the previous per-tag parsing of the Load Tags nodes.
+
+    python benchmarks/tag_parser.py --captions 100000 --tags 40
+
+The captions mix plain tags with (tag), ((tag)) and (tag:weight) tags, weights are put on the first
+--weighted-vocabulary tags only, like prompts emphasizing a few styles. With weights spread over the
+whole vocabulary the weighted tag cache stops hitting and the parser is only as fast as before.
+'''
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from src.nodes.tagger.tag_parser import normalize_tag, parse_tag, parse_tags
+
+
+def previous_normalize_tag(tag: str) -> str:
+    return tag.replace("_", " ").replace("\\", "").replace("(", "\\(").replace(")", "\\)")
+
+
+def previous_parse_tag(tag: str, default_value: float = 1.0) -> tuple[str, float]:
+    # the parser of the Load Tags nodes before the shared one, with the weight passed to normalize_tag fixed
+    tag = tag.strip()
+    if not tag.startswith("(") or not tag.endswith(")"):
+        return previous_normalize_tag(tag), default_value
+
+    while tag.startswith("(") and tag.endswith(")"):
+        tag = tag[1:-1]
+        default_value *= 1.2
+
+    if ":" in tag:
+        tag, value = tag.rsplit(":", 1)
+        try:
+            default_value = float(value)
+        except ValueError:
+            pass
+    return previous_normalize_tag(tag), default_value
+
+
+def previous_parse_tags(text: str, default_value: float = 1.0) -> dict[str, float]:
+    tags = [tag for line in text.split("\n") for tag in line.split(",")]
+    return dict(previous_parse_tag(tag, default_value) for tag in tags if tag.strip())
+
+
+# prompts use a handful of weights, which keeps the number of distinct weighted tags bounded
+WEIGHTS = ("0.5", "0.8", "0.9", "1.1", "1.2", "1.3", "1.5")
+
+
+def make_captions(captions: int, tags: int, vocabulary: int, weighted: float, weighted_vocabulary: int, seed: int) -> list[str]:
+    rng = random.Random(seed)
+    words = [f"tag_{i}_{rng.choice(['hair', 'eyes', 'dress', 'sky', 'smile'])}" for i in range(vocabulary)]
+
+    def tag() -> str:
+        if rng.random() >= weighted:
+            return rng.choice(words)
+        word = rng.choice(words[:weighted_vocabulary])
+        if rng.random() < 0.5:
+            return f"({word}:{rng.choice(WEIGHTS)})"
+        return "(" * rng.randint(1, 3) + word + ")" * rng.randint(1, 3)
+
+    return [", ".join(tag() for _ in range(tags)) for _ in range(captions)]
+
+
+def timed(function, captions: list[str]) -> tuple[float, list[dict[str, float]]]:
+    start = time.perf_counter()
+    result = [function(caption) for caption in captions]
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared tag parser against the previous per-tag parser")
+    parser.add_argument("--captions", type=int, default=100000, help="number of captions")
+    parser.add_argument("--tags", type=int, default=40, help="tags per caption")
+    parser.add_argument("--vocabulary", type=int, default=20000, help="number of distinct tags")
+    parser.add_argument("--weighted", type=float, default=0.2, help="fraction of weighted tags")
+    parser.add_argument("--weighted-vocabulary", type=int, default=2000, help="number of distinct tags that get weights")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    captions = make_captions(args.captions, args.tags, args.vocabulary, args.weighted, args.weighted_vocabulary, args.seed)
+    print(f"{args.captions} captions x {args.tags} tags, vocabulary of {args.vocabulary}")
+
+    previous, expected = timed(previous_parse_tags, captions)
+    print(f"{'previous parser':>20}: {previous:.3f}s")
+
+    normalize_tag.cache_clear()
+    parse_tag.cache_clear()
+    cold, result = timed(parse_tags, captions)
+    print(f"{'shared parser':>20}: {cold:.3f}s ({previous / cold:.1f}x), cache {parse_tag.cache_info().currsize} tags")
+    warm, _ = timed(parse_tags, captions)
+    print(f"{'shared parser, warm':>20}: {warm:.3f}s ({previous / warm:.1f}x)")
+
+    # unbalanced parentheses are kept in the tag by the shared parser, the previous one dropped them
+    different = sum(result_tags != expected_tags for result_tags, expected_tags in zip(result, expected))
+    print(f"{different} captions parsed differently")
+
+
+if __name__ == "__main__":
+    main()
@@ -1 +1,3 @@
-import src.gui
\ No newline at end of file
+# node worker processes are spawned and import this module again, only the main process starts the GUI
+if __name__ == "__main__":
+    import src.gui
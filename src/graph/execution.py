@@ -0,0 +1,317 @@
+import os
+import sys
+import math
+import importlib
+import atexit
+import threading
+import multiprocessing
+from collections import OrderedDict
+from multiprocessing import shared_memory
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from .node import BaseNode
+from src.settings import SETTINGS
+
+EXECUTION_POLICIES = ("inline", "thread", "process")
+
+# smaller arrays are cheaper to pickle than to copy through a shared memory segment
+SHARED_MEMORY_MIN_BYTES = 64 * 1024
+
+# lists shorter than this are not worth splitting between workers
+MIN_CHUNK_SIZE = 64
+
+_THREAD_POOL = None
+_PROCESS_POOL = None
+_POOL_LOCK = threading.Lock()
+_IMPORTABLE_CLASSES: dict[type, bool] = {}
+
+# initialized nodes of a worker process by class and static inputs, so init() runs once per worker and not per chunk
+WORKER_NODE_CACHE_SIZE = 8
+_WORKER_NODES: OrderedDict[tuple, BaseNode] = OrderedDict()
+
+
+def worker_count() -> int:
+    workers = SETTINGS.get("process_workers", 0)
+    if workers is None or workers <= 0:
+        return os.cpu_count() or 1
+    return workers
+
+
+def get_thread_pool() -> ThreadPoolExecutor:
+    global _THREAD_POOL
+    with _POOL_LOCK:
+        if _THREAD_POOL is None:
+            _THREAD_POOL = ThreadPoolExecutor(max_workers=worker_count(), thread_name_prefix="node")
+        return _THREAD_POOL
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    '''
+    Returns the persistent worker process pool, it is started on first use and shared by all graphs.
+    Workers are spawned, so they import node modules on their first task and keep them loaded.
+    '''
+    global _PROCESS_POOL
+    with _POOL_LOCK:
+        if _PROCESS_POOL is None:
+            _PROCESS_POOL = ProcessPoolExecutor(max_workers=worker_count(), mp_context=multiprocessing.get_context("spawn"))
+        return _PROCESS_POOL
+
+
+def _discard_process_pool(pool: ProcessPoolExecutor):
+    # a worker died, the next node starts a new pool
+    global _PROCESS_POOL
+    with _POOL_LOCK:
+        if _PROCESS_POOL is pool:
+            _PROCESS_POOL = None
+
+
+def shutdown_pools(wait: bool = False):
+    '''
+    Stops the worker pools, the next node using them starts new ones with the current settings.
+    '''
+    global _THREAD_POOL, _PROCESS_POOL
+    with _POOL_LOCK:
+        thread_pool, _THREAD_POOL = _THREAD_POOL, None
+        process_pool, _PROCESS_POOL = _PROCESS_POOL, None
+    if thread_pool is not None:
+        thread_pool.shutdown(wait=wait)
+    if process_pool is not None:
+        process_pool.shutdown(wait=wait)
+
+
+atexit.register(shutdown_pools, True)
+
+
+class SharedArray:
+    '''
+    Placeholder for a NumPy array copied into a shared memory segment, only the segment name is pickled.
+    '''
+
+    def __init__(self, array: "np.ndarray"):
+        # numpy is imported where arrays are handled, the editor imports this module at startup
+        import numpy as np
+        self.shape = array.shape
+        self.dtype = array.dtype.str
+        self.memory = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+        self.name = self.memory.name
+        np.ndarray(array.shape, dtype=array.dtype, buffer=self.memory.buf)[...] = array
+
+    def __getstate__(self):
+        return {"shape": self.shape, "dtype": self.dtype, "name": self.name}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.memory = None
+
+    def load(self) -> "np.ndarray":
+        import numpy as np
+        memory = shared_memory.SharedMemory(name=self.name)
+        try:
+            return np.ndarray(self.shape, dtype=np.dtype(self.dtype), buffer=memory.buf).copy()
+        finally:
+            memory.close()
+
+    def release(self):
+        '''
+        Frees the segment, called by the process that created it once the other side has copied the array.
+        '''
+        memory = self.memory if self.memory is not None else shared_memory.SharedMemory(name=self.name)
+        memory.close()
+        memory.unlink()
+
+
+def share_arrays(value, shared: list[SharedArray]):
+    '''
+    Replaces large NumPy arrays in nested lists, tuples and dicts with SharedArray placeholders.
+    '''
+    # without numpy loaded there are no arrays to share
+    np = sys.modules.get("numpy")
+    if np is not None and isinstance(value, np.ndarray) and value.dtype != object and value.nbytes >= SHARED_MEMORY_MIN_BYTES:
+        array = SharedArray(value)
+        shared.append(array)
+        return array
+    if isinstance(value, list):
+        return [share_arrays(item, shared) for item in value]
+    if isinstance(value, tuple):
+        return tuple(share_arrays(item, shared) for item in value)
+    if isinstance(value, dict):
+        return {key: share_arrays(item, shared) for key, item in value.items()}
+    return value
+
+
+def load_arrays(value, shared: list[SharedArray]):
+    '''
+    Inverse of share_arrays(), collects the placeholders so their segments can be released.
+    '''
+    if isinstance(value, SharedArray):
+        shared.append(value)
+        return value.load()
+    if isinstance(value, list):
+        return [load_arrays(item, shared) for item in value]
+    if isinstance(value, tuple):
+        return tuple(load_arrays(item, shared) for item in value)
+    if isinstance(value, dict):
+        return {key: load_arrays(item, shared) for key, item in value.items()}
+    return value
+
+
+def _release(shared: list[SharedArray]):
+    for array in shared:
+        try:
+            array.release()
+        except FileNotFoundError:
+            pass
+
+
+def _import_class(module_name: str, qualname: str) -> type[BaseNode]:
+    value = importlib.import_module(module_name)
+    for name in qualname.split("."):
+        value = getattr(value, name)
+    return value
+
+
+def _worker_node(module_name: str, qualname: str, node_cls: type, static_inputs: dict) -> BaseNode:
+    # a worker runs one task at a time, the cache needs no lock
+    key = (module_name, qualname, repr(sorted(static_inputs.items())))
+    node = _WORKER_NODES.get(key)
+    if node is not None:
+        _WORKER_NODES.move_to_end(key)
+        return node
+
+    node = node_cls()
+    node.static_inputs.update(static_inputs)
+    node.init()
+    _WORKER_NODES[key] = node
+    if len(_WORKER_NODES) > WORKER_NODE_CACHE_SIZE:
+        _WORKER_NODES.popitem(last=False)
+    return node
+
+
+def _run_in_worker(module_name: str, qualname: str, static_inputs: dict, inputs: dict) -> dict:
+    # the class is imported here rather than unpickled, an import error then fails the node instead of the worker
+    node_cls = _import_class(module_name, qualname)
+
+    received = []
+    inputs = load_arrays(inputs, received)
+
+    node = _worker_node(module_name, qualname, node_cls, static_inputs)
+    result = node.run(**inputs)
+
+    # input segments are freed by the caller once this returns, output segments after it loaded them
+    return share_arrays(result, [])
+
+
+def _is_importable(node_cls: type) -> bool:
+    importable = _IMPORTABLE_CLASSES.get(node_cls)
+    if importable is None:
+        # workers import __main__ under another name, so classes defined there cannot be found
+        try:
+            importable = node_cls.__module__ != "__main__" and _import_class(node_cls.__module__, node_cls.__qualname__) is node_cls
+        except (ImportError, AttributeError):
+            importable = False
+        if not importable:
+            print(f"{node_cls.name()} cannot be imported by worker processes, running it inline")
+        _IMPORTABLE_CLASSES[node_cls] = importable
+    return importable
+
+
+def split_inputs(node: BaseNode, inputs: dict, parts: int) -> list[dict]:
+    '''
+    Splits the inputs listed in node.split_inputs into at most parts chunks of consecutive items.
+    Returns the inputs unchanged as a single chunk if they cannot be split.
+    '''
+    names = [name for name in node.split_inputs if name in inputs]
+    if len(names) == 0 or parts <= 1:
+        return [inputs]
+
+    values = [inputs[name] for name in names]
+    if not all(isinstance(value, list) for value in values):
+        return [inputs]
+    length = len(values[0])
+    if any(len(value) != length for value in values):
+        return [inputs]
+
+    parts = min(parts, length // MIN_CHUNK_SIZE)
+    if parts <= 1:
+        return [inputs]
+
+    size = math.ceil(length / parts)
+    return [{**inputs, **{name: value[start:start + size] for name, value in zip(names, values)}} for start in range(0, length, size)]
+
+
+def merge_results(results: list[dict]) -> dict:
+    '''
+    Concatenates list outputs of the chunks in order, as well as outputs whose type has a concatenate() classmethod
+    taking the list of chunk values, like TagMatrix. Other outputs are taken from the first chunk.
+    '''
+    if len(results) == 1:
+        return results[0]
+
+    merged = {}
+    for name, value in results[0].items():
+        values = [result.get(name) for result in results]
+        if all(isinstance(item, list) for item in values):
+            merged[name] = [item for chunk in values for item in chunk]
+        elif value is not None and hasattr(type(value), "concatenate") and all(type(item) is type(value) for item in values):
+            merged[name] = type(value).concatenate(values)
+        else:
+            merged[name] = value
+    return merged
+
+
+def execute_node(node: BaseNode, inputs: dict) -> dict:
+    '''
+    Runs the node according to its execution_policy.
+
+    - inline: run() is called on the graph thread
+    - thread: run() is called on the shared thread pool, once per chunk of split_inputs
+    - process: run() is called on a new instance of the node in the worker process pool, once per chunk of split_inputs
+
+    Inputs that give a single chunk are run inline with both pool policies.
+    '''
+    policy = node.execution_policy
+    if policy == "inline":
+        return node.run(**inputs)
+
+    if policy == "thread":
+        chunks = split_inputs(node, inputs, worker_count())
+        if len(chunks) == 1:
+            return node.run(**inputs)
+        pool = get_thread_pool()
+        futures = [pool.submit(node.run, **chunk) for chunk in chunks]
+        return merge_results([future.result() for future in futures])
+
+    if policy == "process":
+        node_cls = type(node)
+        chunks = split_inputs(node, inputs, worker_count())
+        # a single chunk would only add the round trip to a worker
+        if len(chunks) == 1 or not _is_importable(node_cls):
+            return node.run(**inputs)
+
+        pool = get_process_pool()
+        shared = []
+        try:
+            chunks = [share_arrays(chunk, shared) for chunk in chunks]
+            futures = [pool.submit(_run_in_worker, node_cls.__module__, node_cls.__qualname__, node.static_inputs, chunk) for chunk in chunks]
+            results = []
+            error = None
+            # wait for every chunk, so no output segment is left behind when one of them fails
+            for future in futures:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    if isinstance(e, BrokenProcessPool):
+                        _discard_process_pool(pool)
+                    error = error or e
+                    continue
+                received = []
+                results.append(load_arrays(result, received))
+                _release(received)
+            if error is not None:
+                raise error
+        finally:
+            _release(shared)
+        return merge_results(results)
+
+    raise ValueError(f"Unknown execution policy {policy} of {node.name()}, expected one of {', '.join(EXECUTION_POLICIES)}")
@@ -3,16 +3,34 @@ if __name__ == "__main__":
     sys.path.append("src")
 
 from .node import BaseNode, AttributeKind, BaseNodeEvent
+from .registry import NODE_REGISTRY
+from .execution import execute_node
+from src.settings import SETTINGS
 from src.nodes.unknown_node import UnknownNode
 
 import yaml
 # import multiprocessing
 import threading
 import os
-import importlib
 import queue
 import time
-from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import marshal
+from concurrent.futures import ThreadPoolExecutor, Future, wait
+
+try:
+    from yaml import CSafeLoader as _SafeLoader
+except ImportError:
+    from yaml import SafeLoader as _SafeLoader
+
+
+class GraphLoader(_SafeLoader):
+    '''
+    Safe YAML loader, backed by libyaml when available, that also reads tuples written by yaml.dump.
+    '''
+
+
+GraphLoader.add_constructor("tag:yaml.org,2002:python/tuple", lambda loader, node: tuple(loader.construct_sequence(node)))
 
 class GraphException(Exception):
     def __init__(self, message: str):
@@ -46,7 +64,8 @@ class Graph:
     def __init__(self):
         self.nodes: dict[str, BaseNode] = {}
         self.connections: dict[str, Connection] = {}
-        self.available_nodes: dict[str, lambda: BaseNode] = {}
+        # shared by reference between all graphs
+        self.available_nodes: dict[str, lambda: BaseNode] = NODE_REGISTRY.nodes
 
         self.on_connection_added = BaseNodeEvent()
         self.on_connection_removed = BaseNodeEvent()
@@ -67,42 +86,34 @@ class Graph:
         self.__nodes_with_unfinished_generator_outputs = set()
 
         self.__running = False
+        self.__run_error = None
+
+        self.__node_names: dict[BaseNode, str] = {}
+        self.__input_connections: dict[str, list[Connection]] = {}
+        self.__output_connections: dict[str, list[Connection]] = {}
 
         self.__thread_executor = ThreadPoolExecutor()
+        self.__init_executor = ThreadPoolExecutor(max_workers=self.__max_concurrency, thread_name_prefix="init")
+        self.__preload_executor = ThreadPoolExecutor(max_workers=self.__max_concurrency, thread_name_prefix="preload")
+        self.__init_futures: dict[BaseNode, Future] = {}
+        # inits still loading when a run stopped, the next init of the node waits for them
+        self.__abandoned_init_futures: dict[BaseNode, Future] = {}
+        self.__stopped = threading.Event()
+        self.__run_id = 0
+        self.__preload_futures: dict[BaseNode, Future] = {}
 
 
     def is_running(self) -> bool:
         return self.__running
 
     def register_nodes(self, nodes: list[BaseNode]):
-        for node in nodes:
-            self.register_node(node)
+        NODE_REGISTRY.register_nodes(nodes)
 
     def register_modules(self, root_directory: str, module_prefix: str = None):
-
-        if module_prefix is None:
-            module_prefix = root_directory.replace("/", ".").replace("\\", ".")
-
-        # iterate over all folders in root_directory
-        for directory in os.listdir(root_directory):
-            if not os.path.isdir(os.path.join(root_directory, directory)):
-                continue
-
-            if not os.path.exists(os.path.join(root_directory, directory, "__init__.py")):
-                continue
-
-            if directory.startswith("__"):
-                continue
-
-            module_name = f"{module_prefix}.{directory}"
-            spec = importlib.util.spec_from_file_location(module_name, os.path.join(root_directory, directory, "__init__.py"))
-            module = importlib.util.module_from_spec(spec)
-            spec.loader.exec_module(module)
-            if hasattr(module, "register_nodes"):
-                self.register_nodes(module.register_nodes())
+        NODE_REGISTRY.register_modules(root_directory, module_prefix)
             
     def register_node(self, node_cls):
-        self.available_nodes[node_cls.name()] = node_cls
+        NODE_REGISTRY.register_node(node_cls)
 
     def get_unique_node_name(self, node: BaseNode) -> str:
         counter = 0
@@ -140,7 +151,7 @@ class Graph:
         node_name = node if isinstance(node, str) else self.get_node_name(node)
         return [connection for connection in self.connections.values() if connection.input_node_name == node_name]
 
-    def can_add_connection(self, output_node: BaseNode|str, output_name: str, input_node: BaseNode|str, input_name: str) -> tuple[bool, str|None]:
+    def can_add_connection(self, output_node: BaseNode|str, output_name: str, input_node: BaseNode|str, input_name: str, check_loop: bool = True) -> tuple[bool, str|None]:
         output_node_name = output_node if isinstance(output_node, str) else self.get_node_name(output_node)
         if output_node_name is None or output_node_name not in self.nodes:
             return (False, f"Output node not found: {output_node_name}")
@@ -151,23 +162,25 @@ class Graph:
         
         # check if nodes has the output and input names
         output_node = self.nodes[output_node_name]
-        if output_name not in output_node.output_definitions:
+        output_definitions = output_node.get_output_definitions()
+        if output_name not in output_definitions:
             return (False, f"Output name not found: {output_name} in {output_node_name}")
         
         input_node = self.nodes[input_node_name]
-        if input_name not in input_node.input_definitions:
+        input_definitions = input_node.get_input_definitions()
+        if input_name not in input_definitions:
             return (False, f"Input name not found: {input_name} in {input_node_name}")
         
         if input_node == output_node:
             return (False, f"Cannot connect node to itself")
         
         # check if in loop
-        if self.check_if_loop(input_node, output_node):
+        if check_loop and self.check_if_loop(input_node_name, output_node_name):
             return (False, f"Loop detected")
         
         # check if valid attribute types
-        output_type = output_node.output_definitions[output_name]
-        input_type = input_node.input_definitions[input_name]
+        output_type = output_definitions[output_name]
+        input_type = input_definitions[input_name]
 
         can_connect = input_type.can_connect(output_type)
         if not can_connect:
@@ -175,21 +188,56 @@ class Graph:
         
         return (True, None)
     
-    def check_if_loop(self, node: BaseNode|str, target_node: BaseNode|str, visited_nodes: list[BaseNode] = []) -> bool:
+    def check_if_loop(self, node: BaseNode|str, target_node: BaseNode|str, visited_nodes: set[str] | None = None) -> bool:
+        '''
+        Returns whether target_node can be reached from node by following output connections.
+        '''
         node_name = node if isinstance(node, str) else self.get_node_name(node)
         target_node_name = target_node if isinstance(target_node, str) else self.get_node_name(target_node)
-        visited_nodes.append(node_name)
+        visited_nodes = set() if visited_nodes is None else visited_nodes
 
-        connections = self.get_output_connections_for_node(node_name)
-        for connection in connections:
-            if connection.input_node_name == target_node_name:
-                return True
-            if connection.input_node_name not in visited_nodes:
-                if self.check_if_loop(connection.input_node_name, target_node_name, visited_nodes):
+        outputs: dict[str, list[str]] = {}
+        for connection in self.connections.values():
+            outputs.setdefault(connection.output_node_name, []).append(connection.input_node_name)
+
+        stack = [node_name]
+        while len(stack) > 0:
+            name = stack.pop()
+            if name in visited_nodes:
+                continue
+            visited_nodes.add(name)
+            for input_node_name in outputs.get(name, []):
+                if input_node_name == target_node_name:
                     return True
+                stack.append(input_node_name)
         
         return False
 
+    @staticmethod
+    def find_nodes_in_loops(node_names: list[str], connections: list[Connection]) -> set[str]:
+        '''
+        Topologically sorts the nodes with Kahn's algorithm.
+
+        Returns:
+            set: names of nodes that are in a loop or downstream of one, empty if the graph has no loops
+        '''
+        in_degree = {name: 0 for name in node_names}
+        outputs: dict[str, list[str]] = {}
+        for connection in connections:
+            outputs.setdefault(connection.output_node_name, []).append(connection.input_node_name)
+            in_degree[connection.input_node_name] = in_degree.get(connection.input_node_name, 0) + 1
+
+        ready = [name for name, degree in in_degree.items() if degree == 0]
+        while len(ready) > 0:
+            name = ready.pop()
+            del in_degree[name]
+            for input_node_name in outputs.get(name, []):
+                in_degree[input_node_name] -= 1
+                if in_degree[input_node_name] == 0:
+                    ready.append(input_node_name)
+
+        return set(in_degree)
+
 
     def add_connection(self, output_node: BaseNode|str, output_name: str, input_node: BaseNode|str, input_name: str):
         
@@ -294,10 +342,41 @@ class Graph:
             yaml.dump(data, file)
 
 
-    def load_from_file(self, file_path: str):
+    @staticmethod
+    def read_graph_file(file_path: str, use_cache: bool = False) -> dict:
+        '''
+        Parses a graph file. With use_cache the parsed data is also stored in <file_path>.cache,
+        keyed by the hash of the file, and read from there while the file is unchanged.
+        '''
+        with open(file_path, "rb") as file:
+            content = file.read()
+
+        cache_path = file_path + ".cache"
+        digest = hashlib.sha1(content).hexdigest()
+        if use_cache and os.path.exists(cache_path):
+            try:
+                with open(cache_path, "rb") as file:
+                    cached = marshal.load(file)
+                if cached.get("hash") == digest:
+                    return cached["data"]
+            except Exception:
+                pass
+
+        data = yaml.load(content, Loader=GraphLoader)
+
+        if use_cache:
+            try:
+                with open(cache_path, "wb") as file:
+                    marshal.dump({"hash": digest, "data": data}, file)
+            except (OSError, ValueError) as e:
+                print(f"Could not cache graph {file_path}: {e}")
+        return data
+
+    def load_from_file(self, file_path: str, use_cache: bool | None = None):
 
-        with open(file_path, "r") as file:
-            data = yaml.load(file, Loader=yaml.FullLoader)
+        if use_cache is None:
+            use_cache = SETTINGS.get("graph_cache", False)
+        data = self.read_graph_file(file_path, use_cache)
 
         for name, node_data in data["nodes"].items():
             node: BaseNode = self.available_nodes.get(node_data.get("type"), UnknownNode)()
@@ -308,18 +387,28 @@ class Graph:
             self.nodes[name] = node
             self.on_node_added.trigger(node)
 
+        connections: dict[str, Connection] = {}
         for key, connection_data in data["connections"].items():
             connection = Connection()
             try:
                 connection.load_from_dict(connection_data)
+                connections[key] = connection
+            except Exception as e:
+                self.on_error.trigger(e)
 
-                # check if can add connection
-                output_node = self.get_node_by_name(connection.output_node_name)
-                input_node = self.get_node_by_name(connection.input_node_name)
-                can_connect, error = self.can_add_connection(output_node, connection.output_name, input_node, connection.input_name)
+        # sort once for the whole graph, only connections between nodes left over by the sort can close a loop
+        nodes_in_loops = self.find_nodes_in_loops(list(self.nodes), [connection for connection in connections.values() if connection.output_node_name in self.nodes and connection.input_node_name in self.nodes])
+
+        for key, connection in connections.items():
+            try:
+                can_connect, error = self.can_add_connection(connection.output_node_name, connection.output_name, connection.input_node_name, connection.input_name, check_loop=False)
                 if not can_connect:
                     raise GraphException(error)
 
+                if connection.output_node_name in nodes_in_loops and connection.input_node_name in nodes_in_loops:
+                    if self.check_if_loop(connection.input_node_name, connection.output_node_name):
+                        raise GraphException("Loop detected")
+
                 self.connections[key] = connection
             except Exception as e:
                 self.on_error.trigger(e)
@@ -337,16 +426,16 @@ class Graph:
 
     def __mark_loop_as_finished(self, node: BaseNode):
         # get output connections
-        output_connections = self.get_output_connections_for_node(node)
+        output_connections = self.__output_connections[self.__node_names[node]]
 
         # if any ot the output is generator with unfinished input, mark it as finished
         # and remove it from the list
         # else, continue with loop
         for connection in output_connections:
-            input_node = self.get_node_by_name(connection.input_node_name)
-            if connection.input_name in input_node.input_definitions:
-                definition = input_node.input_definitions[connection.input_name]
-                if definition.kind == AttributeKind.GENERATOR:
+            input_node = self.nodes[connection.input_node_name]
+            kind = input_node.input_kinds.get(connection.input_name)
+            if kind is not None:
+                if kind == AttributeKind.GENERATOR:
                     if connection.input_node_name in self.__nodes_with_unfinished_generator_inputs:
                         self.__nodes_with_unfinished_generator_inputs.remove(connection.input_node_name)
 
@@ -359,18 +448,18 @@ class Graph:
                     self.__mark_loop_as_finished(input_node)
 
     def __mark_loop_as_unfinished(self, node: BaseNode, remove_results: bool = False):
-        name = self.get_node_name(node)
+        name = self.__node_names[node]
         if name in self._run_results and remove_results:
             del self._run_results[name]
 
         # get output connections
-        output_connections = self.get_output_connections_for_node(node)
+        output_connections = self.__output_connections[name]
 
         for connection in output_connections:
-            input_node = self.get_node_by_name(connection.input_node_name)
-            if connection.input_name in input_node.input_definitions:
-                definition = input_node.input_definitions[connection.input_name]
-                if definition.kind == AttributeKind.GENERATOR:
+            input_node = self.nodes[connection.input_node_name]
+            kind = input_node.input_kinds.get(connection.input_name)
+            if kind is not None:
+                if kind == AttributeKind.GENERATOR:
                     if connection.input_node_name not in self.__nodes_with_unfinished_generator_inputs:
                         self.__mark_loop_as_unfinished(input_node, True)
                 else:
@@ -379,16 +468,19 @@ class Graph:
     def __run_node(self, node: BaseNode, inputs_override: dict[str, any] = {}):
         
        
-        node_name = self.get_node_name(node)
+        node_name = self.__node_names[node]
+        if not self.__wait_for_init(node):
+            raise GraphException(f"{node_name} failed to initialize")
+        input_connections = self.__input_connections[node_name]
 
         # get input data
         input_data = node.default_inputs.copy()
-        for connection in self.get_input_connections_for_node(node):
+        for connection in input_connections:
 
             output_data = self._run_results.get(connection.output_node_name, None)
 
             if connection.output_node_name in self._run_results and len(output_data) == 0:
-                self.__run_node(self.get_node_by_name(connection.output_node_name))
+                self.__run_node(self.nodes[connection.output_node_name])
 
             output_data = self._run_results.get(connection.output_node_name, {}).get(connection.output_name, BaseNode.GeneratorExit())
             input_data[connection.input_name] = output_data
@@ -396,11 +488,11 @@ class Graph:
         input_data.update(inputs_override)
 
         # run node
-        result = node.run(**input_data)
+        result = execute_node(node, input_data)
         self._run_results[node_name] = result
 
-        for name, definition in node.output_definitions.items():
-            if definition.kind == AttributeKind.GENERATOR:
+        for name, kind in node.output_kinds.items():
+            if kind == AttributeKind.GENERATOR:
                 output_result = result[name]
                 if output_result != BaseNode.GeneratorExit():
                     self.__nodes_with_unfinished_generator_outputs.add(node_name)
@@ -409,8 +501,8 @@ class Graph:
                     self.__nodes_with_unfinished_generator_outputs.remove(node_name)
                     self.__mark_loop_as_finished(node)
 
-        for name, definition in node.input_definitions.items():
-            if definition.kind == AttributeKind.GENERATOR:
+        for name, kind in node.input_kinds.items():
+            if kind == AttributeKind.GENERATOR:
                 input_result = input_data[name]
                 if input_result != BaseNode.GeneratorExit():
                     self.__nodes_with_unfinished_generator_inputs.add(node_name)
@@ -418,19 +510,17 @@ class Graph:
                     self.__nodes_with_unfinished_generator_inputs.remove(node_name)
 
         # clear non cacheable input nodes
-        for connection in self.get_input_connections_for_node(node):
-            if not self.get_node_by_name(connection.output_node_name).cache:
+        for connection in input_connections:
+            if not self.nodes[connection.output_node_name].cache:
                 self._run_results[connection.output_node_name] = {}
 
         return result
 
     def __can_run_node(self, node: BaseNode) -> bool:
-        for connection in self.get_input_connections_for_node(node):
-            output_node = self.get_node_by_name(connection.output_node_name)
-            input_node = self.get_node_by_name(connection.input_node_name)
+        for connection in self.__input_connections[self.__node_names[node]]:
+            output_node = self.nodes[connection.output_node_name]
 
-            definition = input_node.input_definitions[connection.input_name]
-            if definition.kind == AttributeKind.EVENT:
+            if node.input_kinds[connection.input_name] == AttributeKind.EVENT:
                 continue
 
             if connection.output_node_name not in self._run_results:
@@ -451,8 +541,26 @@ class Graph:
             
         return True
     
+    def __prepare_run(self):
+        '''
+        Precomputes node names, connections per node and attribute kinds used by the scheduler.
+        '''
+        self.__node_names = {node: name for name, node in self.nodes.items()}
+        self.__input_connections = {name: [] for name in self.nodes}
+        self.__output_connections = {name: [] for name in self.nodes}
+        for connection in self.connections.values():
+            if connection.input_node_name in self.__input_connections:
+                self.__input_connections[connection.input_node_name].append(connection)
+            if connection.output_node_name in self.__output_connections:
+                self.__output_connections[connection.output_node_name].append(connection)
+
+        for node in self.nodes.values():
+            node.invalidate_definitions()
+
     def __run(self):
 
+        self.__prepare_run()
+
         # get all staring nodes
         run_queue = queue.Queue()
         scheduled_nodes = set()
@@ -460,26 +568,60 @@ class Graph:
         iteration_counter = 0
 
         for node in self.nodes.values():
-            if len(self.get_input_connections_for_node(node)) == 0:
+            node_name = self.__node_names[node]
+            if len(self.__input_connections[node_name]) == 0:
                 run_queue.put(node)
-                node_name = self.get_node_name(node)
                 nodes_priority[node_name] = iteration_counter
 
-        # init nodes
-        for node in self.nodes.values():
-            if not self.__running:
-                return
-            
-            try:
-                if not node.lazy_init:
-                    node._on_init.trigger()
-                    node.init()
-                    node._on_init_finished.trigger()
-            except Exception as e:
+        # init nodes concurrently, every node only waits for its own init when it is dequeued
+        run_id = self.__run_id
+        self.__init_futures = {node: self.__init_executor.submit(self.__init_node, node, run_id) for node in self.nodes.values() if not node.lazy_init}
+        try:
+            self.__run_queue(run_queue, scheduled_nodes, nodes_priority, iteration_counter)
+        finally:
+            # a stopped run does not wait for model loads, inits that did not start are dropped
+            for node, future in self.__init_futures.items():
+                if not future.cancel() and not future.done():
+                    self.__abandoned_init_futures[node] = future
+            self.__init_futures = {}
+
+    def __init_node(self, node: BaseNode, run_id: int) -> bool:
+        for futures in (self.__preload_futures, self.__abandoned_init_futures):
+            pending = futures.pop(node, None)
+            if pending is not None:
+                wait([pending])
+
+        if not self.__running or run_id != self.__run_id:
+            return False
+
+        try:
+            node._on_init.trigger()
+            node.init()
+            node._on_init_finished.trigger()
+            return True
+        except Exception as e:
+            node._on_error.trigger(e)
+            # an init abandoned by a stopped run must not stop the next run
+            if run_id == self.__run_id:
                 self.on_error.trigger(e)
-                node._on_error.trigger(e)
+                self.__run_error = e
                 self.__running = False
-                break
+                self.__stopped.set()
+            return False
+
+    def __wait_for_init(self, node: BaseNode) -> bool:
+        '''
+        Waits for the init of the given node only, returns False if it failed or the run was stopped meanwhile.
+        '''
+        future = self.__init_futures.get(node)
+        if future is None:
+            return True
+        while not future.done():
+            if self.__stopped.wait(0.05):
+                return False
+        return not future.cancelled() and future.result()
+
+    def __run_queue(self, run_queue: queue.Queue, scheduled_nodes: set, nodes_priority: dict[str, int], iteration_counter: int):
 
         # run nodes
         while not run_queue.empty() and self.__running:
@@ -487,11 +629,14 @@ class Graph:
             iteration_counter += 1
 
             node: BaseNode = run_queue.get()
-            node_name = self.get_node_name(node)
+            node_name = self.__node_names[node]
 
             if node in scheduled_nodes:
                 scheduled_nodes.remove(node)
 
+            if not self.__wait_for_init(node):
+                break
+
             try:
 
                 node._on_run.trigger()
@@ -500,12 +645,13 @@ class Graph:
                 node._on_run_finished.trigger()
             except Exception as e:
                 node._on_error.trigger(e)
+                self.__run_error = e
                 self.__running = False
                 break
 
-            for connection in self.get_output_connections_for_node(node):
-                input_node = self.get_node_by_name(connection.input_node_name)
-                input_node_name = self.get_node_name(input_node)
+            for connection in self.__output_connections[node_name]:
+                input_node = self.nodes[connection.input_node_name]
+                input_node_name = connection.input_node_name
                 scheduled_nodes.add(input_node)
                 if input_node_name not in nodes_priority:
                     nodes_priority[input_node_name] = iteration_counter
@@ -514,7 +660,7 @@ class Graph:
 
             if run_queue.qsize() == 0:
                 # sort nodes by priority descending
-                sorted_nodes = sorted(scheduled_nodes, key=lambda x: -nodes_priority[self.get_node_name(x)])
+                sorted_nodes = sorted(scheduled_nodes, key=lambda x: -nodes_priority[self.__node_names[x]])
 
                 # add nodes to queue
                 for node in sorted_nodes:
@@ -527,7 +673,7 @@ class Graph:
                 max_priority = -1
                 max_node = None
                 for node_name in self.__nodes_with_unfinished_generator_outputs:
-                    node = self.get_node_by_name(node_name)
+                    node = self.nodes[node_name]
                     if nodes_priority[node_name] > max_priority:
                         max_priority = nodes_priority[node_name]
                         max_node = node
@@ -538,36 +684,109 @@ class Graph:
 
     
 
-    def run(self):
+    def __start(self):
         if self.__running:
             raise GraphException("Graph is already running")
-        
-        if self.__thread_executor._work_queue.qsize() > 0:
-            raise GraphException("Graph is already running")
             
         self._run_results = {}
         self.__nodes_with_unfinished_generator_inputs = set()
         self.__nodes_with_unfinished_generator_outputs = set()
+        self.__run_error = None
         self.__running = True
+        self.__run_id += 1
+        self.__stopped.clear()
+
+    def __execute(self) -> Exception | None:
+        try:
+            self.on_graph_started.trigger()
+            self.__run()
+        except Exception as e:
+            self.on_error.trigger(e)
+            self.__run_error = e
+        finally:
+            for node in self.nodes.values():
+                try:
+                    node._on_graph_finished.trigger()
+                except Exception as e:
+                    node._on_error.trigger(e)
+            self.on_graph_stopped.trigger()
+            self._run_results = {}
+            self.__running = False
+            self.__nodes_with_unfinished_generator_inputs = set()
+            self.__nodes_with_unfinished_generator_outputs = set()
+        return self.__run_error
+
+    def run(self) -> Future:
+        '''
+        Runs the graph on a worker thread.
+
+        Returns:
+            Future: completed when the graph stops, with the exception of the first failing node if any
+        '''
+        if self.__thread_executor._work_queue.qsize() > 0:
+            raise GraphException("Graph is already running")
 
+        self.__start()
+        future = Future()
 
         def run():
+            error = self.__execute()
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(None)
+
+        self.__thread_executor.submit(run)
+        return future
+
+    def run_inline(self):
+        '''
+        Runs the graph on the calling thread and raises the exception of the first failing node.
+        '''
+        self.__start()
+        error = self.__execute()
+        if error is not None:
+            raise error
+
+    def preload(self) -> list[Future]:
+        '''
+        Calls init() in the background for nodes that support preloading, so their models
+        are loaded while the graph is edited. A run waits for a node's preload before its own init().
+        '''
+        if self.__running:
+            return []
+
+        def preload(node: BaseNode):
             try:
-                self.on_graph_started.trigger()
-                self.__run()
+                node.init()
             except Exception as e:
-                self.on_error.trigger(e)
+                node._on_error.trigger(e)
             finally:
-                self.on_graph_stopped.trigger()
-                self._run_results = {}
-                self.__running = False
-                self.__nodes_with_unfinished_generator_inputs = set()
-                self.__nodes_with_unfinished_generator_outputs = set()
+                # nothing runs after a preload, let the node release what it only holds while running
+                node._on_graph_finished.trigger()
 
-        self.__thread_executor.submit(run)
+        futures = []
+        for node in self.nodes.values():
+            if not node.preload_init:
+                continue
+            pending = self.__preload_futures.get(node)
+            if pending is not None and not pending.done():
+                continue
+            self.__preload_futures[node] = self.__preload_executor.submit(preload, node)
+            futures.append(self.__preload_futures[node])
+        return futures
 
     def stop(self):
         if not self.__running:
             return
         
         self.__running = False
+        self.__stopped.set()
+        for future in self.__init_futures.values():
+            future.cancel()
+
+        for node in self.nodes.values():
+            try:
+                node._on_stop.trigger()
+            except Exception as e:
+                node._on_error.trigger(e)
@@ -700,9 +700,27 @@ class BaseNode:
     - init(): called once before graph execution
     - cache: returns whether the node should cache its outputs
 
+    You can also set the following class attributes:
+
+    - execution_policy: "inline" (default) runs the node on the graph thread, "thread" on a thread pool
+      and "process" in a worker process, see src/graph/execution.py
+    - split_inputs: list inputs whose items are processed independently, so "thread" and "process" nodes
+      can split them between workers and concatenate their list outputs in order
+
     You can also override constructor to set default values for inputs and metadata but it cannot have any other arguments.
     '''
 
+    execution_policy: str = "inline"
+    '''
+    Where run() is called. "process" nodes are constructed again in a worker process from their class and static inputs,
+    so their run() must only depend on its inputs and static inputs and must not touch the UI.
+    '''
+
+    split_inputs: tuple[str, ...] = ()
+    '''
+    Names of list inputs that can be split into chunks of consecutive items for "thread" and "process" nodes.
+    '''
+
     def __init__(self):
 
         self.default_inputs = {}
@@ -792,6 +810,24 @@ class BaseNode:
             error: exception that occurred during the node execution
         '''
 
+        self._on_stop = BaseNodeEvent()
+        '''
+        Event triggered when the graph execution is stopped.
+        You can register callbacks to this event to cancel long running work such as model generation.
+
+        Args:
+            None
+        '''
+
+        self._on_graph_finished = BaseNodeEvent()
+        '''
+        Event triggered after the graph execution ends, whether it finished, failed or was stopped.
+        You can register callbacks to this event to release resources that are only needed while the graph runs.
+
+        Args:
+            None
+        '''
+
         self._on_refresh = BaseNodeEvent()
         '''
         Event triggered when the node UI should be refreshed.
@@ -872,6 +908,18 @@ class BaseNode:
 
         return False
 
+    @property
+    def preload_init(self) -> bool:
+        '''
+        Returns whether init() can be called in the background when a graph is opened, before it runs.
+        You can override this method to return True for nodes that load models in init() and keep them between runs.
+
+        Returns:
+            bool: whether the node can be preloaded
+        '''
+
+        return False
+
     @property
     def input_definitions(self) -> dict[str, AttributeDefinition]:
         '''
@@ -910,6 +958,53 @@ class BaseNode:
             dict[str, AttributeDefinition]: dictionary with static input definitions
         '''
         return {}
+
+    def __cached(self, key: str, build):
+        cache = self.__dict__.setdefault("_definitions_cache", {})
+        value = cache.get(key)
+        if value is None:
+            value = cache[key] = build()
+        return value
+
+    def get_input_definitions(self) -> dict[str, AttributeDefinition]:
+        '''
+        Returns input_definitions, cached until invalidate_definitions() is called.
+        Used by the graph, which reads the definitions for every executed node.
+
+        Returns:
+            dict[str, AttributeDefinition]: dictionary with input definitions
+        '''
+        return self.__cached("inputs", lambda: self.input_definitions)
+
+    def get_output_definitions(self) -> dict[str, AttributeDefinition]:
+        '''
+        Returns output_definitions, cached until invalidate_definitions() is called.
+
+        Returns:
+            dict[str, AttributeDefinition]: dictionary with output definitions
+        '''
+        return self.__cached("outputs", lambda: self.output_definitions)
+
+    @property
+    def input_kinds(self) -> dict[str, AttributeKind]:
+        '''
+        Returns the kind of every input, cached until invalidate_definitions() is called.
+        '''
+        return self.__cached("input_kinds", lambda: {name: definition.kind for name, definition in self.get_input_definitions().items()})
+
+    @property
+    def output_kinds(self) -> dict[str, AttributeKind]:
+        '''
+        Returns the kind of every output, cached until invalidate_definitions() is called.
+        '''
+        return self.__cached("output_kinds", lambda: {name: definition.kind for name, definition in self.get_output_definitions().items()})
+
+    def invalidate_definitions(self):
+        '''
+        Clears the cached definitions. Called by refresh_ui(), set_static_input() and load_from_dict(),
+        call it yourself if definitions change in any other way.
+        '''
+        self.__dict__["_definitions_cache"] = {}
     
     @property
     def help(self) -> str:
@@ -955,6 +1050,7 @@ class BaseNode:
         self.default_inputs = {**self.default_inputs, **data.get("default_inputs", {})}
         self.default_outputs = {**self.default_outputs, **data.get("default_outputs", {})}
         self.metadata = data.get("metadata", {})
+        self.invalidate_definitions()
     
     @classmethod
     def name(cls) -> str:
@@ -990,6 +1086,7 @@ class BaseNode:
         '''
 
         self.static_inputs[input_name] = value
+        self.invalidate_definitions()
 
     def set_default_input(self, input_name: str, value):
         '''
@@ -1025,6 +1122,7 @@ class BaseNode:
         Trigger a refresh of the node UI.
         You should call this method when you want to update the UI of the node (e.g. after changing definitions for inputs/outputs/static_inputs).
         '''
+        self.invalidate_definitions()
         self._on_refresh.trigger()
 
     def init(self):
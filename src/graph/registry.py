@@ -0,0 +1,222 @@
+import os
+import sys
+import json
+import threading
+import importlib.util
+
+from .node import BaseNode
+from src.settings import SETTINGS
+
+
+class LazyNodeProxy:
+    '''
+    Stands in for a node class listed in the manifest, the package is imported on first instantiation.
+    '''
+
+    def __init__(self, registry: "NodeRegistry", entry: dict):
+        self.registry = registry
+        self.entry = entry
+        self.__name__ = entry["class"]
+
+    def name(self) -> str:
+        return self.entry["name"]
+
+    def category(self) -> str:
+        return self.entry["category"]
+
+    def resolve(self) -> type[BaseNode]:
+        return self.registry.resolve(self.entry["name"])
+
+    def __call__(self, *args, **kwargs) -> BaseNode:
+        return self.resolve()(*args, **kwargs)
+
+    def __getattr__(self, name: str):
+        # any other class attribute, such as execution_policy, imports the package and reads it from the real class
+        if name.startswith("__") and name.endswith("__") or name in ("registry", "entry"):
+            raise AttributeError(name)
+        return getattr(self.resolve(), name)
+
+    def __instancecheck__(self, instance) -> bool:
+        return isinstance(instance, self.resolve())
+
+    def __subclasscheck__(self, subclass) -> bool:
+        return issubclass(subclass, self.resolve())
+
+    def __repr__(self) -> str:
+        return f"<LazyNodeProxy {self.entry['module']}.{self.entry['class']}>"
+
+
+class NodeRegistry:
+    '''
+    Process wide registry of node classes shared by reference between all graphs.
+
+    Every node package is imported once, loading another graph only parses its file and
+    constructs its nodes. The manifest maps node names to the module, class and category they come from.
+
+    The manifest is also kept on disk. Packages whose files did not change since it was written
+    are registered as LazyNodeProxy entries and only imported when one of their nodes is created.
+    '''
+
+    MANIFEST_VERSION = 1
+
+    def __init__(self, manifest_path: str | None = None):
+        self.nodes: dict[str, type[BaseNode] | LazyNodeProxy] = {}
+        self.manifest: dict[str, dict] = {}
+        self.manifest_path = manifest_path
+        self.use_manifest = manifest_path is not None
+        self.__packages: dict[str, dict] = {}
+        self.__registered_directories: set[str] = set()
+        self.__lock = threading.RLock()
+        self.__load_manifest()
+
+    def __load_manifest(self):
+        if not self.use_manifest or not os.path.exists(self.manifest_path):
+            return
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return
+        if data.get("version") == self.MANIFEST_VERSION:
+            self.__packages = data.get("packages", {})
+
+    def __save_manifest(self):
+        if not self.use_manifest:
+            return
+        try:
+            directory = os.path.dirname(self.manifest_path)
+            if directory != "":
+                os.makedirs(directory, exist_ok=True)
+            temp_path = self.manifest_path + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as file:
+                json.dump({"version": self.MANIFEST_VERSION, "packages": self.__packages}, file, indent=1)
+            os.replace(temp_path, self.manifest_path)
+        except OSError as e:
+            print(f"Could not write node manifest: {e}")
+
+    @staticmethod
+    def package_fingerprint(package_directory: str) -> list:
+        '''
+        Returns the number of python files in the package and their latest modification time.
+        '''
+        count = 0
+        latest = 0
+        for root, directories, files in os.walk(package_directory):
+            directories[:] = [directory for directory in directories if directory != "__pycache__"]
+            for file in files:
+                if file.endswith(".py"):
+                    count += 1
+                    latest = max(latest, os.stat(os.path.join(root, file)).st_mtime_ns)
+        return [count, latest]
+
+    def register_node(self, node_cls: type[BaseNode], module_path: str | None = None):
+        with self.__lock:
+            name = node_cls.name()
+            self.nodes[name] = node_cls
+            self.manifest[name] = {
+                "name": name,
+                "module": node_cls.__module__,
+                "class": node_cls.__qualname__,
+                "category": node_cls.category(),
+                "path": module_path,
+            }
+
+    def register_nodes(self, nodes: list[type[BaseNode]], module_path: str | None = None):
+        for node in nodes:
+            self.register_node(node, module_path)
+
+    def import_package(self, module_name: str, path: str):
+        '''
+        Imports a node package from its __init__.py, reusing it if it was imported before.
+        '''
+        module = sys.modules.get(module_name)
+        if module is not None:
+            return module
+
+        spec = importlib.util.spec_from_file_location(module_name, path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[module_name] = module
+        try:
+            spec.loader.exec_module(module)
+        except BaseException:
+            del sys.modules[module_name]
+            raise
+        return module
+
+    def __register_package(self, module_name: str, init_path: str) -> list[dict]:
+        module = self.import_package(module_name, init_path)
+        if not hasattr(module, "register_nodes"):
+            return []
+        nodes = module.register_nodes()
+        self.register_nodes(nodes, init_path)
+        return [dict(self.manifest[node.name()], package=module_name) for node in nodes]
+
+    def resolve(self, name: str) -> type[BaseNode]:
+        '''
+        Returns the node class, importing its package if it is still a lazy proxy.
+        '''
+        with self.__lock:
+            node_cls = self.nodes.get(name)
+            if isinstance(node_cls, LazyNodeProxy):
+                entry = node_cls.entry
+                self.__register_package(entry["package"], entry["path"])
+                node_cls = self.nodes.get(name)
+                if isinstance(node_cls, LazyNodeProxy):
+                    raise ValueError(f"Node {name} is no longer provided by {entry['package']}")
+            if node_cls is None:
+                raise ValueError(f"Unknown node {name}")
+            return node_cls
+
+    def register_modules(self, root_directory: str, module_prefix: str = None):
+        '''
+        Registers the nodes of every package in root_directory, does nothing if the directory is already registered.
+        '''
+        if module_prefix is None:
+            module_prefix = root_directory.replace("/", ".").replace("\\", ".")
+
+        with self.__lock:
+            key = (os.path.abspath(root_directory), module_prefix)
+            if key in self.__registered_directories:
+                return
+
+            if not os.path.isdir(root_directory):
+                return
+
+            manifest_changed = False
+
+            # iterate over all folders in root_directory
+            for directory in sorted(os.listdir(root_directory)):
+                package_directory = os.path.join(root_directory, directory)
+                if not os.path.isdir(package_directory):
+                    continue
+
+                init_path = os.path.join(package_directory, "__init__.py")
+                if not os.path.exists(init_path):
+                    continue
+
+                if directory.startswith("__"):
+                    continue
+
+                module_name = f"{module_prefix}.{directory}"
+                fingerprint = self.package_fingerprint(package_directory)
+                cached = self.__packages.get(module_name)
+
+                if self.use_manifest and cached is not None and cached["fingerprint"] == fingerprint and module_name not in sys.modules:
+                    for entry in cached["nodes"]:
+                        self.nodes[entry["name"]] = LazyNodeProxy(self, entry)
+                        self.manifest[entry["name"]] = {name: value for name, value in entry.items() if name != "package"}
+                    continue
+
+                self.__packages[module_name] = {
+                    "fingerprint": fingerprint,
+                    "nodes": self.__register_package(module_name, init_path),
+                }
+                manifest_changed = True
+
+            self.__registered_directories.add(key)
+
+            if manifest_changed:
+                self.__save_manifest()
+
+
+NODE_REGISTRY = NodeRegistry(os.path.join(SETTINGS.get("cache_dir", "cache"), "node_manifest.json"))
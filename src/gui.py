@@ -24,6 +24,9 @@ import threading
 import src.update as update
 
 from src.settings import SETTINGS
+from src.nodes.progress_node import PROGRESS_MONITOR
+from src.model_manager import MODEL_MANAGER
+from src.graph.execution import shutdown_pools
 
 DEBUG = False
 
@@ -470,6 +473,10 @@ class GuiGraph:
             self.graph.load_from_file(file_path_name)
         except Exception as e:
             self.display_main_popup("Error loading graph", exception_full_message(e))
+            return
+
+        if SETTINGS.get("preload_models", False):
+            self.graph.preload()
 
     def run_callback(self, sender, app_data, user_data = None):
         try:
@@ -683,6 +690,27 @@ class GuiGraph:
         center = [dpg.get_viewport_width()/2  - 300, dpg.get_viewport_height()/2 - 300]
         dpg.set_item_pos("changelog_popup", center)
 
+    def __set_image_cache_mb(self, sender, app_data):
+        SETTINGS.set("image_cache_mb", app_data)
+        # imported here, helpers loads cv2 and PIL which the editor does not need at startup
+        import src.helpers as helpers
+        helpers.IMAGE_CACHE.set_budget(app_data)
+
+    def __set_model_ram_budget_mb(self, sender, app_data):
+        SETTINGS.set("model_ram_budget_mb", app_data)
+        MODEL_MANAGER.ram_budget_mb = app_data
+        MODEL_MANAGER.enforce_budget()
+
+    def __set_model_vram_budget_mb(self, sender, app_data):
+        SETTINGS.set("model_vram_budget_mb", app_data)
+        MODEL_MANAGER.vram_budget_mb = app_data
+        MODEL_MANAGER.enforce_budget()
+
+    def __set_process_workers(self, sender, app_data):
+        SETTINGS.set("process_workers", app_data)
+        # running nodes keep their pool, the next node starts one with the new size
+        shutdown_pools()
+
     def dpg_settings_popup(self):
         with dpg.window(label="Settings", tag="settings_popup", no_title_bar=False, show=False, min_size=[400,100]):
             dpg.add_text("Settings")
@@ -692,6 +720,19 @@ class GuiGraph:
             dpg.add_separator()
             dpg.add_text("Hugging Face")
             dpg.add_input_text(label="Cache Directory", default_value=SETTINGS.get("hf_cache_dir", ""), callback=lambda _, app_data: SETTINGS.set("hf_cache_dir", app_data))
+            dpg.add_separator()
+            dpg.add_text("Cache")
+            dpg.add_input_text(label="Cache Directory##cache_dir", default_value=SETTINGS.get("cache_dir", "cache"), callback=lambda _, app_data: SETTINGS.set("cache_dir", app_data))
+            dpg.add_input_int(label="Image Cache (MB)", default_value=SETTINGS.get("image_cache_mb", 512), min_value=0, min_clamped=True, callback=self.__set_image_cache_mb)
+            dpg.add_checkbox(label="Cache parsed graph files", default_value=SETTINGS.get("graph_cache", False), callback=lambda _, app_data: SETTINGS.set("graph_cache", app_data))
+            dpg.add_separator()
+            dpg.add_text("Models (0 = unlimited)")
+            dpg.add_input_int(label="RAM Budget (MB)", default_value=SETTINGS.get("model_ram_budget_mb", 0), min_value=0, min_clamped=True, callback=self.__set_model_ram_budget_mb)
+            dpg.add_input_int(label="VRAM Budget (MB)", default_value=SETTINGS.get("model_vram_budget_mb", 0), min_value=0, min_clamped=True, callback=self.__set_model_vram_budget_mb)
+            dpg.add_checkbox(label="Preload models when a graph is opened", default_value=SETTINGS.get("preload_models", False), callback=lambda _, app_data: SETTINGS.set("preload_models", app_data))
+            dpg.add_separator()
+            dpg.add_text("Execution (0 = all cores)")
+            dpg.add_input_int(label="Node Workers", default_value=SETTINGS.get("process_workers", 0), min_value=0, min_clamped=True, callback=self.__set_process_workers)
             
             dpg.add_separator()
             dpg.add_button(label="Save", callback=lambda: SETTINGS.save())
@@ -1077,14 +1118,14 @@ graph_window = node_editor.show()
 
 dpg.set_primary_window(graph_window, True)
 
-if DEBUG:
-    # dpg.show_style_editor()
-    while dpg.is_dearpygui_running():
+# dpg.show_style_editor()
+while dpg.is_dearpygui_running():
+    if DEBUG:
         jobs = dpg.get_callback_queue() # retrieves and clears queue
         dpg.run_callbacks(jobs)
-        dpg.render_dearpygui_frame()
-else:
-    dpg.start_dearpygui()
+    # progress bars are sampled here at a fixed rate instead of from the graph thread
+    PROGRESS_MONITOR.poll()
+    dpg.render_dearpygui_frame()
 
 
 dpg.destroy_context()
\ No newline at end of file
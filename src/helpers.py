@@ -9,23 +9,116 @@ import numpy
 import re
 import requests
 import os
+import threading
+from collections import OrderedDict
+from .settings import SETTINGS
 default_thumbnail_size = (150, 150)
 
 
-def pillow_from_any_string(image: str|None) -> PIL.Image.Image | None:
+class ImageCache:
+    '''
+    Process wide cache of decoded images with a memory budget and least recently used eviction.
+
+    Images are keyed by path, modification time, file size, mode and target size, so a file that
+    changes on disk is decoded again. Callers always get a copy they are free to modify.
+    '''
+
+    def __init__(self, max_mb: float = 512):
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.__images: OrderedDict[tuple, tuple[PIL.Image.Image, int]] = OrderedDict()
+        self.__lock = threading.Lock()
+
+    @staticmethod
+    def __image_bytes(image: PIL.Image.Image) -> int:
+        return image.width * image.height * len(image.getbands())
+
+    def __evict(self):
+        while self.current_bytes > self.max_bytes and len(self.__images) > 0:
+            _, (_, size) = self.__images.popitem(last=False)
+            self.current_bytes -= size
+
+    def set_budget(self, max_mb: float):
+        with self.__lock:
+            self.max_bytes = int(max_mb * 1024 * 1024)
+            self.__evict()
+
+    def clear(self):
+        with self.__lock:
+            self.__images.clear()
+            self.current_bytes = 0
+
+    def get(self, path: str, mode: str|None = None, size: tuple[int, int]|None = None) -> PIL.Image.Image:
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size, mode, tuple(size) if size is not None else None)
+
+        with self.__lock:
+            cached = self.__images.get(key)
+            if cached is not None:
+                self.__images.move_to_end(key)
+                self.hits += 1
+                return cached[0].copy()
+            self.misses += 1
+
+        image = Image.open(path)
+        if size is not None:
+            # let the decoder skip detail that is thrown away by the resize anyway
+            image.draft(mode, size)
+        if mode is not None and image.mode != mode:
+            image = image.convert(mode)
+        if size is not None:
+            image.thumbnail(size)
+        image.load()
+
+        image_bytes = self.__image_bytes(image)
+        if image_bytes <= self.max_bytes:
+            with self.__lock:
+                if key not in self.__images:
+                    self.__images[key] = (image, image_bytes)
+                    self.current_bytes += image_bytes
+                    self.__evict()
+        return image.copy()
+
+
+IMAGE_CACHE = ImageCache(SETTINGS.get("image_cache_mb", 512))
+
+
+def onnx_session_options():
+    '''
+    Session options for ONNX models, limited to SETTINGS["onnx_threads"] threads if it is set.
+    '''
+    import onnxruntime as rt
+    options = rt.SessionOptions()
+    threads = SETTINGS.get("onnx_threads", 0)
+    if threads > 0:
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+    return options
+
+
+def load_image(path: str, mode: str|None = None, size: tuple[int, int]|None = None) -> PIL.Image.Image:
+    return IMAGE_CACHE.get(path, mode, size)
+
+
+def pillow_from_any_string(image: str|None, mode: str|None = None) -> PIL.Image.Image | None:
     if image is None or image == "":
         return None
     if image.startswith("data:image"):
-        return convert_base64_to_pil(image)
+        result = convert_base64_to_pil(image)
     elif image.startswith("http"):
-        return convert_http_to_pil(image)
+        result = convert_http_to_pil(image)
     elif os.path.exists(image):
-        return convert_path_to_pil(image)
+        return load_image(image, mode)
     else:
         return None
+    if mode is not None and result.mode != mode:
+        result = result.convert(mode)
+    return result
 
 def convert_path_to_pil(path: str) -> PIL.Image.Image:
-    return Image.open(path)
+    return load_image(path)
 
 def convert_http_to_pil(url: str) -> PIL.Image.Image:
     response = requests.get(url)
@@ -37,10 +130,27 @@ def convert_base64_to_pil(base64_image: str) -> PIL.Image.Image:
     base64_image = base64.b64decode(base64_image)
     return Image.open(BytesIO(base64_image))
 
-def convert_pil_to_base64(pil_image: PIL.Image.Image) -> str:
-    cv_image = convert_pil_to_cv(pil_image)
-    _, buffer = cv2.imencode(".png", cv_image)
-    return "data:image/png;base64," + base64.b64encode(buffer).decode()
+def convert_pil_to_base64(pil_image: PIL.Image.Image, format: str = "png", quality: int = 90, max_side: int | None = None) -> str:
+    format = format.lower()
+    if format == "jpg":
+        format = "jpeg"
+
+    if max_side is not None and max_side > 0 and max(pil_image.size) > max_side:
+        pil_image = pil_image.copy()
+        pil_image.thumbnail((max_side, max_side), Image.LANCZOS)
+
+    if format == "jpeg" and pil_image.mode not in ("RGB", "L"):
+        pil_image = pil_image.convert("RGB")
+    elif pil_image.mode not in ("RGB", "RGBA", "L", "LA"):
+        pil_image = pil_image.convert("RGBA" if "A" in pil_image.getbands() else "RGB")
+
+    buffer = BytesIO()
+    if format == "png":
+        # fast compression, the payload is decoded once by the model server
+        pil_image.save(buffer, format="PNG", compress_level=1)
+    else:
+        pil_image.save(buffer, format=format.upper(), quality=quality)
+    return f"data:image/{format};base64," + base64.b64encode(buffer.getvalue()).decode()
 
 def convert_to_thumbnail(pillow_image: PIL.Image.Image, size=default_thumbnail_size) -> PIL.Image.Image:
     
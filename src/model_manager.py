@@ -0,0 +1,158 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+from .settings import SETTINGS
+
+
+def _process_ram() -> int:
+    if psutil is None:
+        return 0
+    return psutil.Process().memory_info().rss
+
+
+def _process_vram() -> int:
+    # torch is only asked if a node already imported it
+    torch = sys.modules.get("torch")
+    if torch is None or not torch.cuda.is_available():
+        return 0
+    return sum(torch.cuda.memory_allocated(device) for device in range(torch.cuda.device_count()))
+
+
+class _MeasureLoad:
+    def __init__(self):
+        self.ram = 0
+        self.vram = 0
+
+    def __enter__(self):
+        self.__ram = _process_ram()
+        self.__vram = _process_vram()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.ram = max(0, _process_ram() - self.__ram)
+        self.vram = max(0, _process_vram() - self.__vram)
+        return False
+
+
+class _ModelEntry:
+    def __init__(self, name: str, unload: Callable[[], None], ram: int, vram: int):
+        self.name = name
+        self.unload = unload
+        self.ram = ram
+        self.vram = vram
+        self.in_use = False
+        self.last_used = time.monotonic()
+
+
+class ModelManager:
+    '''
+    Tracks the models held by nodes and their approximate RAM and VRAM usage.
+
+    When a budget is exceeded the least recently used models that are not in use by a running
+    graph are unloaded through their node, which loads them again on its next init().
+    Budgets are in MB, 0 disables the budget.
+    '''
+
+    def __init__(self, ram_budget_mb: int = 0, vram_budget_mb: int = 0):
+        self.ram_budget_mb = ram_budget_mb
+        self.vram_budget_mb = vram_budget_mb
+        self.__lock = threading.RLock()
+        self.__models: OrderedDict[int, _ModelEntry] = OrderedDict()
+
+    @staticmethod
+    def measure() -> _MeasureLoad:
+        '''
+        Context manager measuring how much process RAM and VRAM a model load allocated.
+        Usage is measured process wide, loads running at the same time count part of each other's
+        allocations, so the numbers are approximate then.
+        '''
+        return _MeasureLoad()
+
+    def register(self, owner, name: str, unload: Callable[[], None], ram: int = 0, vram: int = 0):
+        '''
+        Registers the model held by owner and marks it as in use until release(owner) is called.
+        '''
+        with self.__lock:
+            key = id(owner)
+            entry = self.__models.get(key)
+            if entry is None or entry.name != name:
+                entry = self.__models[key] = _ModelEntry(name, unload, ram, vram)
+            entry.in_use = True
+            entry.last_used = time.monotonic()
+            self.__models.move_to_end(key)
+        self.enforce_budget()
+
+    def use(self, owner) -> bool:
+        '''
+        Marks an already loaded model as in use, it is not unloaded until release(owner).
+        Models are unloaded under the same lock, so the check and the mark cannot be split by an unload.
+
+        Returns:
+            bool: whether owner still has a loaded model, if not the node has to load it again
+        '''
+        with self.__lock:
+            entry = self.__models.get(id(owner))
+            if entry is None:
+                return False
+            entry.in_use = True
+            entry.last_used = time.monotonic()
+            self.__models.move_to_end(id(owner))
+            return True
+
+    def release(self, owner):
+        with self.__lock:
+            entry = self.__models.get(id(owner))
+            if entry is not None:
+                entry.in_use = False
+                entry.last_used = time.monotonic()
+        self.enforce_budget()
+
+    def unregister(self, owner):
+        with self.__lock:
+            self.__models.pop(id(owner), None)
+
+    def usage(self) -> tuple[int, int]:
+        '''
+        Returns:
+            tuple: RAM and VRAM in bytes of all registered models
+        '''
+        with self.__lock:
+            return sum(entry.ram for entry in self.__models.values()), sum(entry.vram for entry in self.__models.values())
+
+    def __over_budget(self) -> bool:
+        ram, vram = self.usage()
+        over_ram = self.ram_budget_mb > 0 and ram > self.ram_budget_mb * 1024 * 1024
+        over_vram = self.vram_budget_mb > 0 and vram > self.vram_budget_mb * 1024 * 1024
+        return over_ram or over_vram
+
+    def enforce_budget(self):
+        '''
+        Unloads idle models, least recently used first, until the usage fits the budgets.
+        '''
+        while True:
+            with self.__lock:
+                if not self.__over_budget():
+                    return
+                idle = [(key, entry) for key, entry in self.__models.items() if not entry.in_use]
+                if len(idle) == 0:
+                    return
+                key, entry = min(idle, key=lambda item: item[1].last_used)
+                del self.__models[key]
+
+                # unloaded while holding the lock, a use() that comes after sees the model as gone
+                print(f"Unloading {entry.name} to stay within the model memory budget")
+                try:
+                    entry.unload()
+                except Exception as e:
+                    print(f"Failed to unload {entry.name}: {e}")
+
+
+MODEL_MANAGER = ModelManager(SETTINGS.get("model_ram_budget_mb", 0), SETTINGS.get("model_vram_budget_mb", 0))
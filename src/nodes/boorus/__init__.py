@@ -1,8 +1,10 @@
-from .get_wiki import DanbooruWikiNode
+from .get_wiki import DanbooruWikiNode, DanbooruWikiBulkNode, DanbooruWikiDumpImportNode
 from .booru_download import BooruDownloadNode
 
 def register_nodes():
     return [
         DanbooruWikiNode,
+        DanbooruWikiBulkNode,
+        DanbooruWikiDumpImportNode,
         BooruDownloadNode
     ]
\ No newline at end of file
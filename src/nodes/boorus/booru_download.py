@@ -2,26 +2,43 @@
 import sys
 if __name__ == "__main__":
     sys.path.append("")
-    from src.graph import BaseNode, AttributeDefinition, IntegerAttributeDefinition, ListAttributeDefinition, AttributeKind, ComboAttributeDefinition, StringAttributeDefinition
-    from src.helpers import pillow_from_any_string
+    from src.graph import BaseNode, AttributeDefinition, IntegerAttributeDefinition, FloatAttributeDefinition, ListAttributeDefinition, AttributeKind, ComboAttributeDefinition, StringAttributeDefinition, FileAttributeDefinition
     from src.nodes.progress_node import ProgressNode
+    from src.nodes.boorus.http_pool import HttpPool
+    from src.nodes.boorus.download_cache import DownloadCache, ChecksumMismatch
+    from src.settings import SETTINGS
 else:
-    from ...graph import BaseNode, AttributeDefinition, IntegerAttributeDefinition, ListAttributeDefinition, AttributeKind, ComboAttributeDefinition, StringAttributeDefinition
+    from ...graph import BaseNode, AttributeDefinition, IntegerAttributeDefinition, FloatAttributeDefinition, ListAttributeDefinition, AttributeKind, ComboAttributeDefinition, StringAttributeDefinition, FileAttributeDefinition
     from ..progress_node import ProgressNode
-    from ...helpers import pillow_from_any_string
+    from .http_pool import HttpPool
+    from .download_cache import DownloadCache, ChecksumMismatch
+    from ...settings import SETTINGS
 import booru as booru_api
 import asyncio
+import math
+import os
+from collections import deque
+from io import BytesIO
+from PIL import Image
 
 
 class UrlGenerator:
-    def __init__(self, booru, queries, limit_per_query):
+    PAGE_SIZE = 100
+
+    def __init__(self, booru, queries, limit_per_query, pool: HttpPool | None = None, prefetch_pages: int = 2, booru_name: str = ""):
         self.booru = booru
         self.queries = queries
         self.limit_per_query = limit_per_query
+        self.pool = pool if pool is not None else HttpPool()
+        self.prefetch_pages = max(1, int(prefetch_pages))
+        self.booru_name = booru_name
         self.current_page = 1
         self.current_query = 0
         self.current_images = []
         self.returned_images = 0
+        # search results of the next pages of the current query, fetched in the background
+        self.__pending_pages = deque()
+        self.__next_page = 1
 
     def __iter__(self):
         return self
@@ -34,37 +51,74 @@ class UrlGenerator:
             url = image.get("preview_url")
         return url
 
+    def get_md5(self, image, url):
+        # the md5 of a post is the md5 of its original file, preview and sample urls are keyed by url
+        if url is None or url != image.get("file_url"):
+            return None
+        return image.get("md5") or image.get("hash")
+
     def get_tags(self, image):
         tags = image.get("tags")
         if tags is None:
             tags = image.get("tag_string")
         return tags            
     
+    async def __search(self, query, page):
+        await self.pool.rate_limiter.acquire(self.booru_name)
+        return await self.booru.search(query, limit=min(self.PAGE_SIZE, self.limit_per_query), page=page)
+
+    def __fill_prefetch(self):
+        query = self.queries[self.current_query]
+        pages_needed = max(1, math.ceil(self.limit_per_query / self.PAGE_SIZE))
+        while len(self.__pending_pages) < self.prefetch_pages:
+            # always keep the page that is needed next in flight, only prefetch pages the limit can use
+            if len(self.__pending_pages) > 0 and self.__next_page > pages_needed:
+                break
+            self.__pending_pages.append(self.pool.submit(self.__search(query, self.__next_page)))
+            self.__next_page += 1
+
+    def __next_query(self):
+        for future in self.__pending_pages:
+            future.cancel()
+        self.__pending_pages.clear()
+        self.current_query += 1
+        self.current_page = 1
+        self.__next_page = 1
+        self.returned_images = 0
+        self.current_images = []
+
+    def close(self):
+        for future in self.__pending_pages:
+            future.cancel()
+        self.__pending_pages.clear()
+
     def __next__(self):
         if self.returned_images >= self.limit_per_query:
-            self.current_query += 1
-            self.returned_images = 0
+            self.__next_query()
 
         if self.current_query >= len(self.queries):
             raise StopIteration
         
         while len(self.current_images) == 0:
-            # self.current_images =  self.booru.search(self.queries[self.current_query], limit=self.limit_per_query, page=self.current_page)
-            result = asyncio.run(self.booru.search(self.queries[self.current_query], limit=min(100, self.limit_per_query), page=self.current_page))
+            self.__fill_prefetch()
+            result = self.__pending_pages.popleft().result()
             parsed_result = booru_api.resolve(result)
             self.current_images = []
             for image in parsed_result:
+                url = self.get_url(image)
                 self.current_images.append({
-                    "url": self.get_url(image),
-                    "tags": " , ".join(self.get_tags(image))
+                    "url": url,
+                    "tags": " , ".join(self.get_tags(image)),
+                    "md5": self.get_md5(image, url)
                 })
 
             self.current_page += 1
             if len(self.current_images) == 0:
-                self.current_query += 1
-                self.returned_images = 0
+                self.__next_query()
                 if self.current_query >= len(self.queries):
                     raise StopIteration
+            else:
+                self.__fill_prefetch()
                 
         image = self.current_images.pop(0)
         self.returned_images += 1
@@ -88,9 +142,20 @@ class BooruDownloadNode(ProgressNode):
         self.set_default_input("timeout", 10)
         self.set_default_input("batch_size", 10)
         self.set_default_input("booru", "danbooru")
+        self.set_static_input("concurrency", 8)
+        self.set_static_input("prefetch_pages", 2)
+        self.set_static_input("rate_limit", 0.0)
+        self.set_static_input("mode", "memory")
+        self.set_static_input("cache_dir", os.path.join(SETTINGS.get("cache_dir", "cache"), "booru"))
         self.iterator = None
+        self.pool = None
+        self.pending_batch = None
+        self.download_cache = None
+        self.seen_keys = set()
 
         self.downloaded_images_count = 0
+        self.failed_images_count = 0
+        self.last_error = None
         self.available_boorus = {
             "danbooru": booru_api.Danbooru,
             "gelbooru": booru_api.Gelbooru,
@@ -115,21 +180,112 @@ class BooruDownloadNode(ProgressNode):
             "booru": ComboAttributeDefinition(values_callback=lambda: list(self.available_boorus.keys())),
             "queries": ListAttributeDefinition(StringAttributeDefinition()),
             "limit": IntegerAttributeDefinition(),
-            "batch_size": IntegerAttributeDefinition()
+            "batch_size": IntegerAttributeDefinition(),
+            "retry": IntegerAttributeDefinition(min_value=0),
+            "timeout": IntegerAttributeDefinition(min_value=1)
+        }
+    
+    @property
+    def static_input_definitions(self):
+        return {
+            "concurrency": IntegerAttributeDefinition(min_value=1),
+            "prefetch_pages": IntegerAttributeDefinition(min_value=1),
+            "rate_limit": FloatAttributeDefinition(min_value=0),
+            "mode": ComboAttributeDefinition(values_callback=lambda: ["memory", "disk"], allow_custom=False),
+            "cache_dir": FileAttributeDefinition(directory_selector=True)
         }
     
     @property
     def output_definitions(self):
         return {
             "images": ListAttributeDefinition(AttributeDefinition(type_name="image"), kind=AttributeKind.GENERATOR),
-            "tags_string": ListAttributeDefinition(StringAttributeDefinition(), kind=AttributeKind.GENERATOR)
+            "tags_string": ListAttributeDefinition(StringAttributeDefinition(), kind=AttributeKind.GENERATOR),
+            "files": ListAttributeDefinition(StringAttributeDefinition(), kind=AttributeKind.GENERATOR)
         }
     
     def init(self):
         self.downloaded_images_count = 0
+        self.failed_images_count = 0
+        self.last_error = None
         self.set_progress(-1, -1)
+        self.__reset()
+        self.seen_keys = set()
+        if self.static_inputs["mode"] == "disk":
+            cache_dir = self.static_inputs["cache_dir"]
+            if self.download_cache is None or self.download_cache.cache_dir != cache_dir:
+                self.download_cache = DownloadCache(cache_dir)
         return super().init()
 
+    def __reset(self):
+        if self.pending_batch is not None:
+            self.pending_batch.cancel()
+            self.pending_batch = None
+        if self.iterator is not None:
+            self.iterator.close()
+            self.iterator = None
+
+    def __get_pool(self, retry, timeout) -> HttpPool:
+        concurrency = self.static_inputs["concurrency"]
+        rate_limit = self.static_inputs["rate_limit"]
+        if self.pool is not None:
+            same_concurrency = self.pool.concurrency == concurrency
+            same_rate_limit = self.pool.rate_limit == rate_limit
+            same_timeout = self.pool.timeout == timeout
+            if same_concurrency and same_rate_limit and same_timeout:
+                self.pool.retry = retry
+                return self.pool
+            self.pool.close()
+
+        self.pool = HttpPool(concurrency=concurrency, rate_limit=rate_limit, timeout=timeout, retry=retry)
+        return self.pool
+
+    def __disk_mode(self) -> bool:
+        return self.static_inputs["mode"] == "disk" and self.download_cache is not None
+
+    def _next_items(self, batch_size) -> list[dict]:
+        items = []
+        while len(items) < batch_size:
+            try:
+                item = next(self.iterator)
+            except StopIteration:
+                break
+            if item["url"] is None:
+                continue
+            if self.__disk_mode():
+                # the same post can be returned by overlapping queries
+                item["key"] = DownloadCache.key(item["url"], item["md5"])
+                if item["key"] in self.seen_keys:
+                    continue
+                self.seen_keys.add(item["key"])
+            items.append(item)
+        return items
+
+    async def _download_item(self, item):
+        try:
+            if self.__disk_mode():
+                return await self.download_cache.download(self.pool, item["url"], item["key"], item["md5"], item["tags"])
+            return await self.pool.fetch_bytes(item["url"])
+        except ChecksumMismatch as e:
+            print(f"Skipping image, the downloaded file does not match the md5 of the post. {e}")
+            self.last_error = e
+        except ValueError as e:
+            print(f"Skipping image. {e}")
+            self.last_error = e
+        # failures are counted by run(), which reports them when the downloads end
+        return None
+
+    async def _download_items(self, items):
+        results = await asyncio.gather(*[self._download_item(item) for item in items])
+        return list(zip(items, results))
+
+    def _submit_next_batch(self, batch_size):
+        items = self._next_items(batch_size)
+        if len(items) == 0:
+            return None
+        return self.pool.submit(self._download_items(items))
+
+    def _decode(self, item, data):
+        return Image.open(BytesIO(data))
     
     def run(self, **kwargs) -> dict[str, object]:
 
@@ -137,34 +293,54 @@ class BooruDownloadNode(ProgressNode):
         booru = kwargs.get("booru", "")
         limit = kwargs.get("limit", 10)
         batch_size = kwargs.get("batch_size", 10)
+        retry = kwargs.get("retry", 3)
+        timeout = kwargs.get("timeout", 10)
 
         if self.iterator is None:
-            self.iterator = UrlGenerator(self.available_boorus[booru](), queries, limit)
+            pool = self.__get_pool(retry, timeout)
+            self.iterator = UrlGenerator(self.available_boorus[booru](), queries, limit, pool, self.static_inputs["prefetch_pages"], booru)
+            self.pending_batch = self._submit_next_batch(batch_size)
+
+        downloaded = self.pending_batch.result() if self.pending_batch is not None else []
+        # start downloading the next batch while this one is processed downstream
+        self.pending_batch = self._submit_next_batch(batch_size) if len(downloaded) > 0 else None
 
         images_batch = []
         tags_batch = []
-        for _ in range(batch_size):
-            try:
-                result = next(self.iterator)
-                images_batch.append(pillow_from_any_string(result["url"]))
-                tags_batch.append(result["tags"])
-                self.downloaded_images_count += 1
-                self.set_progress(self.downloaded_images_count, (limit * len(queries)))
+        files_batch = []
+        for item, data in downloaded:
+            if data is None:
+                self.failed_images_count += 1
+                continue
+            self.downloaded_images_count += 1
+            self.set_progress(self.downloaded_images_count, (limit * len(queries)))
+            if self.__disk_mode():
+                # files are emitted as paths and decoded lazily by the consumers
+                images_batch.append(data)
+                files_batch.append(data)
+            else:
+                images_batch.append(self._decode(item, data))
+            tags_batch.append(item["tags"])
 
-            except StopIteration:
-                break
+        if len(downloaded) > 0 and len(tags_batch) == 0:
+            self.__reset()
+            raise ValueError(f"All {len(downloaded)} downloads of the batch failed, last error: {self.last_error}")
 
-        if len(images_batch) == 0:
-            self.iterator = None
+        if len(downloaded) == 0:
+            self.__reset()
             self.set_progress(self.downloaded_images_count, (limit * len(queries)), False)
+            if self.failed_images_count > 0:
+                self._on_error.trigger(ValueError(f"{self.failed_images_count} downloads failed, last error: {self.last_error}"))
             return {
                 "images": BaseNode.GeneratorExit(),
-                "tags_string": BaseNode.GeneratorExit()
+                "tags_string": BaseNode.GeneratorExit(),
+                "files": BaseNode.GeneratorExit()
             }
         
         return {
             "images": images_batch,
-            "tags_string": tags_batch
+            "tags_string": tags_batch,
+            "files": files_batch
         }
 
 
@@ -0,0 +1,107 @@
+import os
+import json
+import hashlib
+import threading
+from urllib.parse import urlparse
+
+
+class ChecksumMismatch(ValueError):
+    pass
+
+
+class DownloadCache:
+    '''
+    Content addressed on-disk cache of downloaded files.
+
+    Files are stored as cache_dir/<key[:2]>/<key><ext>, where key is the md5 reported by the
+    booru or the sha256 of the url. Finished downloads are appended to manifest.jsonl, so
+    interrupted runs resume and overlapping queries reuse files that are already downloaded.
+    '''
+
+    MANIFEST_FILE = "manifest.jsonl"
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self.manifest_path = os.path.join(cache_dir, self.MANIFEST_FILE)
+        self.__lock = threading.Lock()
+        self.__entries: dict[str, dict] = {}
+        self.__load_manifest()
+
+    def __load_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return
+        with open(self.manifest_path, "r", encoding="utf-8") as file:
+            for line in file:
+                line = line.strip()
+                if line == "":
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # last line of an interrupted run
+                    continue
+                self.__entries[entry["key"]] = entry
+
+    @staticmethod
+    def key(url: str, md5: str | None = None) -> str:
+        if md5 is not None and md5 != "":
+            return md5.lower()
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def path(self, key: str, url: str) -> str:
+        extension = os.path.splitext(urlparse(url).path)[1].lower()
+        return os.path.join(self.cache_dir, key[:2], key + extension)
+
+    def get(self, key: str) -> str | None:
+        with self.__lock:
+            entry = self.__entries.get(key)
+        if entry is None:
+            return None
+        path = entry["path"]
+        if not os.path.exists(path):
+            return None
+        return path
+
+    def add(self, key: str, url: str, path: str, tags: str | None = None):
+        entry = {"key": key, "url": url, "path": path, "tags": tags}
+        with self.__lock:
+            self.__entries[key] = entry
+            with open(self.manifest_path, "a", encoding="utf-8") as file:
+                file.write(json.dumps(entry) + "\n")
+
+    async def download(self, pool, url: str, key: str, md5: str | None = None, tags: str | None = None) -> str:
+        '''
+        Stream url into the cache without decoding it and return the path of the cached file.
+        '''
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+
+        path = self.path(key, url)
+        if os.path.exists(path):
+            # downloaded before the manifest entry was written
+            self.add(key, url, path, tags)
+            return path
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        part_path = path + ".part"
+
+        async def write(response):
+            digest = hashlib.md5()
+            with open(part_path, "wb") as file:
+                async for chunk in response.content.iter_chunked(64 * 1024):
+                    digest.update(chunk)
+                    file.write(chunk)
+            if md5 is not None and md5 != "" and digest.hexdigest() != md5.lower():
+                raise ChecksumMismatch(f"Checksum mismatch for {url}: expected md5 {md5.lower()}, got {digest.hexdigest()}")
+            os.replace(part_path, path)
+
+        try:
+            await pool.request(url, write)
+        finally:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+
+        self.add(key, url, path, tags)
+        return path
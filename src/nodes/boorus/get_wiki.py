@@ -1,16 +1,155 @@
-
-from ...graph import BaseNode, StringAttributeDefinition, IntegerAttributeDefinition, ComboAttributeDefinition
+from ...graph import BaseNode, StringAttributeDefinition, IntegerAttributeDefinition, ComboAttributeDefinition, FloatAttributeDefinition, BoolenAttributeDefinition, ListAttributeDefinition, FileAttributeDefinition
+from ...settings import SETTINGS
+from ..progress_node import ProgressNode
 
 import dearpygui.dearpygui as dpg
+import os
 import time
+import sqlite3
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import json
 
+DUMP_SOURCE = "dump"
+API_SOURCE = "api"
+
+
+def normalize_wiki_tag(tag: str) -> str:
+    return tag.strip().replace(" ", "_").replace("\\", "")
+
+
+class WikiCache:
+    '''
+    Persistent tag to wiki cache stored in SQLite.
+
+    Entries fetched from the api expire after a ttl, entries imported from a dump never expire.
+    '''
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory != "":
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.__lock = threading.Lock()
+        self.__connection = sqlite3.connect(path, check_same_thread=False)
+        self.__connection.execute(
+            "CREATE TABLE IF NOT EXISTS wiki (tag TEXT PRIMARY KEY, body TEXT NOT NULL, fetched_at REAL NOT NULL, source TEXT NOT NULL)"
+        )
+        self.__connection.commit()
+
+    def get_many(self, tags: list[str], ttl: float | None = None) -> dict[str, str]:
+        found = {}
+        min_fetched_at = time.time() - ttl if ttl is not None and ttl > 0 else None
+        with self.__lock:
+            for start in range(0, len(tags), 500):
+                chunk = tags[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self.__connection.execute(
+                    f"SELECT tag, body, fetched_at, source FROM wiki WHERE tag IN ({placeholders})", chunk
+                ).fetchall()
+                for tag, body, fetched_at, source in rows:
+                    if source != DUMP_SOURCE and min_fetched_at is not None and fetched_at < min_fetched_at:
+                        continue
+                    found[tag] = body
+        return found
+
+    def get(self, tag: str, ttl: float | None = None) -> str | None:
+        return self.get_many([tag], ttl).get(tag)
+
+    def set_many(self, items: dict[str, str], source: str = API_SOURCE):
+        now = time.time()
+        with self.__lock:
+            self.__connection.executemany(
+                "INSERT OR REPLACE INTO wiki (tag, body, fetched_at, source) VALUES (?, ?, ?, ?)",
+                [(tag, body, now, source) for tag, body in items.items()]
+            )
+            self.__connection.commit()
+
+    def set(self, tag: str, body: str, source: str = API_SOURCE):
+        self.set_many({tag: body}, source)
+
+
+_WIKI_CACHE = None
+_WIKI_CACHE_LOCK = threading.Lock()
+
+def get_wiki_cache() -> WikiCache:
+    global _WIKI_CACHE
+    with _WIKI_CACHE_LOCK:
+        if _WIKI_CACHE is None:
+            path = os.path.join(SETTINGS.get("cache_dir", "cache"), "danbooru_wiki.sqlite")
+            _WIKI_CACHE = WikiCache(path)
+        return _WIKI_CACHE
+
+
+class RateLimiter:
+    '''
+    Thread safe limiter allowing at most `rate` calls per second, 0 disables limiting.
+    '''
+
+    def __init__(self, rate: float = 0):
+        self.rate = rate
+        self.__lock = threading.Lock()
+        self.__next_slot = 0.0
+
+    def acquire(self):
+        if self.rate is None or self.rate <= 0:
+            return
+        with self.__lock:
+            now = time.monotonic()
+            slot = max(now, self.__next_slot)
+            self.__next_slot = slot + 1.0 / self.rate
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class DanbooruWikiClient:
+    URL = "https://danbooru.donmai.us/wiki_pages/{}.json"
+
+    def __init__(self, timeout: float = 10, pool_size: int = 8, rate_limit: float = 0):
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.rate_limiter = RateLimiter(rate_limit)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def fetch(self, tag: str, retry: int = 3) -> str | None:
+        '''
+        Returns the wiki body, an empty string if the tag has no wiki page or None if the request failed.
+        '''
+        url = self.URL.format(tag)
+        for attempt in range(max(1, retry)):
+            if attempt > 0:
+                time.sleep(min(2 ** (attempt - 1), 10))
+            self.rate_limiter.acquire()
+            try:
+                wiki = self.session.get(url, timeout=self.timeout)
+            except requests.RequestException as e:
+                print(e)
+                continue
+            if wiki.status_code == 404:
+                return ""
+            if wiki.status_code != 200:
+                continue
+            try:
+                return json.loads(wiki.content.decode("utf-8"))["body"]
+            except Exception as e:
+                print(e)
+                continue
+        return None
+
+
 class DanbooruWikiNode(BaseNode):
 
     def __init__(self):
         super().__init__()
         self.set_default_input("retry", 3)
+        self.set_static_input("ttl_days", 30.0)
+        self.set_static_input("offline", False)
+        self.client = None
 
 
     @property
@@ -19,43 +158,47 @@ class DanbooruWikiNode(BaseNode):
             "tag": StringAttributeDefinition(),
             "retry": IntegerAttributeDefinition()
         }
-    
+
+    @property
+    def static_input_definitions(self):
+        return {
+            "ttl_days": FloatAttributeDefinition(min_value=0),
+            "offline": BoolenAttributeDefinition()
+        }
+
     @property
     def output_definitions(self):
         return {
             "tag": StringAttributeDefinition(),
             "wiki": StringAttributeDefinition()
         }
-    
+
     def __danbooru_get_wiki(self, tag: str, retry: int = 3):
-        tag = tag.strip().replace(" ", "_").replace("\\", "")
-        
-        body = None
-        for _ in range(retry):
-            url = f"https://danbooru.donmai.us/wiki_pages/{str(tag)}.json"
-            wiki = requests.get(url)
-            if wiki.status_code != 200:
-                break
-            try:
-                content = wiki.content.decode("utf-8")
-                body = json.loads(content)["body"]  
-            except Exception as e:
-                print(e)
-                continue
+        tag = normalize_wiki_tag(tag)
+        cache = get_wiki_cache()
+
+        body = cache.get(tag, self.static_inputs["ttl_days"] * 24 * 60 * 60)
+        if body is not None or self.static_inputs["offline"]:
+            return body if body is not None else ""
+
+        if self.client is None:
+            self.client = DanbooruWikiClient()
+        body = self.client.fetch(tag, retry)
 
         if body is None:
             return ""
-        
+
+        cache.set(tag, body)
         return body
-    
+
     @staticmethod
     def name():
         return "Danbooru Wiki Node"
-    
+
     @staticmethod
     def category():
         return "Booru"
-        
+
     def run(self, **kwargs):
         tag = kwargs["tag"]
         retry = kwargs["retry"]
@@ -64,3 +207,156 @@ class DanbooruWikiNode(BaseNode):
             "tag": tag,
             "wiki": wiki
         }
+
+
+class DanbooruWikiBulkNode(ProgressNode):
+
+    def __init__(self):
+        super().__init__()
+        self.set_default_input("tags", [])
+        self.set_default_input("retry", 3)
+        self.set_static_input("concurrency", 4)
+        self.set_static_input("rate_limit", 2.0)
+        self.set_static_input("ttl_days", 30.0)
+        self.set_static_input("offline", False)
+        self.client = None
+
+    @property
+    def input_definitions(self):
+        return {
+            "tags": ListAttributeDefinition(StringAttributeDefinition()),
+            "retry": IntegerAttributeDefinition()
+        }
+
+    @property
+    def static_input_definitions(self):
+        return {
+            "concurrency": IntegerAttributeDefinition(min_value=1),
+            "rate_limit": FloatAttributeDefinition(min_value=0),
+            "ttl_days": FloatAttributeDefinition(min_value=0),
+            "offline": BoolenAttributeDefinition()
+        }
+
+    @property
+    def output_definitions(self):
+        return {
+            "tags": ListAttributeDefinition(StringAttributeDefinition()),
+            "wikis": ListAttributeDefinition(StringAttributeDefinition())
+        }
+
+    @staticmethod
+    def name():
+        return "Danbooru Wiki Bulk Node"
+
+    @staticmethod
+    def category():
+        return "Booru"
+
+    def init(self):
+        super().init()
+        concurrency = self.static_inputs["concurrency"]
+        rate_limit = self.static_inputs["rate_limit"]
+        if self.client is None or self.client.pool_size != concurrency:
+            self.client = DanbooruWikiClient(pool_size=concurrency, rate_limit=rate_limit)
+        self.client.rate_limiter.rate = rate_limit
+
+    def run(self, **kwargs):
+        tags = kwargs.get("tags") or []
+        retry = kwargs.get("retry", 3)
+        if self.client is None:
+            self.init()
+
+        normalized = [normalize_wiki_tag(tag) for tag in tags]
+        unique_tags = list(dict.fromkeys(normalized))
+
+        cache = get_wiki_cache()
+        wikis = cache.get_many(unique_tags, self.static_inputs["ttl_days"] * 24 * 60 * 60)
+        missing = [tag for tag in unique_tags if tag not in wikis]
+
+        if len(missing) > 0 and not self.static_inputs["offline"]:
+            fetched = {}
+            self.set_progress(0, len(missing))
+            with ThreadPoolExecutor(max_workers=self.static_inputs["concurrency"]) as executor:
+                futures = {executor.submit(self.client.fetch, tag, retry): tag for tag in missing}
+                for done, future in enumerate(as_completed(futures), start=1):
+                    body = future.result()
+                    if body is not None:
+                        fetched[futures[future]] = body
+                    self.set_progress(done, len(missing))
+            cache.set_many(fetched)
+            wikis.update(fetched)
+            self.set_progress(-1, -1)
+
+        return {
+            "tags": tags,
+            "wikis": [wikis.get(tag, "") for tag in normalized]
+        }
+
+
+class DanbooruWikiDumpImportNode(BaseNode):
+
+    def __init__(self):
+        super().__init__()
+        self.set_static_input("path", "")
+        self.set_static_input("batch_size", 10000)
+
+    @property
+    def static_input_definitions(self):
+        return {
+            "path": FileAttributeDefinition(allowed_extensions=[".json", ".jsonl"]),
+            "batch_size": IntegerAttributeDefinition(min_value=1)
+        }
+
+    @property
+    def output_definitions(self):
+        return {
+            "count": IntegerAttributeDefinition()
+        }
+
+    @staticmethod
+    def name():
+        return "Danbooru Wiki Dump Import"
+
+    @staticmethod
+    def category():
+        return "Booru"
+
+    @staticmethod
+    def __read_pages(path: str):
+        with open(path, "r", encoding="utf-8") as file:
+            if path.endswith(".jsonl"):
+                for line in file:
+                    line = line.strip()
+                    if line != "":
+                        yield json.loads(line)
+            else:
+                yield from json.load(file)
+
+    def run(self, **kwargs):
+        path = self.static_inputs["path"]
+        if path is None or not os.path.exists(path):
+            raise ValueError(f"Wiki dump {path} does not exist")
+
+        batch_size = self.static_inputs["batch_size"]
+        cache = get_wiki_cache()
+        count = 0
+        batch = {}
+        for page in self.__read_pages(path):
+            if page.get("is_deleted", False):
+                continue
+            title = page.get("title")
+            if title is None:
+                continue
+            batch[normalize_wiki_tag(title)] = page.get("body") or ""
+            if len(batch) >= batch_size:
+                cache.set_many(batch, DUMP_SOURCE)
+                count += len(batch)
+                batch = {}
+
+        if len(batch) > 0:
+            cache.set_many(batch, DUMP_SOURCE)
+            count += len(batch)
+
+        return {
+            "count": count
+        }
@@ -0,0 +1,137 @@
+import asyncio
+import threading
+import time
+from urllib.parse import urlparse
+
+import aiohttp
+
+
+class AsyncLoopThread:
+    '''
+    Long lived asyncio event loop running in a daemon thread.
+
+    Coroutines are submitted from synchronous node code with run() or submit(),
+    so sessions and connections survive between node runs.
+    '''
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.__run_loop, name="booru-http-loop", daemon=True)
+        self.thread.start()
+
+    def __run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def run(self, coroutine, timeout: float | None = None):
+        return self.submit(coroutine).result(timeout)
+
+
+_LOOP_THREAD = None
+_LOOP_THREAD_LOCK = threading.Lock()
+
+def get_loop_thread() -> AsyncLoopThread:
+    global _LOOP_THREAD
+    with _LOOP_THREAD_LOCK:
+        if _LOOP_THREAD is None:
+            _LOOP_THREAD = AsyncLoopThread()
+        return _LOOP_THREAD
+
+
+class AsyncRateLimiter:
+    '''
+    Spaces out requests to the same host so there are at most `rate` requests per second.
+    A rate of 0 disables limiting.
+    '''
+
+    def __init__(self, rate: float = 0):
+        self.rate = rate
+        self.__next_slot: dict[str, float] = {}
+        self.__locks: dict[str, asyncio.Lock] = {}
+
+    async def acquire(self, host: str):
+        if self.rate is None or self.rate <= 0:
+            return
+
+        lock = self.__locks.get(host)
+        if lock is None:
+            lock = self.__locks[host] = asyncio.Lock()
+
+        async with lock:
+            now = time.monotonic()
+            slot = max(now, self.__next_slot.get(host, now))
+            self.__next_slot[host] = slot + 1.0 / self.rate
+
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class HttpPool:
+    '''
+    Pooled aiohttp session shared by all downloads of a node.
+
+    Args:
+        concurrency (int): maximum number of requests in flight
+        rate_limit (float): maximum number of requests per second and host, 0 for no limit
+        timeout (float): total timeout of a single request in seconds
+        retry (int): number of retries of a failed request
+    '''
+
+    def __init__(self, concurrency: int = 8, rate_limit: float = 0, timeout: float = 10, retry: int = 3):
+        self.concurrency = max(1, int(concurrency))
+        self.rate_limit = rate_limit
+        self.timeout = timeout
+        self.retry = max(0, int(retry))
+        self.loop_thread = get_loop_thread()
+        self.rate_limiter = AsyncRateLimiter(rate_limit)
+        self.__session = None
+        self.__semaphore = None
+
+    async def __get_session(self) -> aiohttp.ClientSession:
+        if self.__session is None or self.__session.closed:
+            connector = aiohttp.TCPConnector(limit=self.concurrency, ttl_dns_cache=300)
+            self.__session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout))
+            self.__semaphore = asyncio.Semaphore(self.concurrency)
+        return self.__session
+
+    async def request(self, url: str, handler):
+        '''
+        Run handler(response) for a GET request with retries, rate limiting and the concurrency limit.
+        '''
+        session = await self.__get_session()
+        host = urlparse(url).netloc
+        last_exception = None
+        for attempt in range(self.retry + 1):
+            if attempt > 0:
+                await asyncio.sleep(min(2 ** (attempt - 1), 30))
+            try:
+                async with self.__semaphore:
+                    await self.rate_limiter.acquire(host)
+                    async with session.get(url) as response:
+                        response.raise_for_status()
+                        return await handler(response)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                last_exception = e
+        raise ValueError(f"Failed to download {url}: {last_exception}")
+
+    async def fetch_bytes(self, url: str) -> bytes:
+        async def read(response):
+            return await response.read()
+        return await self.request(url, read)
+
+    def run(self, coroutine):
+        return self.loop_thread.run(coroutine)
+
+    def submit(self, coroutine):
+        return self.loop_thread.submit(coroutine)
+
+    async def __close(self):
+        if self.__session is not None and not self.__session.closed:
+            await self.__session.close()
+        self.__session = None
+
+    def close(self):
+        self.run(self.__close())
@@ -16,30 +16,32 @@ class GraphNode(ProgressNode):
         self.__graph: Graph = None
         self.__file_selector = None
         self.__file_button = None
-        self.error_raised = None
+        self._on_stop += self.__stop_graph
 
-    def on_error(self, error: Exception):
-        self.error_raised = error
+    def __stop_graph(self):
+        if self.__graph is not None:
+            self.__graph.stop()
+
+    def __on_graph_node_finished(self):
+        if self.__graph is not None:
+            self.set_progress(len(self.__graph._run_results), len(self.__graph.nodes))
 
     def load_graph(self, path: str):
         try:
             print("Loading graph", path)
             self.default_inputs = {}
 
-            if self.__graph is not None:
-                self.__graph.on_error -= self._on_error.trigger
-
             self.__graph = None
             self.__input_definitions = {}
             self.__output_definitions = {}
 
-            self.__graph = Graph()
-            self.__graph.on_error += self.on_error
-            self.__graph.register_modules("src/nodes")
-            self.__graph.register_modules("custom_nodes")
-            self.__graph.load_from_file(path)
-            for node in self.__graph.nodes.values():
-                node._on_error += self._on_error.trigger
+            graph = Graph()
+            graph.register_modules("src/nodes")
+            graph.register_modules("custom_nodes")
+            graph.load_from_file(path)
+            for node in graph.nodes.values():
+                node._on_run_finished += self.__on_graph_node_finished
+            self.__graph = graph
 
             
         except Exception as e:
@@ -113,7 +115,6 @@ class GraphNode(ProgressNode):
         return super().show_custom_ui(parent)
 
     def init(self):
-        self.error_raised = None
         self.set_progress(-1, -1)
         return super().init()
 
@@ -131,14 +132,8 @@ class GraphNode(ProgressNode):
                 input_value = kwargs.get(input_name, None)
                 node.set_in(input_value)
 
-        self.__graph.run()
-
-        last_progress = 0
-        while self.__graph.is_running():
-            if self.error_raised is not None:
-                raise self.error_raised
-            last_progress = len(self.__graph._run_results)
-            self.set_progress(last_progress, count)
+        # the subgraph runs on this worker, errors of its nodes are raised here
+        self.__graph.run_inline()
 
         result = {}
         for node in self.__graph.nodes.values():
@@ -151,7 +146,7 @@ class GraphNode(ProgressNode):
             elif isinstance(node, GraphInputNode):
                 node.clear_in()
 
-        self.set_progress(last_progress, count, show_eta=False)
+        self.set_progress(count, count, show_eta=False)
         return result
 
 class _Undefined:
@@ -211,6 +206,9 @@ class GraphOutputNode(BaseNode):
 
     def get_out(self):
         return self.out_value
+
+    def has_out(self) -> bool:
+        return self.out_value != _Undefined()
     
     def clear_out(self):
         self.out_value = _Undefined()
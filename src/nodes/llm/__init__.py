@@ -1,5 +1,5 @@
 from .llm_message_nodes import LlmChatMessageNode, SplitLlmChatMessageNode, LlmChatMessageFromString, LlmChatMessagesFromString
-from .llm_chat_nodes import InferenceLlmNode
+from .llm_chat_nodes import InferenceLlmNode, BatchInferenceLlmNode
 from .openai_chat_model_nodes import OpenAiChatModelNode
 from .ollama_chat_model_nodes import OllamaChatModelNode
 
@@ -10,6 +10,7 @@ def register_nodes():
         LlmChatMessagesFromString,
         SplitLlmChatMessageNode,
         InferenceLlmNode,
+        BatchInferenceLlmNode,
         OpenAiChatModelNode,
         OllamaChatModelNode
     ]
\ No newline at end of file
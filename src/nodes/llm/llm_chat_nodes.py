@@ -1,4 +1,8 @@
 from ...graph import BaseNode, ListAttributeDefinition, AttributeDefinition, IntegerAttributeDefinition, MultipleAttributeDefinition, BoolenAttributeDefinition, FloatAttributeDefinition, StringAttributeDefinition
+from ..progress_node import ProgressNode
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import time
+import dearpygui.dearpygui as dpg
 
 
 class InferenceLlmNode(BaseNode):
@@ -12,6 +16,11 @@ class InferenceLlmNode(BaseNode):
             self.set_default_input("max_tokens", -1)
             self.set_default_input("stop", [])
             self.set_default_input("frequency_penalty", -1.0)
+            self.response_text = None
+            self.stats_text = None
+            self.__stopped = False
+            self.__last_ui_update = 0.0
+            self._on_stop += self.__stop
     
         @property
         def input_definitions(self) -> dict[str, AttributeDefinition]:
@@ -29,7 +38,8 @@ class InferenceLlmNode(BaseNode):
         @property
         def output_definitions(self) -> dict[str, AttributeDefinition]:
             return {
-                "message": AttributeDefinition(type_name="chat_message")
+                "message": AttributeDefinition(type_name="chat_message"),
+                "time_to_first_token": FloatAttributeDefinition()
             }
         
         @classmethod
@@ -40,6 +50,28 @@ class InferenceLlmNode(BaseNode):
         def category(cls) -> str:
             return "LLM"
         
+        UI_UPDATE_INTERVAL = 0.1
+
+        def __stop(self):
+            self.__stopped = True
+
+        def __ui_update_due(self) -> bool:
+            return time.perf_counter() - self.__last_ui_update >= self.UI_UPDATE_INTERVAL
+
+        def __update_ui(self, text: str, stats: str):
+            self.__last_ui_update = time.perf_counter()
+            if self.response_text is not None and dpg.does_item_exist(self.response_text):
+                dpg.set_value(self.response_text, text)
+            if self.stats_text is not None and dpg.does_item_exist(self.stats_text):
+                dpg.set_value(self.stats_text, stats)
+
+        def show_custom_ui(self, parent: int | str):
+            self.stats_text = dpg.add_text("", parent=parent)
+            self.response_text = dpg.add_text("", parent=parent, wrap=300)
+
+        def init(self):
+            self.__stopped = False
+        
         def run(self, **kwargs) -> dict:
             model = kwargs.get("model")
             messages = kwargs.get("messages")
@@ -49,4 +81,146 @@ class InferenceLlmNode(BaseNode):
             max_tokens = kwargs.get("max_tokens")
             stop = kwargs.get("stop")
             frequency_penalty = kwargs.get("frequency_penalty")
-            return {"message": model.chat(messages, message, temperature, top_p, max_tokens, stop, frequency_penalty)}
\ No newline at end of file
+
+            start = time.perf_counter()
+            first_token = None
+            tokens = []
+
+            def on_token(token: str):
+                nonlocal first_token
+                if first_token is None:
+                    first_token = time.perf_counter() - start
+                tokens.append(token)
+                # the text is only joined when it is drawn, joining it for every token is quadratic in the response length
+                if self.__ui_update_due():
+                    self.__update_ui("".join(tokens), f"TTFT: {first_token:.2f}s, tokens: {len(tokens)}")
+
+            response = model.chat(messages, message, temperature, top_p, max_tokens, stop, frequency_penalty, on_token=on_token, should_stop=lambda: self.__stopped)
+
+            time_to_first_token = first_token if first_token is not None else time.perf_counter() - start
+            self.__update_ui(response.text, f"TTFT: {time_to_first_token:.2f}s, tokens: {len(tokens)}, total: {time.perf_counter() - start:.2f}s")
+            return {"message": response, "time_to_first_token": time_to_first_token}
+
+
+class BatchInferenceLlmNode(ProgressNode):
+
+    def __init__(self):
+        super().__init__()
+        self.set_default_input("history", [])
+        self.set_default_input("messages", [])
+        self.set_default_input("conversations", [])
+        self.set_default_input("temperature", -1.0)
+        self.set_default_input("top_p", -1.0)
+        self.set_default_input("max_tokens", -1)
+        self.set_default_input("stop", [])
+        self.set_default_input("frequency_penalty", -1.0)
+        self.set_static_input("max_in_flight", 8)
+        self.set_static_input("retries", 3)
+        self.set_static_input("retry_backoff", 1.0)
+        self.executor = None
+        self.executor_size = 0
+        self.__stopped = False
+        self._on_stop += self.__stop
+
+    @property
+    def input_definitions(self) -> dict[str, AttributeDefinition]:
+        return {
+            "model": AttributeDefinition(type_name="llm"),
+            "history": ListAttributeDefinition(AttributeDefinition(type_name="chat_message")),
+            "messages": ListAttributeDefinition(AttributeDefinition(type_name="chat_message")),
+            "conversations": ListAttributeDefinition(ListAttributeDefinition(AttributeDefinition(type_name="chat_message"))),
+            "temperature": FloatAttributeDefinition(min_value=-1.0),
+            "top_p": FloatAttributeDefinition(min_value=-1.0),
+            "max_tokens": IntegerAttributeDefinition(min_value=-1),
+            "stop": ListAttributeDefinition(StringAttributeDefinition()),
+            "frequency_penalty": FloatAttributeDefinition()
+        }
+    
+    @property
+    def static_input_definitions(self) -> dict[str, AttributeDefinition]:
+        return {
+            "max_in_flight": IntegerAttributeDefinition(min_value=1),
+            "retries": IntegerAttributeDefinition(min_value=0),
+            "retry_backoff": FloatAttributeDefinition(min_value=0.0)
+        }
+    
+    @property
+    def output_definitions(self) -> dict[str, AttributeDefinition]:
+        return {
+            "messages": ListAttributeDefinition(AttributeDefinition(type_name="chat_message"))
+        }
+    
+    @classmethod
+    def name(cls) -> str:
+        return "Batch Inference LLM"
+    
+    @classmethod
+    def category(cls) -> str:
+        return "LLM"
+    
+    def __stop(self):
+        self.__stopped = True
+
+    def init(self):
+        super().init()
+        self.__stopped = False
+        max_in_flight = self.static_inputs["max_in_flight"]
+        if self.executor is not None and self.executor_size != max_in_flight:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="llm-batch")
+            self.executor_size = max_in_flight
+
+    def __chat(self, model, history, message, **kwargs):
+        retries = self.static_inputs["retries"]
+        retry_backoff = self.static_inputs["retry_backoff"]
+        for attempt in range(retries + 1):
+            if self.__stopped:
+                return None
+            try:
+                return model.chat(history, message, **kwargs, should_stop=lambda: self.__stopped)
+            except Exception as e:
+                if attempt >= retries:
+                    raise ValueError(f"LLM request failed after {retries + 1} attempts: {e}")
+                time.sleep(retry_backoff * (2 ** attempt))
+    
+    def run(self, **kwargs) -> dict:
+        model = kwargs.get("model")
+        if model is None:
+            raise ValueError("Model is not provided")
+        history = [m for m in kwargs.get("history") or [] if m is not None]
+        messages = kwargs.get("messages") or []
+        conversations = kwargs.get("conversations") or []
+        parameters = {
+            "temperature": kwargs.get("temperature"),
+            "top_p": kwargs.get("top_p"),
+            "max_tokens": kwargs.get("max_tokens"),
+            "stop": kwargs.get("stop"),
+            "frequency_penalty": kwargs.get("frequency_penalty")
+        }
+
+        # every message is an independent request, every conversation is sent as a whole
+        requests = [(history, message) for message in messages]
+        requests += [(history + list(conversation), None) for conversation in conversations]
+
+        if self.executor is None:
+            self.init()
+
+        results = [None] * len(requests)
+        futures = {
+            self.executor.submit(self.__chat, model, request_history, message, **parameters): index
+            for index, (request_history, message) in enumerate(requests)
+        }
+
+        try:
+            for done, future in enumerate(as_completed(futures), start=1):
+                results[futures[future]] = future.result()
+                self.set_progress(done, len(requests))
+        except Exception:
+            for future in futures:
+                future.cancel()
+            raise
+
+        self.set_progress(-1, -1)
+        return {"messages": results}
@@ -0,0 +1,137 @@
+import threading
+import time
+
+import httpx
+import ollama
+from openai import OpenAI
+
+
+class LlmMetrics:
+    '''
+    Request metrics of a chat model, reset at the start of every graph run.
+    '''
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.on_update = None
+        self.reset()
+
+    def reset(self, client_reused: bool | None = None):
+        with self.__lock:
+            self.client_reused = client_reused
+            self.requests = 0
+            self.failed_requests = 0
+            self.total_latency = 0.0
+            self.max_latency = 0.0
+            self.cache_hits = 0
+            self.cache_misses = 0
+        self.__notify()
+
+    def record_cache(self, hit: bool):
+        with self.__lock:
+            if hit:
+                self.cache_hits += 1
+            else:
+                self.cache_misses += 1
+        self.__notify()
+
+    def record(self, latency: float, failed: bool = False):
+        with self.__lock:
+            self.requests += 1
+            if failed:
+                self.failed_requests += 1
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+        self.__notify()
+
+    @property
+    def average_latency(self) -> float:
+        return self.total_latency / self.requests if self.requests > 0 else 0.0
+
+    def measure(self):
+        return _MeasureRequest(self)
+
+    def __notify(self):
+        if self.on_update is not None:
+            self.on_update(self)
+
+    def __str__(self) -> str:
+        client = "n/a" if self.client_reused is None else ("reused" if self.client_reused else "new")
+        return f"client: {client}\nrequests: {self.requests} ({self.failed_requests} failed)\nlatency: {self.average_latency:.2f}s avg, {self.max_latency:.2f}s max\ncache: {self.cache_hits} hits, {self.cache_misses} misses"
+
+
+class _MeasureRequest:
+    def __init__(self, metrics: LlmMetrics):
+        self.metrics = metrics
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.metrics.record(time.perf_counter() - self.start, failed=exc_type is not None)
+        return False
+
+
+class LlmClientPool:
+    '''
+    Shares chat clients, and with them their keep-alive connection pools, between
+    runs and between nodes pointing at the same server.
+    '''
+
+    MAX_CONNECTIONS = 64
+    MAX_KEEPALIVE_CONNECTIONS = 32
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__openai_clients: dict[tuple, OpenAI] = {}
+        self.__ollama_clients: dict[tuple, ollama.Client] = {}
+        self.clients_created = 0
+        self.clients_reused = 0
+
+    def __http_client(self, timeout: float) -> httpx.Client:
+        limits = httpx.Limits(max_connections=self.MAX_CONNECTIONS, max_keepalive_connections=self.MAX_KEEPALIVE_CONNECTIONS)
+        return httpx.Client(timeout=timeout, limits=limits)
+
+    def get_openai_client(self, base_url: str, api_key: str, timeout: float, max_retries: int) -> tuple[OpenAI, bool]:
+        '''
+        Returns:
+            tuple: client and whether it was reused
+        '''
+        key = (base_url, api_key, float(timeout), int(max_retries))
+        with self.__lock:
+            client = self.__openai_clients.get(key)
+            if client is not None:
+                self.clients_reused += 1
+                return client, True
+            client = OpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                timeout=timeout,
+                max_retries=int(max_retries),
+                http_client=self.__http_client(timeout),
+            )
+            self.__openai_clients[key] = client
+            self.clients_created += 1
+            return client, False
+
+    def get_ollama_client(self, base_url: str, timeout: float) -> tuple[ollama.Client, bool]:
+        '''
+        Returns:
+            tuple: client and whether it was reused
+        '''
+        key = (base_url, float(timeout))
+        with self.__lock:
+            client = self.__ollama_clients.get(key)
+            if client is not None:
+                self.clients_reused += 1
+                return client, True
+            # ollama.Client keeps its own pooled httpx client for its lifetime
+            client = ollama.Client(host=base_url, timeout=timeout)
+            self.__ollama_clients[key] = client
+            self.clients_created += 1
+            return client, False
+
+
+CLIENT_POOL = LlmClientPool()
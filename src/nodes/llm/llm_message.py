@@ -3,6 +3,7 @@ from PIL import Image
 import base64
 from io import BytesIO
 import re
+import hashlib
 from ...helpers import convert_base64_to_pil, convert_pil_to_base64, pillow_from_any_string
 
 class LlmChatMessage:
@@ -10,16 +11,68 @@ class LlmChatMessage:
         self.role: str = role
         self.text: str = text
         self.image: str|Image.Image|None= image
+        self.__image_hash = None
+        self.__image_hash_source = None
+        self.__encoded_images: dict[tuple, str] = {}
+        self.__encoded_images_source = None
 
     @property
     def base64_image(self) -> str|None:
+        return self.encode_image()
+
+    def encode_image(self, max_side: int|None = None, format: str = "png", quality: int = 90) -> str|None:
+        '''
+        Returns the image as a base64 data url, downscaled so its longest side is at most max_side.
+        Encoded images are memoized per message and encoding settings.
+        '''
         image = self.image
-        if isinstance(self.image, str):
-            if self.image.startswith("data:image"):
-                return self.image
-            image = pillow_from_any_string(self.image)
-        if image:
-            return convert_pil_to_base64(image)
+        if image is None:
+            return None
+        if self.__encoded_images_source is not image:
+            self.__encoded_images = {}
+            self.__encoded_images_source = image
+
+        key = (max_side, format, quality)
+        encoded = self.__encoded_images.get(key)
+        if encoded is not None:
+            return encoded
+
+        if isinstance(image, str):
+            if image.startswith("data:image") and not max_side:
+                return image
+            image = pillow_from_any_string(image)
+        if not image:
+            return None
+
+        encoded = convert_pil_to_base64(image, format=format, quality=quality, max_side=max_side)
+        self.__encoded_images[key] = encoded
+        return encoded
+
+    @property
+    def image_hash(self) -> str|None:
+        '''
+        Hash of the image content, used instead of the encoded image when comparing messages.
+        '''
+        image = self.image
+        if image is None:
+            return None
+        if self.__image_hash is not None and self.__image_hash_source is image:
+            return self.__image_hash
+
+        digest = hashlib.sha256()
+        if isinstance(image, Image.Image):
+            digest.update(f"{image.mode}:{image.size}".encode())
+            digest.update(image.tobytes())
+        elif isinstance(image, str) and not image.startswith("data:image") and os.path.isfile(image):
+            with open(image, "rb") as file:
+                for chunk in iter(lambda: file.read(1024 * 1024), b""):
+                    digest.update(chunk)
+        else:
+            digest.update(str(image).encode())
+
+        self.__image_hash = digest.hexdigest()
+        self.__image_hash_source = image
+        return self.__image_hash
 
     @property
     def pil_image(self) -> Image.Image|None:
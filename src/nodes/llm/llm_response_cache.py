@@ -0,0 +1,163 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from typing import Callable, Iterator
+
+from ...settings import SETTINGS
+from .llm_message import LlmChatMessage
+
+CACHE_MODES = ["auto", "always", "never"]
+
+
+def response_cache_key(model_id: str, messages: list[LlmChatMessage], parameters: dict) -> str:
+    '''
+    Key of a chat request: the model, the message list with images replaced by their hash, and sampling parameters.
+    '''
+    normalized = {
+        "model": model_id,
+        "messages": [
+            {
+                "role": message.role,
+                "text": message.text,
+                "image": message.image_hash,
+            }
+            for message in messages if message is not None
+        ],
+        "parameters": parameters,
+    }
+    data = json.dumps(normalized, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def should_use_cache(mode: str, temperature: float | None) -> bool:
+    if mode == "always":
+        return True
+    if mode == "auto":
+        # only deterministic sampling gives the same answer again
+        return temperature is not None and temperature == 0
+    return False
+
+
+def cached_chat(chat_model, model_id: str, messages: list[LlmChatMessage], message: LlmChatMessage|None, parameters: dict,
+                stream: Callable[[], Iterator[str]], role: str,
+                on_token: Callable[[str], None]|None = None,
+                should_stop: Callable[[], bool]|None = None,
+                ) -> LlmChatMessage:
+    '''
+    Answers a chat request from the response cache of chat_model if its cache mode allows it, otherwise
+    collects the tokens of stream() and caches the response unless it was stopped.
+    A cached response is passed to on_token at once, so streaming callers see the same text.
+    '''
+    cache_key = None
+    if chat_model.response_cache is not None and should_use_cache(chat_model.cache_mode, parameters.get("temperature")):
+        parameters = {
+            **parameters,
+            "image_encoding": [chat_model.image_max_side, chat_model.image_format, chat_model.image_quality],
+        }
+        cache_key = response_cache_key(model_id, [*messages, message], parameters)
+        cached = chat_model.response_cache.get(cache_key)
+        chat_model.metrics.record_cache(cached is not None)
+        if cached is not None:
+            if on_token is not None:
+                on_token(cached.text)
+            return cached
+
+    tokens = []
+    stopped = False
+    response = stream()
+    try:
+        for token in response:
+            tokens.append(token)
+            if on_token is not None:
+                on_token(token)
+            if should_stop is not None and should_stop():
+                stopped = True
+                break
+    finally:
+        response.close()
+
+    response_message = LlmChatMessage(role=role, text="".join(tokens))
+
+    if cache_key is not None and not stopped:
+        chat_model.response_cache.set(cache_key, response_message)
+
+    return response_message
+
+
+class LlmResponseCache:
+    '''
+    Persistent LLM response cache stored in SQLite with least recently used eviction.
+    '''
+
+    def __init__(self, path: str, max_entries: int = 100000):
+        directory = os.path.dirname(path)
+        if directory != "":
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_entries = max(1, int(max_entries))
+        self.hits = 0
+        self.misses = 0
+        self.__lock = threading.Lock()
+        self.__connection = sqlite3.connect(path, check_same_thread=False)
+        self.__connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, role TEXT NOT NULL, text TEXT NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.__connection.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self.__connection.commit()
+        # counted once, COUNT(*) on every insert would scan the whole table
+        self.__count = self.__connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def get(self, key: str) -> LlmChatMessage | None:
+        with self.__lock:
+            row = self.__connection.execute("SELECT role, text FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.__connection.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.__connection.commit()
+        return LlmChatMessage(role=row[0], text=row[1])
+
+    def set(self, key: str, message: LlmChatMessage):
+        with self.__lock:
+            exists = self.__connection.execute("SELECT 1 FROM responses WHERE key = ?", (key,)).fetchone() is not None
+            self.__connection.execute(
+                "INSERT OR REPLACE INTO responses (key, role, text, last_used) VALUES (?, ?, ?, ?)",
+                (key, message.role, message.text, time.time())
+            )
+            if not exists:
+                self.__count += 1
+            if self.__count > self.max_entries:
+                cursor = self.__connection.execute(
+                    "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_used ASC LIMIT ?)",
+                    (self.__count - self.max_entries,)
+                )
+                self.__count -= cursor.rowcount
+            self.__connection.commit()
+
+    def clear(self):
+        with self.__lock:
+            self.__connection.execute("DELETE FROM responses")
+            self.__connection.commit()
+            self.__count = 0
+            self.hits = 0
+            self.misses = 0
+
+
+_RESPONSE_CACHE = None
+_RESPONSE_CACHE_LOCK = threading.Lock()
+
+def get_response_cache(max_entries: int) -> LlmResponseCache:
+    '''
+    Returns the response cache shared by all chat models, it keeps the largest size any node asked for.
+    '''
+    global _RESPONSE_CACHE
+    with _RESPONSE_CACHE_LOCK:
+        if _RESPONSE_CACHE is None:
+            path = os.path.join(SETTINGS.get("cache_dir", "cache"), "llm_responses.sqlite")
+            _RESPONSE_CACHE = LlmResponseCache(path, max_entries)
+        _RESPONSE_CACHE.max_entries = max(_RESPONSE_CACHE.max_entries, int(max_entries))
+        return _RESPONSE_CACHE
@@ -2,6 +2,7 @@
 
 import ollama
 import sys
+from typing import Callable, Iterator
 
 import dearpygui.dearpygui as dpg
 
@@ -10,14 +11,18 @@ if __name__ == "__main__":
     sys.path.append("")
     from src.nodes.llm.llm_message import LlmChatMessage
     from src.helpers import pillow_from_any_string, convert_pil_to_base64
-    from src.graph import BaseNode, AttributeDefinition, ComboAttributeDefinition, FloatAttributeDefinition, StringAttributeDefinition
+    from src.graph import BaseNode, AttributeDefinition, ComboAttributeDefinition, FloatAttributeDefinition, StringAttributeDefinition, IntegerAttributeDefinition
     from src.nodes.llm.llm_message import LlmChatMessage
+    from src.nodes.llm.llm_client_pool import CLIENT_POOL, LlmMetrics
+    from src.nodes.llm.llm_response_cache import LlmResponseCache, CACHE_MODES, cached_chat, get_response_cache
 else:
 
     from .llm_message import LlmChatMessage
     from ...helpers import pillow_from_any_string, convert_pil_to_base64
-    from ...graph import BaseNode, AttributeDefinition, ComboAttributeDefinition, FloatAttributeDefinition, StringAttributeDefinition
+    from ...graph import BaseNode, AttributeDefinition, ComboAttributeDefinition, FloatAttributeDefinition, StringAttributeDefinition, IntegerAttributeDefinition
     from .llm_message import LlmChatMessage
+    from .llm_client_pool import CLIENT_POOL, LlmMetrics
+    from .llm_response_cache import LlmResponseCache, CACHE_MODES, cached_chat, get_response_cache
 
 
 class OllamaChatModel:
@@ -26,6 +31,14 @@ class OllamaChatModel:
         self.base_url = base_url
         self.timeout = timeout
         self.model = model
+        self.client, client_reused = CLIENT_POOL.get_ollama_client(base_url, timeout)
+        self.metrics = LlmMetrics()
+        self.metrics.reset(client_reused)
+        self.response_cache: LlmResponseCache|None = None
+        self.cache_mode = "never"
+        self.image_max_side = 0
+        self.image_format = "png"
+        self.image_quality = 90
 
     def get_models(self, timeout: int = 3,):
         return [model["name"] for model in ollama.Client(host = self.base_url, timeout = timeout).list()["models"]]
@@ -37,11 +50,11 @@ class OllamaChatModel:
         }
 
         if message.image:
-            messsage_dict["images"] = [ message.base64_image.split(",")[1] ]
+            messsage_dict["images"] = [ message.encode_image(self.image_max_side, self.image_format, self.image_quality).split(",")[1] ]
 
         return messsage_dict
     
-    def chat(self, 
+    def stream(self, 
              messages: list[LlmChatMessage] = [],
              message: LlmChatMessage|None = None,
              temperature: float|None = None,
@@ -49,31 +62,57 @@ class OllamaChatModel:
              max_tokens: int|None = None,
              stop: list[str]|None = None,
              frequency_penalty: float|None = None,
-             ) -> LlmChatMessage:
-        
+             ) -> Iterator[str]:
+        '''
+        Yields response tokens as they arrive. Closing the generator closes the response and stops the generation.
+        '''
         messages = [m for m in messages if m is not None]
         history = [self.__llm_message_to_ollama_format(m) for m in messages]
         if message:
             history.append(self.__llm_message_to_ollama_format(message))
 
-        response = ollama.Client(host = self.base_url, timeout = self.timeout).chat(
-            model=self.model,
-            messages=history,
-            stream=True,
-            options=ollama.Options(
-                top_p=top_p,
-                temperature=temperature,
-                max_tokens=max_tokens,
-                stop=stop,
-                frequency_penalty=frequency_penalty,
+        with self.metrics.measure():
+            response = self.client.chat(
+                model=self.model,
+                messages=history,
+                stream=True,
+                options=ollama.Options(
+                    top_p=top_p,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    stop=stop,
+                    frequency_penalty=frequency_penalty,
+                )
             )
-        )
 
-        message = ""
-        for part in response:
-            message += part['message']['content']
+            try:
+                for part in response:
+                    yield part['message']['content']
+            finally:
+                response.close()
 
-        return LlmChatMessage(role="response", text=message, image=None)
+    def chat(self, 
+             messages: list[LlmChatMessage] = [],
+             message: LlmChatMessage|None = None,
+             temperature: float|None = None,
+             top_p: float|None = None,
+             max_tokens: int|None = None,
+             stop: list[str]|None = None,
+             frequency_penalty: float|None = None,
+             on_token: Callable[[str], None]|None = None,
+             should_stop: Callable[[], bool]|None = None,
+             ) -> LlmChatMessage:
+        
+        parameters = {
+            "temperature": temperature,
+            "top_p": top_p,
+            "max_tokens": max_tokens,
+            "stop": stop,
+            "frequency_penalty": frequency_penalty,
+        }
+        return cached_chat(self, f"ollama:{self.base_url}:{self.model}", messages, message, parameters,
+                           lambda: self.stream(messages, message, temperature, top_p, max_tokens, stop, frequency_penalty),
+                           "response", on_token, should_stop)
     
 
 
@@ -85,6 +124,13 @@ class OllamaChatModelNode(BaseNode):
         self.set_static_input("api_key", "<DUMMY_KEY>")
         self.set_static_input("timeout", 60.0)
         self.set_static_input("model", "")
+        self.set_static_input("response_cache", "auto")
+        self.set_static_input("cache_size", 100000)
+        self.set_static_input("image_max_side", 1024)
+        self.set_static_input("image_format", "jpeg")
+        self.set_static_input("image_quality", 90)
+        self.chat_model = None
+        self.metrics_text = None
 
     @property
     def static_input_definitions(self) -> dict[str, AttributeDefinition]:
@@ -92,7 +138,12 @@ class OllamaChatModelNode(BaseNode):
             "base_url": StringAttributeDefinition(),
             "api_key": StringAttributeDefinition(),
             "timeout": FloatAttributeDefinition(),
-            "model": ComboAttributeDefinition(values_callback=lambda:self.__get_model().get_models())
+            "model": ComboAttributeDefinition(values_callback=lambda:self.__get_model().get_models()),
+            "response_cache": ComboAttributeDefinition(values_callback=lambda: CACHE_MODES, allow_custom=False),
+            "cache_size": IntegerAttributeDefinition(min_value=1),
+            "image_max_side": IntegerAttributeDefinition(min_value=0),
+            "image_format": ComboAttributeDefinition(values_callback=lambda: ["png", "jpeg", "webp"], allow_custom=False),
+            "image_quality": IntegerAttributeDefinition(min_value=1, max_value=100)
         }
     
     @property
@@ -116,8 +167,34 @@ class OllamaChatModelNode(BaseNode):
         model = self.static_inputs["model"]
         return OllamaChatModel(api_key, base_url, timeout, model)
     
+    def __update_metrics_text(self, metrics: LlmMetrics):
+        if self.metrics_text is not None and dpg.does_item_exist(self.metrics_text):
+            dpg.set_value(self.metrics_text, str(metrics))
+
+    def show_custom_ui(self, parent: int | str):
+        self.metrics_text = dpg.add_text("", parent=parent)
+
+    def init(self):
+        model = self.__get_model()
+        if self.chat_model is not None:
+            same_client = self.chat_model.client is model.client
+            if same_client and self.chat_model.model == model.model:
+                # keep the model and its pooled client, only start new metrics for this run
+                model = self.chat_model
+                model.metrics.reset(True)
+        self.chat_model = model
+        self.chat_model.metrics.on_update = self.__update_metrics_text
+        self.chat_model.cache_mode = self.static_inputs["response_cache"]
+        self.chat_model.image_max_side = self.static_inputs["image_max_side"]
+        self.chat_model.image_format = self.static_inputs["image_format"]
+        self.chat_model.image_quality = self.static_inputs["image_quality"]
+        self.chat_model.response_cache = get_response_cache(self.static_inputs["cache_size"]) if self.chat_model.cache_mode != "never" else None
+        self.__update_metrics_text(self.chat_model.metrics)
+
     def run(self, **kwargs) -> dict:
-        return {"model": self.__get_model()}
+        if self.chat_model is None:
+            self.init()
+        return {"model": self.chat_model}
 
 
 if __name__ == "__main__":
@@ -1,25 +1,27 @@
-from ...graph import BaseNode, AttributeDefinition, ComboAttributeDefinition, FloatAttributeDefinition, StringAttributeDefinition
+from ...graph import BaseNode, AttributeDefinition, ComboAttributeDefinition, FloatAttributeDefinition, StringAttributeDefinition, IntegerAttributeDefinition
 import dearpygui.dearpygui as dpg
+from typing import Callable, Iterator
 from .llm_message import LlmChatMessage
 
-from openai import OpenAI
-
 from .llm_message import LlmChatMessage
+from .llm_client_pool import CLIENT_POOL, LlmMetrics
+from .llm_response_cache import LlmResponseCache, CACHE_MODES, cached_chat, get_response_cache
 
 class OpenAIChatModel:
     def __init__(self, api_key, base_url, timeout, max_retries, model = ""):
         self.api_key = api_key
         self.base_url = base_url
         self.timeout = timeout
+        self.max_retries = max_retries
         self.model = model
-        client = OpenAI(
-            api_key=self.api_key,
-            base_url=self.base_url,
-            timeout=self.timeout,
-            max_retries=max_retries,
-        )
-
-        self.client = client
+        self.client, client_reused = CLIENT_POOL.get_openai_client(base_url, api_key, timeout, max_retries)
+        self.metrics = LlmMetrics()
+        self.metrics.reset(client_reused)
+        self.response_cache: LlmResponseCache|None = None
+        self.cache_mode = "never"
+        self.image_max_side = 0
+        self.image_format = "png"
+        self.image_quality = 90
 
     def get_models(self, timeout: int = 3,):
         return [model.id for model in self.client.models.list(timeout=timeout)]
@@ -39,13 +41,13 @@ class OpenAIChatModel:
                 {
                     "type": "image_url",
                     "image_url": {
-                        "url": message.base64_image,
+                        "url": message.encode_image(self.image_max_side, self.image_format, self.image_quality),
                     }
                 }
             )
         return messsage_dict
 
-    def chat(self, 
+    def stream(self, 
              messages: list[LlmChatMessage], 
              message: LlmChatMessage|None,
              temperature: float,
@@ -53,8 +55,10 @@ class OpenAIChatModel:
              max_tokens: int,
              stop: list[str],
              frequency_penalty: float,
-
-             ) -> LlmChatMessage:
+             ) -> Iterator[str]:
+        '''
+        Yields response tokens as they arrive. Closing the generator closes the response and stops the generation.
+        '''
         messages = [m for m in messages if m is not None]
         history = [self.__llm_message_to_openai_format(m) for m in messages]
         if message:
@@ -71,28 +75,49 @@ class OpenAIChatModel:
             frequency_penalty = None
             
 
-        response = self.client.chat.completions.create(
-            model=self.model,
-            messages=history,
-            temperature=temperature,
-            top_p=top_p,
-            max_tokens=max_tokens,
-            stop=stop,
-            frequency_penalty=frequency_penalty,
-            stream=True,
-        )
-
-        response_message = ""
-        for chunk in response:
-            content = chunk.choices[0].delta.content
-            if content == None:
-                content = " "
-            response_message += content
-
-        return LlmChatMessage(
-            role="assistant",
-            text=response_message
-        )
+        with self.metrics.measure():
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=history,
+                temperature=temperature,
+                top_p=top_p,
+                max_tokens=max_tokens,
+                stop=stop,
+                frequency_penalty=frequency_penalty,
+                stream=True,
+            )
+
+            try:
+                for chunk in response:
+                    content = chunk.choices[0].delta.content
+                    if content == None:
+                        content = " "
+                    yield content
+            finally:
+                response.close()
+
+    def chat(self, 
+             messages: list[LlmChatMessage], 
+             message: LlmChatMessage|None,
+             temperature: float,
+             top_p: float,
+             max_tokens: int,
+             stop: list[str],
+             frequency_penalty: float,
+             on_token: Callable[[str], None]|None = None,
+             should_stop: Callable[[], bool]|None = None,
+             ) -> LlmChatMessage:
+        
+        parameters = {
+            "temperature": temperature,
+            "top_p": top_p,
+            "max_tokens": max_tokens,
+            "stop": stop,
+            "frequency_penalty": frequency_penalty,
+        }
+        return cached_chat(self, f"openai:{self.base_url}:{self.model}", messages, message, parameters,
+                           lambda: self.stream(messages, message, temperature, top_p, max_tokens, stop, frequency_penalty),
+                           "assistant", on_token, should_stop)
 
 
 class OpenAiChatModelNode(BaseNode):
@@ -104,6 +129,13 @@ class OpenAiChatModelNode(BaseNode):
         self.set_static_input("timeout", 60.0)
         self.set_static_input("max_retries", 3)
         self.set_static_input("model", "")
+        self.set_static_input("response_cache", "auto")
+        self.set_static_input("cache_size", 100000)
+        self.set_static_input("image_max_side", 1024)
+        self.set_static_input("image_format", "jpeg")
+        self.set_static_input("image_quality", 90)
+        self.chat_model = None
+        self.metrics_text = None
 
     @property
     def static_input_definitions(self) -> dict[str, AttributeDefinition]:
@@ -112,7 +144,12 @@ class OpenAiChatModelNode(BaseNode):
             "api_key": StringAttributeDefinition(),
             "timeout": FloatAttributeDefinition(),
             "max_retries": FloatAttributeDefinition(),
-            "model": ComboAttributeDefinition(values_callback=lambda:self.__get_model().get_models())
+            "model": ComboAttributeDefinition(values_callback=lambda:self.__get_model().get_models()),
+            "response_cache": ComboAttributeDefinition(values_callback=lambda: CACHE_MODES, allow_custom=False),
+            "cache_size": IntegerAttributeDefinition(min_value=1),
+            "image_max_side": IntegerAttributeDefinition(min_value=0),
+            "image_format": ComboAttributeDefinition(values_callback=lambda: ["png", "jpeg", "webp"], allow_custom=False),
+            "image_quality": IntegerAttributeDefinition(min_value=1, max_value=100)
         }
     
     @property
@@ -137,5 +174,31 @@ class OpenAiChatModelNode(BaseNode):
         model = self.static_inputs["model"]
         return OpenAIChatModel(api_key, base_url, timeout, max_retries, model)
     
+    def __update_metrics_text(self, metrics: LlmMetrics):
+        if self.metrics_text is not None and dpg.does_item_exist(self.metrics_text):
+            dpg.set_value(self.metrics_text, str(metrics))
+
+    def show_custom_ui(self, parent: int | str):
+        self.metrics_text = dpg.add_text("", parent=parent)
+
+    def init(self):
+        model = self.__get_model()
+        if self.chat_model is not None:
+            same_client = self.chat_model.client is model.client
+            if same_client and self.chat_model.model == model.model:
+                # keep the model and its pooled client, only start new metrics for this run
+                model = self.chat_model
+                model.metrics.reset(True)
+        self.chat_model = model
+        self.chat_model.metrics.on_update = self.__update_metrics_text
+        self.chat_model.cache_mode = self.static_inputs["response_cache"]
+        self.chat_model.image_max_side = self.static_inputs["image_max_side"]
+        self.chat_model.image_format = self.static_inputs["image_format"]
+        self.chat_model.image_quality = self.static_inputs["image_quality"]
+        self.chat_model.response_cache = get_response_cache(self.static_inputs["cache_size"]) if self.chat_model.cache_mode != "never" else None
+        self.__update_metrics_text(self.chat_model.metrics)
+
     def run(self, **kwargs) -> dict:
-        return {"model": self.__get_model()}
\ No newline at end of file
+        if self.chat_model is None:
+            self.init()
+        return {"model": self.chat_model}
@@ -86,7 +86,7 @@ class Florence2Model:
         parsed_images = []
         for i, image in enumerate(images):
             if isinstance(image, str):
-                parsed_images.append(pillow_from_any_string(image).convert("RGB"))
+                parsed_images.append(pillow_from_any_string(image, "RGB"))
             elif isinstance(image, Image.Image):
                 parsed_images.append(image.convert("RGB"))
             else:
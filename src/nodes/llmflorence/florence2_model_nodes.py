@@ -1,6 +1,7 @@
 from ...graph import BaseNode, ComboAttributeDefinition, AttributeDefinition, FileAttributeDefinition, IntegerAttributeDefinition, MultiFileAttributeDefinition, ListAttributeDefinition, StringAttributeDefinition, MultipleAttributeDefinition
 from .florence2_model import Florence2Model
 from ...settings import SETTINGS
+from ...model_manager import MODEL_MANAGER
 from ..progress_node import ProgressNode
 import dearpygui.dearpygui as dpg
 
@@ -23,6 +24,7 @@ class Florence2ModelNode(BaseNode):
         self.set_static_input("precision", "fp16")
         self.model = None
         self.unload_model_button = None
+        self._on_graph_finished += lambda: MODEL_MANAGER.release(self)
 
     @property
     def static_input_definitions(self) -> dict[str, AttributeDefinition]:
@@ -38,7 +40,11 @@ class Florence2ModelNode(BaseNode):
         return {
             "model": AttributeDefinition(type_name="florence2_vlm")
         }
-    
+
+    @property
+    def preload_init(self) -> bool:
+        return True
+
     def init(self):
         model = self.static_inputs["model"]
         device = self.static_inputs["device"]
@@ -50,11 +56,14 @@ class Florence2ModelNode(BaseNode):
             same_device = self.model.device == device
             same_cache_dir = self.model.cache_dir == cache_dir
             same_precision = self.model.precision == precision
-            if same_model and same_device and same_cache_dir and same_precision:
+            # use() fails if the model was unloaded for the memory budget meanwhile
+            if same_model and same_device and same_cache_dir and same_precision and MODEL_MANAGER.use(self):
                 return
             self.unload_model()
 
-        self.model = Florence2Model(model=model, device=device, cache_dir=cache_dir, precision=precision)
+        with MODEL_MANAGER.measure() as load:
+            self.model = Florence2Model(model=model, device=device, cache_dir=cache_dir, precision=precision)
+        MODEL_MANAGER.register(self, model, self.unload_model, load.ram, load.vram)
         if self.unload_model_button is not None and dpg.does_item_exist(self.unload_model_button):
             dpg.show_item(self.unload_model_button)
 
@@ -62,6 +71,7 @@ class Florence2ModelNode(BaseNode):
         if self.model is not None:
             self.model.unload_model()
             self.model = None
+            MODEL_MANAGER.unregister(self)
             if self.unload_model_button is not None and dpg.does_item_exist(self.unload_model_button):
                 dpg.hide_item(self.unload_model_button)
 
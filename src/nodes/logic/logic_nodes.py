@@ -451,6 +451,7 @@ class WaitForAllInputs(BaseNode):
         super().__init__()
         self._input_definitions = {}
         self._output_definitions = {}
+        self.__resize_definitions()
 
         self._on_input_connected += self.__on_input_connected
         self._on_input_disconnected += self.__on_input_disconnected
@@ -468,26 +469,29 @@ class WaitForAllInputs(BaseNode):
             self._output_definitions[input_name] = AnyAttributeDefinition()
             self.refresh_ui()
         
+    def __resize_definitions(self):
+        count = self.static_inputs.get("count", 2)
+        for definitions in (self._input_definitions, self._output_definitions):
+            for i in range(len(definitions), count):
+                definitions[f"in{i}"] = AnyAttributeDefinition()
+            for i in range(count, len(definitions)):
+                definitions.pop(f"in{i}", None)
+
+    def set_static_input(self, input_name: str, value):
+        super().set_static_input(input_name, value)
+        self.__resize_definitions()
+
+    def load_from_dict(self, data: dict):
+        super().load_from_dict(data)
+        self.__resize_definitions()
+        self.invalidate_definitions()
+
     @property
     def input_definitions(self) -> dict[str, AttributeDefinition]:
-        inputs_count = self.static_inputs.get("count", 2)
-        if len(self._input_definitions) < inputs_count:
-            for i in range(len(self._input_definitions), inputs_count):
-                self._input_definitions[f"in{i}"] = AnyAttributeDefinition()
-        elif len(self._input_definitions) > inputs_count:
-            for i in range(inputs_count, len(self._input_definitions)):
-                del self._input_definitions[f"in{i}"]
         return self._input_definitions
     
     @property
     def output_definitions(self) -> dict[str, AttributeDefinition]:
-        outputs_count = self.static_inputs.get("count", 2)
-        if len(self._output_definitions) < outputs_count:
-            for i in range(len(self._output_definitions), outputs_count):
-                self._output_definitions[f"in{i}"] = AnyAttributeDefinition()
-        elif len(self._output_definitions) > outputs_count:
-            for i in range(outputs_count, len(self._output_definitions)):
-                del self._output_definitions[f"in{i}"]
         return self._output_definitions
 
     @classmethod
@@ -1,6 +1,7 @@
 from ...graph import BaseNode, AttributeDefinition, AttributeKind, AnyAttributeDefinition, FloatAttributeDefinition, MultipleAttributeDefinition, StringAttributeDefinition, ListAttributeDefinition, IntegerAttributeDefinition, DPG_DEFAULT_INPUT_WIDTH
 from ...helpers import pillow_from_any_string
 import src.helpers as helpers
+from ...thumbnails import THUMBNAILS
 
 import time
 import os
@@ -148,11 +149,7 @@ class DisplayNode(BaseNode):
         dpg.hide_item(self.__file_content_tag)
         dpg.show_item(self.__image_tag)
 
-        image = Image.open(image_path)
-        image = helpers.convert_to_thumbnail(image)
-        cv = helpers.convert_pil_to_cv(image)
-        dpg_texture = helpers.convert_cv_to_dpg(cv)
-        dpg.set_value(self.__texture_tag, dpg_texture)
+        THUMBNAILS.submit(self.__texture_tag, image_path)
 
         dpg.set_value(self.__text_tag, "Image file: " + image_path)
 
@@ -161,15 +158,7 @@ class DisplayNode(BaseNode):
         dpg.hide_item(self.__file_content_tag)
         dpg.show_item(self.__image_tag)
 
-        images = [Image.open(image_path) for image_path in image_paths]
-
-        # limit to 16 images
-        images = images[:16]
-
-        image = helpers.images_thumbnail(images)
-        cv = helpers.convert_pil_to_cv(image)
-        dpg_texture = helpers.convert_cv_to_dpg(cv)
-        dpg.set_value(self.__texture_tag, dpg_texture)
+        THUMBNAILS.submit(self.__texture_tag, image_paths)
         dpg.set_value(self.__text_tag, f"Images: {len(image_paths)}")
 
     def _show_base64_image(self, base64_image: str):
@@ -177,11 +166,7 @@ class DisplayNode(BaseNode):
         dpg.hide_item(self.__file_content_tag)
         dpg.show_item(self.__image_tag)
 
-        image = helpers.convert_base64_to_pil(base64_image)
-        image = helpers.convert_to_thumbnail(image)
-        cv = helpers.convert_pil_to_cv(image)
-        dpg_texture = helpers.convert_cv_to_dpg(cv)
-        dpg.set_value(self.__texture_tag, dpg_texture)
+        THUMBNAILS.submit(self.__texture_tag, base64_image)
 
 
     def _show_base64_images(self, base64_images: list[str]):
@@ -189,15 +174,7 @@ class DisplayNode(BaseNode):
         dpg.hide_item(self.__file_content_tag)
         dpg.show_item(self.__image_tag)
 
-        images = [helpers.convert_base64_to_pil(base64_image) for base64_image in base64_images]
-
-        # limit to 16 images
-        images = images[:16]
-
-        image = helpers.images_thumbnail(images)
-        cv = helpers.convert_pil_to_cv(image)
-        dpg_texture = helpers.convert_cv_to_dpg(cv)
-        dpg.set_value(self.__texture_tag, dpg_texture)
+        THUMBNAILS.submit(self.__texture_tag, base64_images)
         dpg.set_value(self.__text_tag, f"Images: {len(base64_images)}")
     
     def run(self, **kwargs) -> dict:
@@ -427,24 +404,16 @@ class DisplayImage(BaseNode):
         if self.image_id is None or not dpg.does_item_exist(self.image_id):
             return
 
+        if not isinstance(image, (str, Image.Image)):
+            dpg.hide_item(self.image_id)
+            return
+
         dpg.show_item(self.image_id)
+        THUMBNAILS.submit(self.texture_id, image, self.IMAGE_SIZE, on_error=self.__hide_image)
 
-        try:
-            if isinstance(image, str):
-                image = pillow_from_any_string(image)
-            elif isinstance(image, Image.Image):
-                image = image
-            else:
-                dpg.hide_item(self.image_id)
-                return
-
-            image = helpers.convert_to_thumbnail(image, self.IMAGE_SIZE)
-            cv = helpers.convert_pil_to_cv(image)
-            dpg_texture = helpers.convert_cv_to_dpg(cv, self.IMAGE_SIZE)
-            dpg.set_value(self.texture_id, dpg_texture)
-        except:
+    def __hide_image(self, _):
+        if self.image_id is not None and dpg.does_item_exist(self.image_id):
             dpg.hide_item(self.image_id)
-            return
 
     def show_multiple(self, images: list[str|Image.Image]):
         if self.image_id is None or not dpg.does_item_exist(self.image_id):
@@ -452,28 +421,8 @@ class DisplayImage(BaseNode):
 
         dpg.show_item(self.image_id)
 
-        if len(images) > 16:
-            images = images[:16]
-
-        result_images = []
-        for image in images:
-            try:
-                if isinstance(image, str):
-                    image = pillow_from_any_string(image)
-                elif isinstance(image, Image.Image):
-                    image = image
-                else:
-                    continue
-            except:
-                image = None
-            if image is not None:
-                image = image.convert("RGB")
-                result_images.append(image)
-
-        image = helpers.images_thumbnail(result_images, self.IMAGE_SIZE)
-        cv = helpers.convert_pil_to_cv(image)
-        dpg_texture = helpers.convert_cv_to_dpg(cv, self.IMAGE_SIZE)
-        dpg.set_value(self.texture_id, dpg_texture)
+        images = [image for image in images if isinstance(image, (str, Image.Image))]
+        THUMBNAILS.submit(self.texture_id, images, self.IMAGE_SIZE, on_error=self.__hide_image)
 
     def run(self, **kwargs) -> dict:
         input = kwargs["images"]
@@ -1,62 +1,158 @@
 from ..graph import BaseNode
 import dearpygui.dearpygui as dpg
+import threading
+import weakref
 import time
 
+_PROGRESS_NODES = weakref.WeakSet()
+_PROGRESS_NODES_LOCK = threading.Lock()
+
+
+def format_progress(current: int, total: int, show_eta: bool = True, eta: float | None = None) -> str:
+    if not show_eta:
+        return f"{current}/{total}"
+    if eta is None:
+        return f"{current}/{total} ETA: N/A"
+    return f"{current}/{total} ETA: {eta:.1f}s"
+
+
+class ProgressSampler:
+    '''
+    Estimates the remaining time of a progress counter from an exponential moving average of its rate.
+    '''
+
+    def __init__(self, smoothing: float = 0.3):
+        self.smoothing = smoothing
+        self.reset()
+
+    def reset(self):
+        self.rate = None
+        self.__last_current = None
+        self.__last_time = None
+
+    def sample(self, current: int, total: int, now: float) -> float | None:
+        if self.__last_current is None or current < self.__last_current:
+            self.reset()
+            self.__last_current = current
+            self.__last_time = now
+            return None
+
+        done = current - self.__last_current
+        elapsed = now - self.__last_time
+        # without new items the interval keeps growing, so a slow item is measured as a whole
+        if done > 0 and elapsed > 0:
+            rate = done / elapsed
+            self.rate = rate if self.rate is None else self.smoothing * rate + (1 - self.smoothing) * self.rate
+            self.__last_current = current
+            self.__last_time = now
+
+        if self.rate is None or self.rate <= 0:
+            return None
+        return max(0, total - current) / self.rate
+
+
+class ProgressMonitor:
+    '''
+    Samples the progress counters of all progress nodes at a fixed rate.
+
+    Nodes only store their counters, the monitor reads them from the GUI thread or the headless runner.
+    '''
+
+    def __init__(self, interval: float = 0.1, smoothing: float = 0.3):
+        self.interval = interval
+        self.smoothing = smoothing
+        self.__last_poll = 0.0
+        self.__samplers = weakref.WeakKeyDictionary()
+
+    @staticmethod
+    def register(node: "ProgressNode"):
+        with _PROGRESS_NODES_LOCK:
+            _PROGRESS_NODES.add(node)
+
+    def sample(self) -> list[tuple["ProgressNode", int, int, bool, float | None]]:
+        '''
+        Returns:
+            list: node, current, total, show_eta and eta of every node with an active progress
+        '''
+        with _PROGRESS_NODES_LOCK:
+            nodes = list(_PROGRESS_NODES)
+
+        now = time.monotonic()
+        samples = []
+        for node in nodes:
+            current, total, show_eta = node.progress
+            if current == -1 or total == -1:
+                self.__samplers.pop(node, None)
+                continue
+            sampler = self.__samplers.get(node)
+            if sampler is None:
+                sampler = self.__samplers[node] = ProgressSampler(self.smoothing)
+            samples.append((node, current, total, show_eta, sampler.sample(current, total, now)))
+        return samples
+
+    def poll(self) -> bool:
+        '''
+        Updates the progress bars if the interval has passed since the last update, called every GUI frame.
+        '''
+        now = time.monotonic()
+        if now - self.__last_poll < self.interval:
+            return False
+        self.__last_poll = now
+
+        with _PROGRESS_NODES_LOCK:
+            nodes = list(_PROGRESS_NODES)
+        active = {node: (current, total, show_eta, eta) for node, current, total, show_eta, eta in self.sample()}
+        for node in nodes:
+            node._show_progress(*active.get(node, (-1, -1, True, None)))
+        return True
+
+
+PROGRESS_MONITOR = ProgressMonitor()
+
+
 class ProgressNode(BaseNode):
     def __init__(self):
         super().__init__()
-        self._last_update = None
-        self._execution_times = []
         self._progress = None
-        self._last_current = -1
-        self._last_total = -1
+        self._progress_state = (-1, -1, True)
+        self._shown_progress_state = None
+        ProgressMonitor.register(self)
 
     def init(self):
         self.set_progress(-1, -1)
         pass
 
+    @property
+    def progress(self) -> tuple[int, int, bool]:
+        return self._progress_state
+
     def set_progress(self, current, total, show_eta=True):
-        if self._progress == None:
-            return
-        
-        if current == self._last_current and total == self._last_total:
+        '''
+        Stores the progress, -1 hides it. Safe to call for every item from any thread,
+        the progress bar is updated by PROGRESS_MONITOR.
+        '''
+        self._progress_state = (current, total, show_eta)
+
+    def _show_progress(self, current: int, total: int, show_eta: bool, eta: float | None):
+        if self._progress is None or not dpg.does_item_exist(self._progress):
             return
-        
-        self._last_current = current
-        self._last_total = total
-        
-        if not dpg.does_item_exist(self._progress):
+
+        state = (current, total, show_eta, eta)
+        if state == self._shown_progress_state:
             return
+        self._shown_progress_state = state
 
         if current == -1 or total == -1:
-            if dpg.does_item_exist(self._progress):
-                dpg.hide_item(self._progress)
-            self._last_update = None
-            self._execution_times = []
+            dpg.hide_item(self._progress)
             return
-        
-        if self._progress != None and  dpg.does_item_exist(self._progress) and not dpg.is_item_shown(self._progress):
+
+        if not dpg.is_item_shown(self._progress):
             dpg.show_item(self._progress)
 
         progress_float = (float(current) / float(total)) if total != 0 else 0
-
-        if self._last_update is None:
-            self._last_update = time.time()
-            if not show_eta:
-                dpg.configure_item(self._progress, overlay=f"{current}/{total}")
-            else:
-                dpg.configure_item(self._progress, overlay=f"{current}/{total} ETA: N/A")
-            dpg.set_value(self._progress, progress_float)
-        else:
-            self._execution_times.append(time.time() - self._last_update)
-            self._execution_times = self._execution_times[-10:]
-            eta = sum(self._execution_times) / len(self._execution_times) * (total - current)
-            if not show_eta:
-                dpg.configure_item(self._progress, overlay=f"{current}/{total}")
-            else:
-                dpg.configure_item(self._progress, overlay=f"{current}/{total} ETA: {eta:.1f}s")
-            dpg.set_value(self._progress, progress_float)
-            self._last_update = time.time()
+        dpg.configure_item(self._progress, overlay=format_progress(current, total, show_eta, eta))
+        dpg.set_value(self._progress, progress_float)
 
     def show_custom_ui(self, parent):
+        self._shown_progress_state = None
         self._progress = dpg.add_progress_bar(default_value=0, overlay="0/0 ETA: 0s", parent=parent, width=150, show=False)
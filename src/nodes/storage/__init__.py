@@ -1,6 +1,6 @@
 from .folder_storage_node import FolderStorageNode
 from .storage_nodes import SetStorageItem, GetStorageItem
-from .vector_storage_nodes import VectorStorageNode, VectorStorageSearchNode
+from .vector_storage_nodes import VectorStorageNode, PersistentVectorStorageNode, VectorStorageSearchNode, VectorStorageBatchSearchNode
 
 def register_nodes():
-    return [FolderStorageNode, SetStorageItem, GetStorageItem, VectorStorageNode, VectorStorageSearchNode]
\ No newline at end of file
+    return [FolderStorageNode, SetStorageItem, GetStorageItem, VectorStorageNode, PersistentVectorStorageNode, VectorStorageSearchNode, VectorStorageBatchSearchNode]
\ No newline at end of file
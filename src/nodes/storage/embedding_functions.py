@@ -0,0 +1,149 @@
+import os
+import hashlib
+import sqlite3
+import threading
+
+import numpy as np
+from chromadb import Documents, EmbeddingFunction, Embeddings
+
+from ...settings import SETTINGS
+
+DEFAULT_EMBEDDING_MODEL = "default"
+
+AVAILABLE_EMBEDDING_MODELS = [
+    DEFAULT_EMBEDDING_MODEL,
+    "sentence-transformers/all-MiniLM-L6-v2",
+    "sentence-transformers/all-mpnet-base-v2",
+    "BAAI/bge-small-en-v1.5",
+    "BAAI/bge-base-en-v1.5",
+]
+
+AVAILABLE_DEVICES = ["cpu", "cuda"]
+
+
+def _text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    '''
+    Persistent embedding cache stored in SQLite, keyed by model name and text hash.
+    '''
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory != "":
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.__lock = threading.Lock()
+        self.__connection = sqlite3.connect(path, check_same_thread=False)
+        self.__connection.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (model TEXT NOT NULL, hash TEXT NOT NULL, embedding BLOB NOT NULL, PRIMARY KEY (model, hash))"
+        )
+        self.__connection.commit()
+
+    def get_many(self, model: str, hashes: list[str]) -> dict[str, np.ndarray]:
+        found = {}
+        with self.__lock:
+            # stay well below the sqlite variable limit
+            for start in range(0, len(hashes), 500):
+                chunk = hashes[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self.__connection.execute(
+                    f"SELECT hash, embedding FROM embeddings WHERE model = ? AND hash IN ({placeholders})",
+                    [model, *chunk]
+                ).fetchall()
+                for text_hash, blob in rows:
+                    found[text_hash] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def set_many(self, model: str, items: dict[str, np.ndarray]):
+        with self.__lock:
+            self.__connection.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, hash, embedding) VALUES (?, ?, ?)",
+                [(model, text_hash, np.asarray(embedding, dtype=np.float32).tobytes()) for text_hash, embedding in items.items()]
+            )
+            self.__connection.commit()
+
+    def close(self):
+        with self.__lock:
+            self.__connection.close()
+
+
+class CachedEmbeddingFunction(EmbeddingFunction[Documents]):
+    '''
+    Chroma embedding function running a local model with a persistent embedding cache.
+
+    Identical texts are embedded once and reused across documents, queries and sessions.
+    '''
+
+    def __init__(self, model_name: str = DEFAULT_EMBEDDING_MODEL, device: str = "cpu", batch_size: int = 32, cache: EmbeddingCache | None = None):
+        self.model_name = model_name
+        self.device = device
+        self.batch_size = max(1, int(batch_size))
+        self.cache = cache
+        self.__model = None
+        self.__lock = threading.Lock()
+
+    def __load_model(self):
+        if self.__model is not None:
+            return self.__model
+
+        if self.model_name == DEFAULT_EMBEDDING_MODEL:
+            from chromadb.utils.embedding_functions import ONNXMiniLM_L6_V2
+            provider = "CUDAExecutionProvider" if self.device == "cuda" else "CPUExecutionProvider"
+            self.__model = ONNXMiniLM_L6_V2(preferred_providers=[provider])
+        else:
+            try:
+                from sentence_transformers import SentenceTransformer
+            except ImportError:
+                raise ValueError("sentence-transformers is required to use custom embedding models")
+            self.__model = SentenceTransformer(self.model_name, device=self.device, cache_folder=SETTINGS.get("hf_cache_dir"))
+        return self.__model
+
+    def __embed(self, texts: list[str]) -> list[np.ndarray]:
+        model = self.__load_model()
+        if self.model_name == DEFAULT_EMBEDDING_MODEL:
+            embeddings = []
+            for start in range(0, len(texts), self.batch_size):
+                embeddings.extend(model(texts[start:start + self.batch_size]))
+        else:
+            embeddings = model.encode(texts, batch_size=self.batch_size, convert_to_numpy=True, show_progress_bar=False)
+        return [np.asarray(embedding, dtype=np.float32) for embedding in embeddings]
+
+    def __call__(self, input: Documents) -> Embeddings:
+        texts = list(input)
+        hashes = [_text_hash(text) for text in texts]
+
+        found = self.cache.get_many(self.model_name, list(set(hashes))) if self.cache is not None else {}
+
+        # embed every missing text once, even if it is repeated in the input
+        missing = {}
+        for text, text_hash in zip(texts, hashes):
+            if text_hash not in found and text_hash not in missing:
+                missing[text_hash] = text
+
+        if len(missing) > 0:
+            with self.__lock:
+                embeddings = self.__embed(list(missing.values()))
+            computed = dict(zip(missing.keys(), embeddings))
+            if self.cache is not None:
+                self.cache.set_many(self.model_name, computed)
+            found.update(computed)
+
+        return [found[text_hash].tolist() for text_hash in hashes]
+
+    def unload(self):
+        self.__model = None
+
+
+_EMBEDDING_CACHE = None
+_EMBEDDING_CACHE_LOCK = threading.Lock()
+
+def get_embedding_cache() -> EmbeddingCache:
+    global _EMBEDDING_CACHE
+    with _EMBEDDING_CACHE_LOCK:
+        if _EMBEDDING_CACHE is None:
+            path = os.path.join(SETTINGS.get("cache_dir", "cache"), "embeddings.sqlite")
+            _EMBEDDING_CACHE = EmbeddingCache(path)
+        return _EMBEDDING_CACHE
@@ -19,6 +19,19 @@ class FolderStorage:
     def set(self, name: str, value: Any) -> None:
         self.__setitem__(name, value)
 
+    def version(self, name: str) -> tuple[int, int] | None:
+        '''
+        Returns the modification time and size of the file of name, which change when its value does, or None if it does not exist.
+        '''
+        name = name.encode("ascii","ignore").decode("utf-8")
+        name = name.replace("\\", "")
+        name = name.replace("/", "")
+        try:
+            stat = os.stat(f"{self.storage_path}/{name}{self.extension}")
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
     def all_keys(self):
         listdir = os.listdir(self.storage_path)
         keys = []
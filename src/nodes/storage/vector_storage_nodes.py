@@ -1,16 +1,31 @@
-from typing import Any
+from typing import Any, Callable
 import os
-from ...graph import BaseNode, StringAttributeDefinition, AttributeDefinition, ListAttributeDefinition, IntegerAttributeDefinition, DPG_DEFAULT_INPUT_WIDTH
+import hashlib
+import json
+from ...graph import BaseNode, StringAttributeDefinition, AttributeDefinition, ListAttributeDefinition, IntegerAttributeDefinition, FloatAttributeDefinition, FileAttributeDefinition, ComboAttributeDefinition, DPG_DEFAULT_INPUT_WIDTH
+from ...settings import SETTINGS
+from ...model_manager import MODEL_MANAGER
+from ..progress_node import ProgressNode
+from .embedding_functions import CachedEmbeddingFunction, get_embedding_cache, DEFAULT_EMBEDDING_MODEL, AVAILABLE_EMBEDDING_MODELS, AVAILABLE_DEVICES
 import chromadb
 import uuid
 import dearpygui.dearpygui as dpg
 
+
+def _document_hash(document: str) -> str:
+    return hashlib.sha256(document.encode("utf-8")).hexdigest()
+
+
 class VectorStorage:
 
-    def __init__(self, storage, name):
+    def __init__(self, storage, name, embedding_function: CachedEmbeddingFunction | None = None):
        
         self.client = chromadb.Client()
-        self.storage = self.client.create_collection(name)
+        self.embedding_function = embedding_function
+        if embedding_function is not None:
+            self.storage = self.client.create_collection(name, embedding_function=embedding_function, metadata={"embedding_model": embedding_function.model_name})
+        else:
+            self.storage = self.client.create_collection(name)
 
         all_keys = storage.all_keys()
         all_values = [storage.get(key) for key in all_keys]
@@ -24,19 +39,186 @@ class VectorStorage:
         self.client.delete_collection(self.storage.name)
         self.storage = None
         self.client = None
+        if self.embedding_function is not None:
+            self.embedding_function.unload()
+
+    def search(self, query: str, count: int, where: dict | None = None) -> Any:
+        documents, _ = self.query([query], count, where)
+        return documents[0]
+
+    def query(self, queries: list[str], count: int, where: dict | None = None, batch_size: int = 256) -> tuple[list[list[str]], list[list[float]]]:
+        '''
+        Search many queries at once, sending them to the collection in chunks of batch_size.
+
+        Returns:
+            tuple: documents and distances, one list of results per query in the same order as queries
+        '''
+        batch_size = max(1, int(batch_size))
+        documents = []
+        distances = []
+        for start in range(0, len(queries), batch_size):
+            results = self.storage.query(
+                n_results=count,
+                query_texts=queries[start:start + batch_size],
+                where=where or None,
+                include=["documents", "distances"]
+            )
+            documents.extend(results["documents"])
+            distances.extend(results["distances"])
+        return documents, distances
+
+
+class PersistentVectorStorage(VectorStorage):
+    '''
+    Vector storage kept on disk with chromadb.PersistentClient.
+
+    Every document is stored with a hash of its content in metadata, so syncing
+    with the backing storage only embeds keys that are new or have changed.
+    Between syncs the hash of every key is kept in memory, with the version of the value if
+    the storage has a version() method, so unchanged values are neither read nor hashed again.
+    '''
+
+    def __init__(self, path: str, name: str, embedding_function: CachedEmbeddingFunction | None = None):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.client = chromadb.PersistentClient(path=path)
+        self.embedding_function = embedding_function
+        # key -> (version, hash) of the documents in the collection, read from its metadata on the first sync
+        self.__synced_keys: dict[str, tuple[Any, str | None]] | None = None
+
+        if embedding_function is None:
+            self.storage = self.client.get_or_create_collection(name)
+            return
+
+        model_name = embedding_function.model_name
+        self.storage = self.client.get_or_create_collection(name, embedding_function=embedding_function)
+        stored_model_name = (self.storage.metadata or {}).get("embedding_model")
+        if stored_model_name == model_name:
+            return
+
+        if stored_model_name is None and self.storage.count() == 0:
+            self.storage.modify(metadata={"embedding_model": model_name})
+            return
+
+        # embeddings from a different model can't be searched with this one, start over
+        self.client.delete_collection(name)
+        self.storage = self.client.create_collection(name, embedding_function=embedding_function, metadata={"embedding_model": model_name})
+
+    def unload(self):
+        # keep the collection on disk, only drop the handles
+        self.storage = None
+        self.client = None
+        if self.embedding_function is not None:
+            self.embedding_function.unload()
+
+    def sync(self, storage, batch_size: int = 1000, on_progress: Callable[[int, int], None] | None = None) -> int:
+        '''
+        Upsert new or changed values from storage and delete keys that no longer exist.
+
+        Args:
+            storage: backing storage with all_keys() and get() methods
+            batch_size (int): maximum number of documents embedded in one upsert call
+            on_progress (callable, optional): called with (current, total) after every batch
+
+        Returns:
+            int: number of upserted documents
+        '''
+        batch_size = max(1, int(batch_size))
+
+        if self.__synced_keys is None:
+            existing = self.storage.get(include=["metadatas"])
+            self.__synced_keys = {key: (None, (metadata or {}).get("hash")) for key, metadata in zip(existing["ids"], existing["metadatas"])}
+        synced = self.__synced_keys
+        version_of = getattr(storage, "version", None)
+
+        changed_ids = []
+        changed_documents = []
+        changed_metadatas = []
+        changed_versions = []
+        present = set()
+        for key in storage.all_keys():
+            version = version_of(key) if version_of is not None else None
+            known = synced.get(key)
+            if version is not None and known is not None and known[0] == version:
+                present.add(key)
+                continue
+
+            value = storage.get(key)
+            if value is None:
+                continue
+            present.add(key)
+            document_hash = _document_hash(value)
+            if known is not None and known[1] == document_hash:
+                synced[key] = (version, document_hash)
+                continue
+            changed_ids.append(key)
+            changed_documents.append(value)
+            changed_metadatas.append({"hash": document_hash})
+            changed_versions.append(version)
 
-    def search(self, query: str, count: int) -> Any:
-        results = self.storage.query(n_results=count, query_texts=[query])
-        documents = results["documents"][0]
-        return documents
+        # keys that were removed or whose value became None are no longer searchable
+        removed_ids = [key for key in synced if key not in present]
+        for start in range(0, len(removed_ids), batch_size):
+            self.storage.delete(ids=removed_ids[start:start + batch_size])
+        for key in removed_ids:
+            del synced[key]
+
+        total = len(changed_ids)
+        if on_progress is not None:
+            on_progress(0, total)
+
+        for start in range(0, total, batch_size):
+            end = min(start + batch_size, total)
+            self.storage.upsert(
+                ids=changed_ids[start:end],
+                documents=changed_documents[start:end],
+                metadatas=changed_metadatas[start:end]
+            )
+            # recorded once stored, a failed upsert is retried by the next sync
+            for key, version, metadata in zip(changed_ids[start:end], changed_versions[start:end], changed_metadatas[start:end]):
+                synced[key] = (version, metadata["hash"])
+            if on_progress is not None:
+                on_progress(end, total)
+
+        return total
     
 
+def _embedding_static_input_definitions() -> dict[str, AttributeDefinition]:
+    return {
+        "embedding_model": ComboAttributeDefinition(values_callback=lambda: AVAILABLE_EMBEDDING_MODELS),
+        "device": ComboAttributeDefinition(values_callback=lambda: AVAILABLE_DEVICES, allow_custom=False),
+        "batch_size": IntegerAttributeDefinition(min_value=1)
+    }
+
+
+def _same_embedding_function(embedding_function: CachedEmbeddingFunction | None, static_inputs: dict) -> bool:
+    if embedding_function is None:
+        return False
+    same_model = embedding_function.model_name == static_inputs["embedding_model"]
+    same_device = embedding_function.device == static_inputs["device"]
+    same_batch_size = embedding_function.batch_size == static_inputs["batch_size"]
+    return same_model and same_device and same_batch_size
+
+
+def _create_embedding_function(static_inputs: dict) -> CachedEmbeddingFunction:
+    return CachedEmbeddingFunction(
+        model_name=static_inputs["embedding_model"],
+        device=static_inputs["device"],
+        batch_size=static_inputs["batch_size"],
+        cache=get_embedding_cache()
+    )
+
+
 class VectorStorageNode(BaseNode):
     def __init__(self):
         super().__init__()
         self.set_default_input("storage", None)
+        self.set_static_input("embedding_model", DEFAULT_EMBEDDING_MODEL)
+        self.set_static_input("device", "cpu")
+        self.set_static_input("batch_size", 32)
         self.vector_storage = None
         self.unload_button = None
+        self._on_graph_finished += lambda: MODEL_MANAGER.release(self)
 
     @classmethod
     def name(cls) -> str:
@@ -52,12 +234,23 @@ class VectorStorageNode(BaseNode):
             "storage": AttributeDefinition(type_name="storage")
         }
     
+    @property
+    def static_input_definitions(self) -> dict[str, AttributeDefinition]:
+        return _embedding_static_input_definitions()
+    
     @property
     def output_definitions(self) -> dict[str, AttributeDefinition]:
         return {
             "vector_storage": AttributeDefinition(type_name="vector_storage")
         }
     
+    def init(self):
+        if self.vector_storage is not None and not _same_embedding_function(self.vector_storage.embedding_function, self.static_inputs):
+            self.__unload()
+        # use() fails if the model was unloaded for the memory budget meanwhile, run() loads it again
+        if self.vector_storage is not None and not MODEL_MANAGER.use(self):
+            self.__unload()
+
     def run(self, **kwargs) -> dict:
         if self.vector_storage is not None:
             return {"vector_storage": self.vector_storage}
@@ -65,9 +258,11 @@ class VectorStorageNode(BaseNode):
         storage = kwargs.get("storage")
         if storage is None:
             raise ValueError("Storage is not provided")
-        self.vector_storage = VectorStorage(storage, str(uuid.uuid4()))
+        with MODEL_MANAGER.measure() as load:
+            self.vector_storage = VectorStorage(storage, str(uuid.uuid4()), _create_embedding_function(self.static_inputs))
+        MODEL_MANAGER.register(self, f"vector storage ({self.static_inputs['embedding_model']})", self.__unload, load.ram, load.vram)
 
-        if self.unload_button is not None:
+        if self.unload_button is not None and dpg.does_item_exist(self.unload_button):
             dpg.show_item(self.unload_button)
 
         return {"vector_storage": self.vector_storage}
@@ -76,7 +271,8 @@ class VectorStorageNode(BaseNode):
         if self.vector_storage is not None:
             self.vector_storage.unload()
             self.vector_storage = None
-        if self.unload_button is not None:
+        MODEL_MANAGER.unregister(self)
+        if self.unload_button is not None and dpg.does_item_exist(self.unload_button):
             dpg.hide_item(self.unload_button)
 
     def show_custom_ui(self, parent: int | str):
@@ -84,12 +280,122 @@ class VectorStorageNode(BaseNode):
         return super().show_custom_ui(parent)
         
 
+class PersistentVectorStorageNode(ProgressNode):
+    def __init__(self):
+        super().__init__()
+        self.set_default_input("storage", None)
+        self.set_static_input("path", os.path.join(SETTINGS.get("cache_dir", "cache"), "vector_storage"))
+        self.set_static_input("collection", "default")
+        self.set_static_input("upsert_batch_size", 1000)
+        self.set_static_input("embedding_model", DEFAULT_EMBEDDING_MODEL)
+        self.set_static_input("device", "cpu")
+        self.set_static_input("batch_size", 32)
+        self.vector_storage = None
+        self.unload_button = None
+        self.__synced = False
+        self._on_graph_finished += lambda: MODEL_MANAGER.release(self)
+
+    @classmethod
+    def name(cls) -> str:
+        return "Persistent Vector Storage"
+    
+    @classmethod
+    def category(cls) -> str:
+        return "Storage"
+    
+    @property
+    def input_definitions(self) -> dict[str, AttributeDefinition]:
+        return {
+            "storage": AttributeDefinition(type_name="storage")
+        }
+    
+    @property
+    def static_input_definitions(self) -> dict[str, AttributeDefinition]:
+        return {
+            "path": FileAttributeDefinition(directory_selector=True),
+            "collection": StringAttributeDefinition(),
+            "upsert_batch_size": IntegerAttributeDefinition(min_value=1),
+            **_embedding_static_input_definitions()
+        }
+    
+    @property
+    def output_definitions(self) -> dict[str, AttributeDefinition]:
+        return {
+            "vector_storage": AttributeDefinition(type_name="vector_storage")
+        }
+    
+    def init(self):
+        super().init()
+        path = self.static_inputs["path"]
+        collection = self.static_inputs["collection"]
+
+        if self.vector_storage is not None:
+            same_path = self.vector_storage.path == path
+            same_collection = self.vector_storage.storage.name == collection
+            same_embedding_function = _same_embedding_function(self.vector_storage.embedding_function, self.static_inputs)
+            # use() fails if the model was unloaded for the memory budget meanwhile, run() loads it again
+            if not (same_path and same_collection and same_embedding_function) or not MODEL_MANAGER.use(self):
+                self.__unload()
+
+        # sync with the backing storage once per graph run
+        self.__synced = False
+
+    def run(self, **kwargs) -> dict:
+        storage = kwargs.get("storage")
+        if storage is None:
+            raise ValueError("Storage is not provided")
+        
+        if self.vector_storage is None:
+            with MODEL_MANAGER.measure() as load:
+                self.vector_storage = PersistentVectorStorage(self.static_inputs["path"], self.static_inputs["collection"], _create_embedding_function(self.static_inputs))
+            MODEL_MANAGER.register(self, f"vector storage {self.static_inputs['collection']} ({self.static_inputs['embedding_model']})", self.__unload, load.ram, load.vram)
+            self.__synced = False
+
+        if not self.__synced:
+            self.vector_storage.sync(storage, self.static_inputs["upsert_batch_size"], self.set_progress)
+            self.set_progress(-1, -1)
+            self.__synced = True
+
+        if self.unload_button is not None and dpg.does_item_exist(self.unload_button):
+            dpg.show_item(self.unload_button)
+
+        return {"vector_storage": self.vector_storage}
+    
+    def __unload(self):
+        if self.vector_storage is not None:
+            self.vector_storage.unload()
+            self.vector_storage = None
+        MODEL_MANAGER.unregister(self)
+        self.__synced = False
+        if self.unload_button is not None and dpg.does_item_exist(self.unload_button):
+            dpg.hide_item(self.unload_button)
+
+    def show_custom_ui(self, parent: int | str):
+        super().show_custom_ui(parent)
+        self.unload_button = dpg.add_button(label="Unload", callback=self.__unload, parent=parent, width=DPG_DEFAULT_INPUT_WIDTH, show=False)
+
+
+def _parse_where(where: str | dict | None) -> dict | None:
+    if where is None or where == "":
+        return None
+    if isinstance(where, dict):
+        return where
+    try:
+        where = json.loads(where)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid where filter: {e}")
+    if not isinstance(where, dict):
+        raise ValueError("Where filter must be a JSON object")
+    return where
+
+
 class VectorStorageSearchNode(BaseNode):
     def __init__(self):
         super().__init__()
         self.set_default_input("vector_storage", None)
         self.set_default_input("query", "")
         self.set_default_input("count", 1)
+        self.set_default_input("where", "")
 
     @classmethod
     def name(cls) -> str:
@@ -104,13 +410,15 @@ class VectorStorageSearchNode(BaseNode):
         return {
             "vector_storage": AttributeDefinition(type_name="vector_storage"),
             "query": StringAttributeDefinition(),
-            "count": IntegerAttributeDefinition(min_value=1)
+            "count": IntegerAttributeDefinition(min_value=1),
+            "where": StringAttributeDefinition()
         }
     
     @property
     def output_definitions(self) -> dict[str, AttributeDefinition]:
         return {
-            "documents": ListAttributeDefinition(value_type=StringAttributeDefinition())
+            "documents": ListAttributeDefinition(value_type=StringAttributeDefinition()),
+            "distances": ListAttributeDefinition(value_type=FloatAttributeDefinition())
         }
     
     def run(self, **kwargs) -> dict:
@@ -119,7 +427,62 @@ class VectorStorageSearchNode(BaseNode):
             raise ValueError("Vector storage is not provided")
         query = kwargs.get("query")
         count = kwargs.get("count")
-        results = vector_storage.search(query, count)
-        return {"documents": results}
+        where = _parse_where(kwargs.get("where"))
+        documents, distances = vector_storage.query([query], count, where)
+        return {"documents": documents[0], "distances": distances[0]}
+
+
+class VectorStorageBatchSearchNode(BaseNode):
+    def __init__(self):
+        super().__init__()
+        self.set_default_input("vector_storage", None)
+        self.set_default_input("queries", [])
+        self.set_default_input("count", 1)
+        self.set_default_input("where", "")
+        self.set_static_input("batch_size", 256)
+
+    @classmethod
+    def name(cls) -> str:
+        return "Vector Storage Batch Search"
+    
+    @classmethod
+    def category(cls) -> str:
+        return "Storage"
+    
+    @property
+    def input_definitions(self) -> dict[str, AttributeDefinition]:
+        return {
+            "vector_storage": AttributeDefinition(type_name="vector_storage"),
+            "queries": ListAttributeDefinition(value_type=StringAttributeDefinition()),
+            "count": IntegerAttributeDefinition(min_value=1),
+            "where": StringAttributeDefinition()
+        }
+    
+    @property
+    def static_input_definitions(self) -> dict[str, AttributeDefinition]:
+        return {
+            "batch_size": IntegerAttributeDefinition(min_value=1)
+        }
+    
+    @property
+    def output_definitions(self) -> dict[str, AttributeDefinition]:
+        return {
+            "documents": ListAttributeDefinition(value_type=ListAttributeDefinition(value_type=StringAttributeDefinition())),
+            "distances": ListAttributeDefinition(value_type=ListAttributeDefinition(value_type=FloatAttributeDefinition()))
+        }
+    
+    def run(self, **kwargs) -> dict:
+        vector_storage = kwargs.get("vector_storage")
+        if vector_storage is None:
+            raise ValueError("Vector storage is not provided")
+        queries = kwargs.get("queries") or []
+        if isinstance(queries, str):
+            queries = [queries]
+        count = kwargs.get("count")
+        where = _parse_where(kwargs.get("where"))
 
+        if len(queries) == 0:
+            return {"documents": [], "distances": []}
 
+        documents, distances = vector_storage.query(queries, count, where, self.static_inputs["batch_size"])
+        return {"documents": documents, "distances": distances}
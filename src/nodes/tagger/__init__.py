@@ -2,7 +2,7 @@ from .wd14tagger_nodes import Wd14TaggerNode
 from .tagger_nodes import TagImageNode
 from .anime_aesthetic_classifier_nodes import AnimeAestheticClassifierNode
 from .hf_aesthetic_classifier_nodes import HfPipelineAestheticClassifierNode
-from .tags_nodes import JoinTagsNode, FindCaretFilesNode, FilterFilesByTagNode, LoadTagsFromFilesNode, ConvertTagsToStringNode, LoadTagsFromStringsNode, FilterTagsByValueNode
+from .tags_nodes import JoinTagsNode, FindCaretFilesNode, FilterFilesByTagNode, LoadTagsFromFilesNode, ConvertTagsToStringNode, LoadTagsFromStringsNode, FilterTagsByValueNode, ConvertTagsToMatrixNode, ConvertMatrixToTagsNode
 
 
 def register_nodes():
@@ -16,5 +16,7 @@ def register_nodes():
         LoadTagsFromFilesNode, 
         ConvertTagsToStringNode,
         LoadTagsFromStringsNode,
-        FilterTagsByValueNode
+        FilterTagsByValueNode,
+        ConvertTagsToMatrixNode,
+        ConvertMatrixToTagsNode
         ]
\ No newline at end of file
@@ -8,6 +8,7 @@ from huggingface_hub import hf_hub_download
 import typing
 
 from ...settings import SETTINGS
+from ...helpers import load_image, onnx_session_options
 
 def _predict(model: rt.InferenceSession, img: np.ndarray):
     img = img.astype(np.float32) / 255
@@ -27,7 +28,7 @@ class AnimeAestheticClassifier():
         super().__init__()
         self.repo_id = "skytnt/anime-aesthetic"
         anime_aesthetic_path = hf_hub_download(repo_id=self.repo_id, filename="model.onnx", cache_dir=cache_dir)
-        self.anime_aesthetic = rt.InferenceSession(anime_aesthetic_path, providers=[device])
+        self.anime_aesthetic = rt.InferenceSession(anime_aesthetic_path, sess_options=onnx_session_options(), providers=[device])
         self.cache_dir = cache_dir
 
     def device(self):
@@ -42,7 +43,7 @@ class AnimeAestheticClassifier():
             images = [images]
         
         for image_path in images:
-            img = np.array(pilimg.open(image_path).convert('RGB'))
+            img = np.array(load_image(image_path, 'RGB'))
             pred = _predict(self.anime_aesthetic, img)
             
             if isinstance(images, list):
@@ -1,6 +1,6 @@
 from ...graph import BaseNode, AttributeDefinition, BoolenAttributeDefinition, ComboAttributeDefinition
 
-from .anime_aesthetic_classifier import AnimeAestheticClassifier
+from ...model_manager import MODEL_MANAGER
 
 import dearpygui.dearpygui as dpg
 
@@ -10,6 +10,7 @@ class AnimeAestheticClassifierNode(BaseNode):
         self.set_static_input("device", "CPUExecutionProvider")
         self.tagger = None
         self.unload_model_button = None
+        self._on_graph_finished += lambda: MODEL_MANAGER.release(self)
 
     @classmethod
     def name(cls) -> str:
@@ -30,13 +31,22 @@ class AnimeAestheticClassifierNode(BaseNode):
         return {
             "tagger": AttributeDefinition(type_name="tagger")
         }
+
+    @property
+    def preload_init(self) -> bool:
+        return True
     
     def init(self):
-        if self.tagger is not None:
+        # use() fails if the model was unloaded for the memory budget meanwhile
+        if self.tagger is not None and MODEL_MANAGER.use(self):
             return
         
         device = self.static_inputs["device"]
-        self.tagger = AnimeAestheticClassifier(device=device)
+        # imported on first load, so processes that only run the tag nodes of this package skip onnxruntime
+        from .anime_aesthetic_classifier import AnimeAestheticClassifier
+        with MODEL_MANAGER.measure() as load:
+            self.tagger = AnimeAestheticClassifier(device=device)
+        MODEL_MANAGER.register(self, "skytnt/anime-aesthetic", self.unload_model, load.ram, load.vram)
         if self.unload_model_button is not None and dpg.does_item_exist(self.unload_model_button):
             dpg.show_item(self.unload_model_button)
 
@@ -44,7 +54,9 @@ class AnimeAestheticClassifierNode(BaseNode):
         if self.tagger is not None:
             self.tagger.unload_model()
             self.tagger = None
-        dpg.hide_item(self.unload_model_button)
+        MODEL_MANAGER.unregister(self)
+        if self.unload_model_button is not None and dpg.does_item_exist(self.unload_model_button):
+            dpg.hide_item(self.unload_model_button)
     
     def show_custom_ui(self, parent: int | str):
         self.unload_model_button = dpg.add_button(label="Unload Model", callback=self.unload_model, parent=parent, show=False)
@@ -4,6 +4,7 @@ import huggingface_hub
 import typing
 
 from ...settings import SETTINGS
+from ...helpers import load_image
 
 class HfPipelineAestheticClassifier:
     def __init__(self, 
@@ -40,6 +41,7 @@ class HfPipelineAestheticClassifier:
             batch_images.append(images[i:i + self.batch_size])
             
         for batch in batch_images:
+            batch = [load_image(image, "RGB") if isinstance(image, str) and os.path.exists(image) else image for image in batch]
             outputs = self.pipeline(batch)
 
             for output in outputs:
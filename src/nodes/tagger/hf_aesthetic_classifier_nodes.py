@@ -1,7 +1,7 @@
 from ...graph import BaseNode, AttributeDefinition, FileAttributeDefinition, ComboAttributeDefinition, IntegerAttributeDefinition
 
-from .hf_aesthetic_classifier import HfPipelineAestheticClassifier
 from ...settings import SETTINGS
+from ...model_manager import MODEL_MANAGER
 
 import dearpygui.dearpygui as dpg
 
@@ -14,6 +14,7 @@ class HfPipelineAestheticClassifierNode(BaseNode):
         self.set_static_input("cache_dir", SETTINGS.get("hf_cache_dir"))
         self.tagger = None
         self.unload_model_button = None
+        self._on_graph_finished += lambda: MODEL_MANAGER.release(self)
 
     @classmethod
     def name(cls) -> str:
@@ -37,13 +38,18 @@ class HfPipelineAestheticClassifierNode(BaseNode):
         return {
             "tagger": AttributeDefinition(type_name="tagger")
         }
+
+    @property
+    def preload_init(self) -> bool:
+        return True
     
     def init(self):
         if self.tagger is not None:
             same_model = self.tagger.model_name == self.static_inputs["model"]
             same_device = self.tagger.device == self.static_inputs["device"]
             same_batch_size = self.tagger.batch_size == self.static_inputs["batch_size"]
-            if same_model and same_device and same_batch_size:
+            # use() fails if the model was unloaded for the memory budget meanwhile
+            if same_model and same_device and same_batch_size and MODEL_MANAGER.use(self):
                 return
         
         model = self.static_inputs["model"]
@@ -51,7 +57,11 @@ class HfPipelineAestheticClassifierNode(BaseNode):
         batch_size = self.static_inputs["batch_size"]
         cache_dir = self.static_inputs["cache_dir"]
 
-        self.tagger = HfPipelineAestheticClassifier(model_name=model, device=device, batch_size=batch_size, cache_dir=cache_dir)
+        # imported on first load, so processes that only run the tag nodes of this package skip transformers
+        from .hf_aesthetic_classifier import HfPipelineAestheticClassifier
+        with MODEL_MANAGER.measure() as load:
+            self.tagger = HfPipelineAestheticClassifier(model_name=model, device=device, batch_size=batch_size, cache_dir=cache_dir)
+        MODEL_MANAGER.register(self, model, self.unload_model, load.ram, load.vram)
         if self.unload_model_button is not None and dpg.does_item_exist(self.unload_model_button):
             dpg.show_item(self.unload_model_button)
 
@@ -59,8 +69,10 @@ class HfPipelineAestheticClassifierNode(BaseNode):
         if self.tagger is not None:
             self.tagger.unload_model()
             self.tagger = None
+        MODEL_MANAGER.unregister(self)
             
-        dpg.hide_item(self.unload_model_button)
+        if self.unload_model_button is not None and dpg.does_item_exist(self.unload_model_button):
+            dpg.hide_item(self.unload_model_button)
     
     def show_custom_ui(self, parent: int | str):
         self.unload_model_button = dpg.add_button(label="Unload Model", callback=self.unload_model, parent=parent, show=False)
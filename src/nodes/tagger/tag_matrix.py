@@ -0,0 +1,367 @@
+from typing import Callable
+
+import numpy as np
+
+from ...graph import AttributeDefinition, MultipleAttributeDefinition, ListAttributeDefinition, DictAttributeDefinition, StringAttributeDefinition, FloatAttributeDefinition
+
+
+def tags_attribute_definition() -> MultipleAttributeDefinition:
+    '''
+    Definition of tags inputs, a list of tag dictionaries or a TagMatrix.
+    '''
+    return MultipleAttributeDefinition(types=[
+        ListAttributeDefinition(DictAttributeDefinition(key_type=StringAttributeDefinition(), value_type=FloatAttributeDefinition())),
+        AttributeDefinition(type_name="tag_matrix"),
+    ])
+
+
+def _combine(value_mode: str, first: np.ndarray, second: np.ndarray) -> np.ndarray:
+    if value_mode == "sum":
+        return first + second
+    elif value_mode == "max":
+        return np.maximum(first, second)
+    elif value_mode == "min":
+        return np.minimum(first, second)
+    elif value_mode == "average":
+        return (first + second) / 2
+    elif value_mode in ("replace", "skip"):
+        return second
+    raise ValueError(f"Unknown value mode {value_mode}")
+
+
+def compare(values: np.ndarray, filter_mode: str, value: float) -> np.ndarray:
+    if filter_mode == "greater":
+        return values > value
+    elif filter_mode == "less":
+        return values < value
+    elif filter_mode == "equal":
+        return values == value
+    elif filter_mode == "not equal":
+        return values != value
+    raise ValueError(f"Unknown filter mode {filter_mode}")
+
+
+class TagMatrix:
+    '''
+    Tags of many images as a sparse images x vocabulary matrix in CSR layout.
+
+    The tags of image i are the columns indices[indptr[i]:indptr[i + 1]] of the shared vocabulary with the
+    matching values. Entries keep the order of the tags within an image, like the keys of a tag dictionary,
+    so converting from and to list[dict[str, float]] keeps the tags unchanged.
+    '''
+
+    def __init__(self, vocabulary: list[str], indptr, indices, values):
+        self.vocabulary = list(vocabulary)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.values = np.asarray(values, dtype=np.float64)
+        self.__columns = None
+
+    def __len__(self) -> int:
+        return len(self.indptr) - 1
+
+    def __repr__(self) -> str:
+        return f"TagMatrix({len(self)} images, {len(self.vocabulary)} tags, {self.nnz} entries)"
+
+    def __getstate__(self):
+        return {"vocabulary": self.vocabulary, "indptr": self.indptr, "indices": self.indices, "values": self.values}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return (len(self), len(self.vocabulary))
+
+    @property
+    def nnz(self) -> int:
+        return len(self.indices)
+
+    @property
+    def columns(self) -> dict[str, int]:
+        '''
+        Column of every tag of the vocabulary.
+        '''
+        if self.__columns is None:
+            self.__columns = {tag: column for column, tag in enumerate(self.vocabulary)}
+        return self.__columns
+
+    def rows(self) -> np.ndarray:
+        '''
+        Row of every entry.
+        '''
+        return np.repeat(np.arange(len(self)), np.diff(self.indptr))
+
+    @classmethod
+    def from_entries(cls, row_count: int, vocabulary: list[str], rows: np.ndarray, columns: np.ndarray, values: np.ndarray) -> "TagMatrix":
+        '''
+        Builds the matrix from entries in the order they should have within their row.
+        '''
+        rows = np.asarray(rows, dtype=np.int64)
+        order = np.argsort(rows, kind="stable")
+        indptr = np.zeros(row_count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=row_count), out=indptr[1:])
+        return cls(vocabulary, indptr, np.asarray(columns)[order], np.asarray(values)[order])
+
+    @classmethod
+    def from_dicts(cls, tags_list: list[dict[str, float]], vocabulary: list[str] | None = None) -> "TagMatrix":
+        '''
+        Converts a list of tag dictionaries, new tags are added to the end of vocabulary.
+        '''
+        columns = {} if vocabulary is None else {tag: column for column, tag in enumerate(vocabulary)}
+        vocabulary = list(columns)
+        indptr = [0]
+        indices = []
+        values = []
+        for tags in tags_list:
+            if not isinstance(tags, dict):
+                raise ValueError("Tags must be a list of dictionaries")
+            for tag in tags:
+                column = columns.get(tag)
+                if column is None:
+                    column = columns[tag] = len(vocabulary)
+                    vocabulary.append(tag)
+                indices.append(column)
+            values.extend(tags.values())
+            indptr.append(len(indices))
+        return cls(vocabulary, indptr, indices, values)
+
+    @classmethod
+    def from_probabilities(cls, probabilities: np.ndarray, vocabulary: list[str], thresholds: float | np.ndarray) -> "TagMatrix":
+        '''
+        Keeps the values of a dense images x vocabulary array that are above thresholds, one for all or one per column.
+        '''
+        probabilities = np.asarray(probabilities, dtype=np.float64)
+        return cls.from_mask(probabilities, vocabulary, probabilities > thresholds)
+
+    @classmethod
+    def from_mask(cls, values: np.ndarray, vocabulary: list[str], mask: np.ndarray) -> "TagMatrix":
+        '''
+        Keeps the values of a dense images x vocabulary array where mask is set.
+        '''
+        rows, columns = np.nonzero(mask)
+        return cls.from_entries(len(values), vocabulary, rows, columns, values[rows, columns])
+
+    @classmethod
+    def from_any(cls, tags: "list[dict[str, float]] | TagMatrix") -> "TagMatrix":
+        if isinstance(tags, TagMatrix):
+            return tags
+        if not isinstance(tags, list):
+            raise ValueError("Tags must be a list of dictionaries or a tag matrix")
+        return cls.from_dicts(tags)
+
+    @classmethod
+    def concatenate(cls, matrices: list["TagMatrix"]) -> "TagMatrix":
+        '''
+        Stacks the images of the matrices in order, their vocabularies are merged.
+        '''
+        vocabulary = []
+        known = set()
+        for matrix in matrices:
+            vocabulary += [tag for tag in matrix.vocabulary if tag not in known]
+            known.update(matrix.vocabulary)
+        matrices = [matrix.with_vocabulary(vocabulary) for matrix in matrices]
+
+        indptr = [np.zeros(1, dtype=np.int64)]
+        offset = 0
+        for matrix in matrices:
+            indptr.append(matrix.indptr[1:] + offset)
+            offset += matrix.nnz
+        return cls(vocabulary,
+                   np.concatenate(indptr),
+                   np.concatenate([matrix.indices for matrix in matrices] or [np.zeros(0, dtype=np.int64)]),
+                   np.concatenate([matrix.values for matrix in matrices] or [np.zeros(0)]))
+
+    def to_dicts(self) -> list[dict[str, float]]:
+        vocabulary = np.empty(len(self.vocabulary), dtype=object)
+        vocabulary[:] = self.vocabulary
+        tags = vocabulary[self.indices].tolist()
+        values = self.values.tolist()
+        bounds = self.indptr.tolist()
+        return [dict(zip(tags[start:end], values[start:end])) for start, end in zip(bounds[:-1], bounds[1:])]
+
+    def like(self, tags: "list[dict[str, float]] | TagMatrix") -> "list[dict[str, float]] | TagMatrix":
+        '''
+        Returns the matrix in the representation of tags, so nodes give back what they were given.
+        '''
+        return self if isinstance(tags, TagMatrix) else self.to_dicts()
+
+    def select_entries(self, mask: np.ndarray) -> "TagMatrix":
+        indptr = np.zeros(len(self.indptr), dtype=np.int64)
+        np.cumsum(np.bincount(self.rows()[mask], minlength=len(self)), out=indptr[1:])
+        return TagMatrix(self.vocabulary, indptr, self.indices[mask], self.values[mask])
+
+    def select_rows(self, rows: np.ndarray) -> "TagMatrix":
+        '''
+        Returns the images at the given indices or where the boolean mask is set.
+        '''
+        rows = np.asarray(rows)
+        if rows.dtype == bool:
+            rows = np.flatnonzero(rows)
+        starts = self.indptr[rows]
+        lengths = self.indptr[rows + 1] - starts
+        indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        entries = np.repeat(starts - indptr[:-1], lengths) + np.arange(indptr[-1])
+        return TagMatrix(self.vocabulary, indptr, self.indices[entries], self.values[entries])
+
+    def column(self, tag: str, default: float = np.nan) -> np.ndarray:
+        '''
+        Returns the value of tag for every image, default where an image does not have it.
+        '''
+        result = np.full(len(self), default, dtype=np.float64)
+        column = self.columns.get(tag)
+        if column is not None:
+            mask = self.indices == column
+            result[self.rows()[mask]] = self.values[mask]
+        return result
+
+    def deduplicate(self) -> "TagMatrix":
+        '''
+        Removes repeated tags of an image, like building a dictionary the first position and the last value are kept.
+        '''
+        return self.__deduplicate(self.indices, self.vocabulary)
+
+    def __deduplicate(self, indices: np.ndarray, vocabulary: list[str]) -> "TagMatrix":
+        matrix = TagMatrix(vocabulary, self.indptr, indices, self.values)
+        order = matrix.__row_order(indices)
+        # sorting by tag within every image puts the repeats of a tag next to each other
+        keys = (self.rows() * max(1, len(vocabulary)) + indices)[order]
+        starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+        ends = np.concatenate((starts[1:], [len(keys)])) - 1
+        values = self.values.copy()
+        values[order[starts]] = self.values[order[ends]]
+        kept = np.zeros(self.nnz, dtype=bool)
+        kept[order[starts]] = True
+        return TagMatrix(vocabulary, self.indptr, indices, values).select_entries(kept)
+
+    def map_vocabulary(self, function: Callable[[str], str]) -> "TagMatrix":
+        '''
+        Renames every tag of the vocabulary, tags that end up with the same name are merged.
+        '''
+        columns = {}
+        remap = np.empty(len(self.vocabulary), dtype=np.int64)
+        for column, tag in enumerate(self.vocabulary):
+            remap[column] = columns.setdefault(function(tag), len(columns))
+        vocabulary = list(columns)
+        if len(vocabulary) == len(self.vocabulary):
+            return TagMatrix(vocabulary, self.indptr, remap[self.indices], self.values)
+        return self.__deduplicate(remap[self.indices], vocabulary)
+
+    def with_vocabulary(self, vocabulary: list[str]) -> "TagMatrix":
+        '''
+        Returns the matrix indexed by vocabulary, which has to contain every tag of this matrix.
+        '''
+        if vocabulary == self.vocabulary:
+            return self
+        columns = {tag: column for column, tag in enumerate(vocabulary)}
+        remap = np.array([columns[tag] for tag in self.vocabulary], dtype=np.int64)
+        return TagMatrix(vocabulary, self.indptr, remap[self.indices], self.values)
+
+    def __row_order(self, keys: np.ndarray) -> np.ndarray:
+        '''
+        Returns the order of the entries that stably sorts keys within every image.
+        '''
+        counts = np.diff(self.indptr)
+        width = int(counts.max()) if len(counts) > 0 else 0
+        if len(self) * width > 4 * self.nnz + 1024:
+            # a few very long images would make the padded rows too large
+            return np.lexsort((np.arange(self.nnz), keys, self.rows()))
+
+        # images are short, sorting the padded images x width array row by row is much faster than a global sort
+        local = np.arange(self.nnz) - np.repeat(self.indptr[:-1], counts)
+        grid = np.zeros((len(self), width), dtype=keys.dtype)
+        grid[self.rows(), local] = keys
+        order = np.argsort(grid, axis=1, kind="stable")
+        return (order + self.indptr[:-1, None])[order < counts[:, None]]
+
+    def sort_rows(self, by: str = "value", descending: bool = True) -> "TagMatrix":
+        '''
+        Sorts the tags within every image by "value" or "alphabetical", ties keep their order.
+        '''
+        if by == "alphabetical":
+            ranks = np.empty(len(self.vocabulary), dtype=np.int64)
+            ranks[sorted(range(len(self.vocabulary)), key=self.vocabulary.__getitem__)] = np.arange(len(self.vocabulary))
+            keys = ranks[self.indices]
+        elif by == "value":
+            keys = self.values
+        else:
+            raise ValueError(f"Unknown sort mode {by}")
+
+        if descending:
+            keys = -keys
+        order = self.__row_order(keys)
+        return TagMatrix(self.vocabulary, self.indptr, self.indices[order], self.values[order])
+
+    def join(self, other: "TagMatrix", value_mode: str = "max", position: str = "after") -> "TagMatrix":
+        '''
+        Adds the tags of this matrix to the tags of other, image by image.
+
+        Tags in both are combined with value_mode, "replace" and "skip" keep the value of other.
+        Tags only in this matrix are put "before" the tags of other in reverse order or "after" them in order.
+        "alphabetical" and "value" positions sort the joined tags of every image.
+        '''
+        if len(self) != len(other):
+            raise ValueError("Tags lists must have the same length")
+
+        vocabulary = list(other.vocabulary)
+        known = set(vocabulary)
+        vocabulary += [tag for tag in self.vocabulary if tag not in known]
+        first = self.with_vocabulary(vocabulary)
+        second = other.with_vocabulary(vocabulary)
+
+        # match every entry of second with the same tag of the same image in first
+        width = max(1, len(vocabulary))
+        order = first.__row_order(first.indices)
+        sorted_keys = (first.rows() * width + first.indices)[order]
+        second_keys = second.rows() * width + second.indices
+        found = np.searchsorted(sorted_keys, second_keys)
+        found = np.minimum(found, max(0, len(sorted_keys) - 1))
+        matched = (sorted_keys[found] == second_keys) if len(sorted_keys) > 0 else np.zeros(len(second_keys), dtype=bool)
+
+        second_values = second.values.copy()
+        second_values[matched] = _combine(value_mode, first.values[order[found[matched]]], second.values[matched])
+        only_first = np.ones(first.nnz, dtype=bool)
+        only_first[order[found[matched]]] = False
+        first = first.select_entries(only_first)
+
+        # both parts keep their order, so every entry can be written straight to its place in the joined rows
+        first_counts = np.diff(first.indptr)
+        second_counts = np.diff(second.indptr)
+        indptr = np.zeros(len(self) + 1, dtype=np.int64)
+        np.cumsum(first_counts + second_counts, out=indptr[1:])
+        if position == "before":
+            # tags are put in front one by one, so they end up in reverse order like Join Tags always did
+            first_starts, second_starts = indptr[:-1], indptr[:-1] + first_counts
+            first_places = np.repeat(first_starts + first.indptr[:-1] + first_counts - 1, first_counts) - np.arange(first.nnz)
+        else:
+            first_starts, second_starts = indptr[:-1] + second_counts, indptr[:-1]
+            first_places = np.repeat(first_starts - first.indptr[:-1], first_counts) + np.arange(first.nnz)
+        second_places = np.repeat(second_starts - second.indptr[:-1], second_counts) + np.arange(second.nnz)
+
+        indices = np.empty(indptr[-1], dtype=np.int64)
+        values = np.empty(indptr[-1], dtype=np.float64)
+        indices[first_places] = first.indices
+        values[first_places] = first.values
+        indices[second_places] = second.indices
+        values[second_places] = second_values
+
+        joined = TagMatrix(vocabulary, indptr, indices, values)
+        if position.startswith("alphabetical") or position.startswith("value"):
+            by, _, direction = position.partition(" ")
+            joined = joined.sort_rows(by, direction == "desc")
+        return joined
+
+    def to_strings(self, keep_values: bool = False) -> list[str]:
+        '''
+        Joins the tags of every image with ", ", as "(tag:value)" if keep_values is set.
+        '''
+        vocabulary = np.empty(len(self.vocabulary), dtype=object)
+        vocabulary[:] = self.vocabulary
+        tags = vocabulary[self.indices]
+        if keep_values:
+            tags = [f"({tag}:{value})" for tag, value in zip(tags.tolist(), self.values.tolist())]
+        else:
+            tags = tags.tolist()
+        bounds = self.indptr.tolist()
+        return [", ".join(tags[start:end]) for start, end in zip(bounds[:-1], bounds[1:])]
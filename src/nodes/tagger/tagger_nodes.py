@@ -1,5 +1,9 @@
 from ...graph import AttributeDefinition, MultiFileAttributeDefinition, FloatAttributeDefinition, DictAttributeDefinition, StringAttributeDefinition, ListAttributeDefinition
 from ..progress_node import ProgressNode
+from .tag_matrix import TagMatrix
+
+# images whose label probabilities are held at once, a chunk of a 10k label tagger takes about 40 MB
+TAG_MATRIX_CHUNK_SIZE = 1024
 
 class TagImageNode(ProgressNode):
     def __init__(self):
@@ -8,6 +12,7 @@ class TagImageNode(ProgressNode):
             "images": MultiFileAttributeDefinition(),
             "tags": ListAttributeDefinition(DictAttributeDefinition(StringAttributeDefinition(), FloatAttributeDefinition())),
             "tags_string": ListAttributeDefinition(StringAttributeDefinition()),
+            "tag_matrix": AttributeDefinition(type_name="tag_matrix"),
         }
 
     @property
@@ -36,14 +41,30 @@ class TagImageNode(ProgressNode):
         tagger = kwargs["tagger"]
         images = kwargs["images"]
 
-        tags = []
-
         self.set_progress(0, len(images))
 
-        for i, tags_dict in enumerate(tagger.tags(images)):
-            tags.append(tags_dict)
-            self.set_progress(i+1, len(images))
+        if hasattr(tagger, "tag_matrix"):
+            # taggers with a label set threshold the probabilities of a chunk of images at once,
+            # only the tags above the thresholds are kept, not the probabilities of every label
+            matrices = []
+            probabilities = []
+            for i, image_probabilities in enumerate(tagger.probabilities(images)):
+                probabilities.append(image_probabilities)
+                if len(probabilities) == TAG_MATRIX_CHUNK_SIZE:
+                    matrices.append(tagger.tag_matrix(probabilities))
+                    probabilities = []
+                self.set_progress(i+1, len(images))
+            if len(probabilities) > 0 or len(matrices) == 0:
+                matrices.append(tagger.tag_matrix(probabilities))
+            tag_matrix = TagMatrix.concatenate(matrices)
+            tags = tag_matrix.to_dicts()
+        else:
+            tags = []
+            for i, tags_dict in enumerate(tagger.tags(images)):
+                tags.append(tags_dict)
+                self.set_progress(i+1, len(images))
+            tag_matrix = TagMatrix.from_dicts(tags)
             
         self.set_progress(len(images), len(images))
 
-        return {"tags": tags, "tags_string": [str(tag) for tag in tags], "images": images}
\ No newline at end of file
+        return {"tags": tags, "tags_string": [str(tag) for tag in tags], "images": images, "tag_matrix": tag_matrix}
@@ -1,9 +1,41 @@
 from ...graph import BaseNode, ListAttributeDefinition, AttributeDefinition, BoolenAttributeDefinition, StringAttributeDefinition, DictAttributeDefinition, FloatAttributeDefinition, ComboAttributeDefinition, MultiFileAttributeDefinition
+from .tag_matrix import TagMatrix, tags_attribute_definition, compare
+from .tag_parser import normalize_tag, parse_tags
 import os
+import numpy as np
 import dearpygui.dearpygui as dpg
 
-def normalize_tag(tag: str) -> str:
-    return tag.replace("_", " ").replace("\\", "").replace("(", "\(").replace(")", "\)")
+
+class _ConnectedOutputs:
+    '''
+    Counts the connections of the outputs of a node.
+
+    Tags nodes given a TagMatrix only convert their result back to dictionaries for the list outputs that are read.
+    '''
+
+    def __init__(self, node: BaseNode):
+        self.__counts: dict[str, int] = {}
+        node._on_output_connected += self.__on_output_connected
+        node._on_output_disconnected += self.__on_output_disconnected
+
+    def __on_output_connected(self, output_name: str, input_node: BaseNode, input_name: str):
+        self.__counts[output_name] = self.__counts.get(output_name, 0) + 1
+
+    def __on_output_disconnected(self, output_name: str, input_node: BaseNode, input_name: str):
+        self.__counts[output_name] = max(0, self.__counts.get(output_name, 0) - 1)
+
+    def __contains__(self, output_name: str) -> bool:
+        return self.__counts.get(output_name, 0) > 0
+
+    def tags(self, output_name: str, matrix: TagMatrix, given_matrix: bool) -> list[dict[str, float]] | None:
+        '''
+        Returns the dictionaries of matrix for the list output output_name, None if the tags were given
+        as a TagMatrix and the output is not connected.
+        '''
+        if given_matrix and output_name not in self:
+            return None
+        return matrix.to_dicts()
+
 
 class FindCaretFilesNode(BaseNode):
     def __init__(self):
@@ -68,6 +100,8 @@ class FindCaretFilesNode(BaseNode):
         }
 
 class JoinTagsNode(BaseNode):
+    split_inputs = ("tags1", "tags2")
+
     def __init__(self):
         super().__init__()
         self.set_default_input("normalize_tags", True)
@@ -75,12 +109,13 @@ class JoinTagsNode(BaseNode):
         self.set_default_input("position", "after")
         self.set_default_input("tags1", [])
         self.set_default_input("tags2", [])
+        self.__outputs = _ConnectedOutputs(self)
 
     @property
     def input_definitions(self) -> dict[str, AttributeDefinition]:
         return {
-            "tags1": ListAttributeDefinition(DictAttributeDefinition(key_type=StringAttributeDefinition(), value_type=FloatAttributeDefinition())),
-            "tags2": ListAttributeDefinition(DictAttributeDefinition(key_type=StringAttributeDefinition(), value_type=FloatAttributeDefinition())),
+            "tags1": tags_attribute_definition(),
+            "tags2": tags_attribute_definition(),
             "value_mode": ComboAttributeDefinition(lambda: ["sum", "max", "min", "average", "replace", "skip"], allow_custom=False),
             "position": ComboAttributeDefinition(lambda: ["before", "after", "alphabetical desc", "alphabetical asc", "value desc", "value asc"]),
             "normalize_tags": BoolenAttributeDefinition()
@@ -90,6 +125,7 @@ class JoinTagsNode(BaseNode):
     def output_definitions(self) -> dict[str, AttributeDefinition]:
         return {
             "tags": ListAttributeDefinition(DictAttributeDefinition(key_type=StringAttributeDefinition(), value_type=FloatAttributeDefinition())),
+            "tag_matrix": AttributeDefinition(type_name="tag_matrix"),
         }
     
     @classmethod
@@ -101,65 +137,31 @@ class JoinTagsNode(BaseNode):
         return "Tags"
     
     def run(self, **kwargs) -> dict[str, object]:
-            
-            tags_list1 = kwargs.get("tags1", [])
-            tags_list2 = kwargs.get("tags2", [])
-
-            normalize_tags = kwargs.get("normalize_tags", True)
-
-            if not isinstance(tags_list1, list) or not isinstance(tags_list2, list):
-                raise ValueError("Tags must be a list of dictionaries")
-
-            if len(tags_list1) != len(tags_list2):
-                raise ValueError("Tags lists must have the same length")
-            
-            if normalize_tags:
-                tags_list1 = [{normalize_tag(tag): value for tag, value in tags.items()} for tags in tags_list1]
-                tags_list2 = [{normalize_tag(tag): value for tag, value in tags.items()} for tags in tags_list2]
-        
-            value_mode = kwargs.get("value_mode", "sum")
-            position = kwargs.get("position", "after")
-    
-            tags_list = []
-
-
-            tags = zip(tags_list1, tags_list2)
-
-            for tags1, tags2 in tags:
-                tags = tags2
-                for tag, value in tags1.items():
-                    if tag in tags2:
-                        if value_mode == "sum":
-                            tags[tag] = value + tags2[tag]
-                        elif value_mode == "max":
-                            tags[tag] = max(value, tags2[tag])
-                        elif value_mode == "min":
-                            tags[tag] = min(value, tags2[tag])
-                        elif value_mode == "average":
-                            tags[tag] = (value + tags2[tag]) / 2
-                        elif value_mode == "replace":
-                            tags[tag] = tags2[tag]
-                        elif value_mode == "skip":
-                            continue
-                    else:
-                        if position == "before":
-                            tags = {tag: value, **tags}
-                        else:
-                            tags[tag] = value
-
-                tags_list.append(tags)
-
-            asc = position.endswith("asc")
-            if position.startswith("alphabetical"):
-                tags_list = sorted(tags_list, key=lambda x: list(x.keys())[0], reverse=asc)
-            elif position.startswith("value"):
-                tags_list = sorted(tags_list, key=lambda x: list(x.values())[0], reverse=asc)
-
-            return {
-                "tags": tags_list
-            }
+        tags1 = kwargs.get("tags1", [])
+        tags2 = kwargs.get("tags2", [])
+
+        if not isinstance(tags1, (list, TagMatrix)) or not isinstance(tags2, (list, TagMatrix)):
+            raise ValueError("Tags must be a list of dictionaries or a tag matrix")
+
+        if len(tags1) != len(tags2):
+            raise ValueError("Tags lists must have the same length")
+
+        matrix1 = TagMatrix.from_any(tags1)
+        matrix2 = TagMatrix.from_any(tags2)
+        if kwargs.get("normalize_tags", True):
+            matrix1 = matrix1.map_vocabulary(normalize_tag)
+            matrix2 = matrix2.map_vocabulary(normalize_tag)
+
+        joined = matrix1.join(matrix2, kwargs.get("value_mode", "sum"), kwargs.get("position", "after"))
+        return {
+            "tags": self.__outputs.tags("tags", joined, isinstance(tags1, TagMatrix) or isinstance(tags2, TagMatrix)),
+            "tag_matrix": joined,
+        }
     
+
 class ConvertTagsToStringNode(BaseNode):
+    split_inputs = ("tags",)
+
     def __init__(self):
         super().__init__()
         self.set_default_input("normalize_tags", True)
@@ -169,7 +171,7 @@ class ConvertTagsToStringNode(BaseNode):
     @property
     def input_definitions(self) -> dict[str, AttributeDefinition]:
         return {
-            "tags": ListAttributeDefinition(DictAttributeDefinition(key_type=StringAttributeDefinition(), value_type=FloatAttributeDefinition())),
+            "tags": tags_attribute_definition(),
             "normalize_tags": BoolenAttributeDefinition(),
             "keep_values": BoolenAttributeDefinition(),
             "sort_mode": ComboAttributeDefinition(lambda: ["none", "alphabetical desc", "alphabetical asc", "value desc", "value asc"], allow_custom=False)
@@ -189,40 +191,25 @@ class ConvertTagsToStringNode(BaseNode):
     def category(cls) -> str:
         return "Tags"
     
-    def __parse_tag(self, tag: tuple[str, float], normalize = True, keep_values = True) -> str:
-        if normalize:
-            tag = normalize_tag(tag[0])
-        else:
-            tag = tag[0]
-
-        if keep_values:
-            return f"({tag}:{tag[1]})"
-        return tag
-
-
     def run(self, **kwargs) -> dict[str, object]:
-            
-        tags_list: list[dict] = kwargs.get("tags", [])
-        sort_mode = kwargs.get("sort_mode", "value desc")
-        sort, mode = sort_mode.split(" ")
-
-        normalize_tags = kwargs.get("normalize_tags", True)
-        keep_values = kwargs.get("keep_values", False)
+        matrix = TagMatrix.from_any(kwargs.get("tags", []))
+        if kwargs.get("normalize_tags", True):
+            matrix = matrix.map_vocabulary(normalize_tag)
 
-        tags_string = []
-        for tags in tags_list:
-            tags = list(tags.items())
-            if sort == "alphabetical":
-                tags = sorted(tags, key=lambda x: x[0], reverse=mode == "desc")
-            elif sort == "value":
-                tags = sorted(tags, key=lambda x: x[1], reverse=mode == "desc")
-            tags_string.append(", ".join([self.__parse_tag(tag, normalize_tags, keep_values) for tag in tags]))
+        sort_mode = kwargs.get("sort_mode", "value desc")
+        if sort_mode != "none":
+            sort, mode = sort_mode.split(" ")
+            matrix = matrix.sort_rows(sort, mode == "desc")
 
         return {
-            "tags_string": tags_string
+            "tags_string": matrix.to_strings(kwargs.get("keep_values", False))
         }
 
+
 class LoadTagsFromStringsNode(BaseNode):
+    execution_policy = "process"
+    split_inputs = ("tags",)
+
     def __init__(self):
         super().__init__()
         self.set_default_input("normalize_tags", True)
@@ -252,40 +239,16 @@ class LoadTagsFromStringsNode(BaseNode):
         return "Tags"
     
 
-    def __parse_tag(self, tag: str, default_value = 1.0) -> tuple[str, float]:
-
-        tag = tag.strip()
-
-        if not tag.startswith("(") or not tag.endswith(")"):
-            return tag, default_value
-        
-        # drop '(' and ')' if are present
-        while tag.startswith("(") and tag.endswith(")"):
-            tag = tag[1:-1]
-            default_value *= 1.2
-
-        # if ends with :float_str, extract the float and use it as value
-        if tag.endswith(":"):
-            return normalize_tag(tag[:-1]), default_value
-        
-        if ":" in tag:
-            tag, value = tag.split(":")
-            try:
-                value = float(value)
-            except ValueError:
-                value = default_value
-
-            return tag, normalize_tag(value)
-    
     def run(self, **kwargs) -> dict[str, object]:
 
         tag_strings = kwargs.get("tags", [])
+        default_value = kwargs.get("default_value", 1.0)
+        normalize = kwargs.get("normalize_tags", True)
         result_tags = []
         for tag_string in tag_strings:
             if not isinstance(tag_string, str):
                 raise ValueError("Tags must be a list of strings")
-            tags = [self.__parse_tag(tag, kwargs.get("default_value", 1.0)) for tag in tag_string.split(",")]
-            result_tags.append(dict(tags))
+            result_tags.append(parse_tags(tag_string, default_value, normalize))
 
         return {
             "tags": result_tags
@@ -293,6 +256,9 @@ class LoadTagsFromStringsNode(BaseNode):
 
 
 class LoadTagsFromFilesNode(BaseNode):
+    execution_policy = "process"
+    split_inputs = ("files",)
+
     def __init__(self):
         super().__init__()
         self.set_default_input("on_missing_files", "error")
@@ -325,31 +291,6 @@ class LoadTagsFromFilesNode(BaseNode):
         return "Tags"
     
 
-    def __parse_tag(self, tag: str, default_value = 1.0) -> tuple[str, float]:
-
-        tag = tag.strip()
-
-        if not tag.startswith("(") or not tag.endswith(")"):
-            return tag, default_value
-        
-        # drop '(' and ')' if are present
-        while tag.startswith("(") and tag.endswith(")"):
-            tag = tag[1:-1]
-            default_value *= 1.2
-
-        # if ends with :float_str, extract the float and use it as value
-        if tag.endswith(":"):
-            return normalize_tag(tag[:-1]), default_value
-        
-        if ":" in tag:
-            tag, value = tag.split(":")
-            try:
-                value = float(value)
-            except ValueError:
-                value = default_value
-
-            return tag, normalize_tag(value)
-    
     def show_custom_ui(self, parent: int | str):
         dpg.add_text("<deprecated> Use Load Tags From Strings instead")
         return super().show_custom_ui(parent)
@@ -363,6 +304,7 @@ class LoadTagsFromFilesNode(BaseNode):
         other_files = []
 
         default_value = kwargs.get("default_value", 1.0)
+        normalize = kwargs.get("normalize_tags", True)
 
         for file in files:
             if not os.path.exists(file):
@@ -378,14 +320,7 @@ class LoadTagsFromFilesNode(BaseNode):
                 other_files.append(file)
 
             with open(file, "r") as f:
-                # split by new line and by comma
-                tags = f.read().split("\n")
-                tags = [tag.split(",") for tag in tags]
-                # flatten the list
-                tags = [tag for sublist in tags for tag in sublist]
-                tags = [self.__parse_tag(tag, default_value) for tag in tags]
-            
-            files_tags.append(dict(tags))
+                files_tags.append(parse_tags(f.read(), default_value, normalize))
 
         return {
             "files": other_files,
@@ -393,15 +328,18 @@ class LoadTagsFromFilesNode(BaseNode):
         }
 
 class FilterTagsByValueNode(BaseNode):
+    split_inputs = ("tags",)
+
     def __init__(self):
         super().__init__()
         self.set_default_input("tag_value", 0)
         self.set_default_input("filter_mode", "less")
+        self.__outputs = _ConnectedOutputs(self)
 
     @property
     def input_definitions(self) -> dict[str, AttributeDefinition]:
         return {
-            "tags": ListAttributeDefinition(DictAttributeDefinition(key_type=StringAttributeDefinition(), value_type=FloatAttributeDefinition())),
+            "tags": tags_attribute_definition(),
             "tag_value": FloatAttributeDefinition(),
             "filter_mode": ComboAttributeDefinition(lambda: ["greater", "less", "equal", "not equal"], allow_custom=False)
         }
@@ -411,6 +349,8 @@ class FilterTagsByValueNode(BaseNode):
         return {
             "remaining_tags": ListAttributeDefinition(DictAttributeDefinition(key_type=StringAttributeDefinition(), value_type=FloatAttributeDefinition())),
             "filtered_tags": ListAttributeDefinition(DictAttributeDefinition(key_type=StringAttributeDefinition(), value_type=FloatAttributeDefinition())),
+            "remaining_tag_matrix": AttributeDefinition(type_name="tag_matrix"),
+            "filtered_tag_matrix": AttributeDefinition(type_name="tag_matrix"),
         }
     
     @classmethod
@@ -422,38 +362,24 @@ class FilterTagsByValueNode(BaseNode):
         return "Tags"
     
     def run(self, **kwargs) -> dict[str, object]:
-        tags_list = kwargs.get("tags", [])
-        filter_mode = kwargs.get("filter_mode", "less")
-
-        remaining_tags_list = []
-        filtered_tags_list = []
-
-        for tags in tags_list:
-            filtered_tags = {}
-            remaining_tags = {}
-            for tag, value in tags.items():
-                if filter_mode == "greater" and value > kwargs.get("tag_value", 0):
-                    filtered_tags[tag] = value
-                elif filter_mode == "less" and value < kwargs.get("tag_value", 0):
-                    filtered_tags[tag] = value
-                elif filter_mode == "equal" and value == kwargs.get("tag_value", 0):
-                    filtered_tags[tag] = value
-                elif filter_mode == "not equal" and value != kwargs.get("tag_value", 0):
-                    filtered_tags[tag] = value
-                else:
-                    remaining_tags[tag] = value
-
-            remaining_tags_list.append(remaining_tags)
-            filtered_tags_list.append(filtered_tags)
+        tags = kwargs.get("tags", [])
+        matrix = TagMatrix.from_any(tags)
+        filtered = compare(matrix.values, kwargs.get("filter_mode", "less"), kwargs.get("tag_value", 0))
+        remaining = matrix.select_entries(~filtered)
+        filtered = matrix.select_entries(filtered)
+        given_matrix = isinstance(tags, TagMatrix)
 
         return {
-            "remaining_tags": remaining_tags_list,
-            "filtered_tags": filtered_tags_list
+            "remaining_tags": self.__outputs.tags("remaining_tags", remaining, given_matrix),
+            "filtered_tags": self.__outputs.tags("filtered_tags", filtered, given_matrix),
+            "remaining_tag_matrix": remaining,
+            "filtered_tag_matrix": filtered,
         }
 
-                    
 
 class FilterFilesByTagNode(BaseNode):
+    split_inputs = ("images", "tags")
+
     def __init__(self):
 
         super().__init__()
@@ -461,13 +387,14 @@ class FilterFilesByTagNode(BaseNode):
         self.set_default_input("tag_key", "tag")
         self.set_default_input("tag_value", 0)
         self.set_default_input("filter_mode", "less")
+        self.__outputs = _ConnectedOutputs(self)
 
 
     @property
     def input_definitions(self) -> dict[str, AttributeDefinition]:
         return {
             "images": MultiFileAttributeDefinition(),
-            "tags": ListAttributeDefinition(DictAttributeDefinition(key_type=StringAttributeDefinition(), value_type=FloatAttributeDefinition())),
+            "tags": tags_attribute_definition(),
             "tag_key": StringAttributeDefinition(),
             "tag_value": FloatAttributeDefinition(),
             "filter_mode": ComboAttributeDefinition(lambda: ["greater", "less", "equal", "not equal"], allow_custom=False)
@@ -480,6 +407,8 @@ class FilterFilesByTagNode(BaseNode):
             "remaining_images_tags": ListAttributeDefinition(DictAttributeDefinition(key_type=StringAttributeDefinition(), value_type=FloatAttributeDefinition())),
             "filtered_images": MultiFileAttributeDefinition(),
             "filtered_images_tags": ListAttributeDefinition(DictAttributeDefinition(key_type=StringAttributeDefinition(), value_type=FloatAttributeDefinition())),
+            "remaining_images_tag_matrix": AttributeDefinition(type_name="tag_matrix"),
+            "filtered_images_tag_matrix": AttributeDefinition(type_name="tag_matrix"),
         }
     
     @classmethod
@@ -493,7 +422,7 @@ class FilterFilesByTagNode(BaseNode):
     def run(self, **kwargs) -> dict[str, object]:
 
         images = kwargs.get("images", [])
-        tags = kwargs.get("tags", {})
+        tags = kwargs.get("tags", [])
 
         if len(images) != len(tags):
             raise ValueError("Images and tags must have the same length")
@@ -502,34 +431,91 @@ class FilterFilesByTagNode(BaseNode):
         tag_value = kwargs.get("tag_value", 0)
         filter_mode = kwargs.get("filter_mode", "less")
 
-        remaining_images = []
-        remaining_images_tags = []
-        filtered_images = []
-        filtered_images_tags = []
-
-        for image, tag in zip(images, tags):
-            if tag_key not in tag:
-                raise ValueError(f"Tag key {tag_key} not found in tags")
-
-            if filter_mode == "greater" and tag[tag_key] > tag_value:
-                filtered_images.append(image)
-                filtered_images_tags.append(tag)
-            elif filter_mode == "less" and tag[tag_key] < tag_value:
-                filtered_images.append(image)
-                filtered_images_tags.append(tag)
-            elif filter_mode == "equal" and tag[tag_key] == tag_value:
-                filtered_images.append(image)
-                filtered_images_tags.append(tag)
-            elif filter_mode == "not equal" and tag[tag_key] != tag_value:
-                filtered_images.append(image)
-                filtered_images_tags.append(tag)
+        # the list outputs of dictionaries are selected from the list, the matrix outputs from the matrix
+        matrix = TagMatrix.from_any(tags)
+        values = matrix.column(tag_key)
+        if np.isnan(values).any():
+            raise ValueError(f"Tag key {tag_key} not found in tags")
+
+        filtered = compare(values, filter_mode, tag_value)
+        filtered_list = filtered.tolist()
+        given_matrix = isinstance(tags, TagMatrix)
+
+        def select(keep: bool, tags_output: str) -> tuple[list, list | None, TagMatrix]:
+            selected_images = [image for image, is_filtered in zip(images, filtered_list) if is_filtered == keep]
+            selected_matrix = matrix.select_rows(filtered == keep)
+            if given_matrix:
+                selected_tags = self.__outputs.tags(tags_output, selected_matrix, True)
             else:
-                remaining_images.append(image)
-                remaining_images_tags.append(tag)
+                selected_tags = [tag for tag, is_filtered in zip(tags, filtered_list) if is_filtered == keep]
+            return selected_images, selected_tags, selected_matrix
+
+        remaining_images, remaining_images_tags, remaining_images_tag_matrix = select(False, "remaining_images_tags")
+        filtered_images, filtered_images_tags, filtered_images_tag_matrix = select(True, "filtered_images_tags")
 
         return {
             "remaining_images": remaining_images,
             "remaining_images_tags": remaining_images_tags,
             "filtered_images": filtered_images,
-            "filtered_images_tags": filtered_images_tags
+            "filtered_images_tags": filtered_images_tags,
+            "remaining_images_tag_matrix": remaining_images_tag_matrix,
+            "filtered_images_tag_matrix": filtered_images_tag_matrix,
+        }
+
+
+class ConvertTagsToMatrixNode(BaseNode):
+    def __init__(self):
+        super().__init__()
+        self.set_default_input("tags", [])
+
+    @property
+    def input_definitions(self) -> dict[str, AttributeDefinition]:
+        return {
+            "tags": tags_attribute_definition()
+        }
+    
+    @property
+    def output_definitions(self) -> dict[str, AttributeDefinition]:
+        return {
+            "tag_matrix": AttributeDefinition(type_name="tag_matrix")
+        }
+    
+    @classmethod
+    def name(cls) -> str:
+        return "Convert Tags To Matrix"
+    
+    @classmethod
+    def category(cls) -> str:
+        return "Tags"
+    
+    def run(self, **kwargs) -> dict[str, object]:
+        return {
+            "tag_matrix": TagMatrix.from_any(kwargs.get("tags", []))
+        }
+
+
+class ConvertMatrixToTagsNode(BaseNode):
+    @property
+    def input_definitions(self) -> dict[str, AttributeDefinition]:
+        return {
+            "tag_matrix": tags_attribute_definition()
+        }
+    
+    @property
+    def output_definitions(self) -> dict[str, AttributeDefinition]:
+        return {
+            "tags": ListAttributeDefinition(DictAttributeDefinition(key_type=StringAttributeDefinition(), value_type=FloatAttributeDefinition()))
+        }
+    
+    @classmethod
+    def name(cls) -> str:
+        return "Convert Matrix To Tags"
+    
+    @classmethod
+    def category(cls) -> str:
+        return "Tags"
+    
+    def run(self, **kwargs) -> dict[str, object]:
+        return {
+            "tags": TagMatrix.from_any(kwargs.get("tag_matrix", [])).to_dicts()
         }
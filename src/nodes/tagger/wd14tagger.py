@@ -11,6 +11,8 @@ import pandas as pd
 from typing import Generator
 
 from ...settings import SETTINGS
+from ...helpers import load_image, onnx_session_options
+from .tag_matrix import TagMatrix
 
 
 def _make_square(img, target_size):
@@ -45,7 +47,7 @@ def _load_model(model_repo: str,
                 ) -> rt.InferenceSession:
     
     path = huggingface_hub.hf_hub_download(repo_id=model_repo, filename=model_filename, cache_dir=cache_dir)
-    return rt.InferenceSession(path, providers=[device])
+    return rt.InferenceSession(path, sess_options=onnx_session_options(), providers=[device])
 
 def _load_labels(model_repo: str, label_filename: str) -> list[str]:
     path = huggingface_hub.hf_hub_download(model_repo, label_filename )
@@ -57,16 +59,7 @@ def _load_labels(model_repo: str, label_filename: str) -> list[str]:
     return tag_names, rating_indexes, general_indexes, character_indexes
 
 
-def _predict(
-    image: PIL.Image.Image,
-    model: rt.InferenceSession,
-    general_threshold: float,
-    character_threshold: float,
-    tag_names: list[str],
-    rating_indexes: list[np.int64],
-    general_indexes: list[np.int64],
-    character_indexes: list[np.int64],
-):
+def _predict_probabilities(image: PIL.Image.Image, model: rt.InferenceSession) -> np.ndarray:
     
     _, height, width, _ = model.get_inputs()[0].shape
 
@@ -87,9 +80,22 @@ def _predict(
 
     input_name = model.get_inputs()[0].name
     label_name = model.get_outputs()[0].name
-    probs = model.run([label_name], {input_name: image})[0]
+    return model.run([label_name], {input_name: image})[0][0]
 
-    labels = list(zip(tag_names, probs[0].astype(float)))
+
+def _predict(
+    image: PIL.Image.Image,
+    model: rt.InferenceSession,
+    general_threshold: float,
+    character_threshold: float,
+    tag_names: list[str],
+    rating_indexes: list[np.int64],
+    general_indexes: list[np.int64],
+    character_indexes: list[np.int64],
+):
+    probs = _predict_probabilities(image, model)
+
+    labels = list(zip(tag_names, probs.astype(float)))
 
     # First 4 labels are actually ratings: pick one with argmax
     ratings_names = [labels[i] for i in rating_indexes]
@@ -135,7 +141,7 @@ class Wd14Tagger:
 
     def __convert_image(self, image):
         if isinstance(image, str):
-            image = Image.open(image).convert("RGB")
+            image = load_image(image, "RGB")
         elif isinstance(image, bytes):
             image = Image.open(io.BytesIO(image)).convert("RGB")
         elif isinstance(image, Image.Image):
@@ -163,6 +169,46 @@ class Wd14Tagger:
         
 
 
+    def probabilities(self, images) -> Generator[np.ndarray, None, None]:
+        '''
+        Yields the probability of every label for each image.
+        '''
+        if not isinstance(images, list):
+            images = [images]
+
+        try:
+            for image in images:
+                yield _predict_probabilities(self.__convert_image(image), self.model)
+        except Exception as e:
+            raise ValueError(f"Error while tagging image: {e}")
+
+    def tag_matrix(self, probabilities: np.ndarray | list[np.ndarray]) -> TagMatrix:
+        '''
+        Converts an images x labels probability array into the tags tags() would yield, without building dictionaries per image.
+        Callers with many images pass them in chunks and join the results with TagMatrix.concatenate().
+        '''
+        tag_names, rating_indexes, general_indexes, character_indexes = self.labels
+        rating_indexes = np.asarray(rating_indexes, dtype=np.int64)
+        # same order as tags(): the rating, then characters, then general tags
+        order = np.concatenate((rating_indexes, np.asarray(character_indexes, dtype=np.int64), np.asarray(general_indexes, dtype=np.int64)))
+        positions = np.empty(len(tag_names), dtype=np.int64)
+        positions[order] = np.arange(len(order))
+
+        # thresholded in label order and in the model's float32, the dense chunk is not copied again
+        probabilities = np.asarray(probabilities, dtype=np.float32).reshape(-1, len(tag_names))
+        thresholds = np.full(len(tag_names), np.inf)
+        thresholds[character_indexes] = self.character_treshold
+        thresholds[general_indexes] = self.general_treshold
+        mask = probabilities > thresholds
+        if len(rating_indexes) > 0 and len(probabilities) > 0:
+            mask[np.arange(len(probabilities)), rating_indexes[np.argmax(probabilities[:, rating_indexes], axis=1)]] = True
+
+        rows, labels = np.nonzero(mask)
+        columns = positions[labels]
+        # entries of a row in the order of tags(), from_entries keeps the order within a row
+        entries = np.lexsort((columns, rows))
+        return TagMatrix.from_entries(len(probabilities), [tag_names[index] for index in order], rows[entries], columns[entries], probabilities[rows[entries], labels[entries]])
+
     def tags(self, images) -> Generator[dict, None, None]:
         if isinstance(images, list):
             images = [self.__convert_image(image) for image in images]
@@ -1,6 +1,6 @@
 from ...graph import BaseNode, AttributeDefinition, BoolenAttributeDefinition, FloatAttributeDefinition, ComboAttributeDefinition, FileAttributeDefinition
 from ...settings import SETTINGS
-from .wd14tagger import Wd14Tagger
+from ...model_manager import MODEL_MANAGER
 
 import requests
 
@@ -18,6 +18,7 @@ class Wd14TaggerNode(BaseNode):
         self.models = None
         self.tagger = None
         self.unload_model_button = None
+        self._on_graph_finished += lambda: MODEL_MANAGER.release(self)
     
     def available_models(self):
         if self.models is not None:
@@ -61,12 +62,18 @@ class Wd14TaggerNode(BaseNode):
         return {
             "out": AttributeDefinition(type_name="tagger")
         }
+
+    @property
+    def preload_init(self) -> bool:
+        return True
     
     def unload_model(self):
         if self.tagger is not None:
             self.tagger.unload_model()
             self.tagger = None
-        dpg.hide_item(self.unload_model_button)
+        MODEL_MANAGER.unregister(self)
+        if self.unload_model_button is not None and dpg.does_item_exist(self.unload_model_button):
+            dpg.hide_item(self.unload_model_button)
     
     def show_custom_ui(self, parent: int | str) -> int | str | None:
         self.unload_model_button = dpg.add_button(label="Unload Model", callback=self.unload_model, parent=parent, show=False)
@@ -88,7 +95,8 @@ class Wd14TaggerNode(BaseNode):
             same_character_threshold = self.tagger.character_treshold == self.static_inputs["character_threshold"]
             same_device = self.tagger.device == self.static_inputs["device"]
             same_include_rating = self.tagger.include_rating == self.static_inputs["include_rating"]
-            if same_model and same_general_threshold and same_character_threshold and same_device and same_include_rating:
+            # use() fails if the model was unloaded for the memory budget meanwhile
+            if same_model and same_general_threshold and same_character_threshold and same_device and same_include_rating and MODEL_MANAGER.use(self):
                 return
             
         general_threshold = self.static_inputs["general_threshold"]
@@ -96,13 +104,19 @@ class Wd14TaggerNode(BaseNode):
         device = self.static_inputs["device"]
         include_rating = self.static_inputs["include_rating"]
         cache_dir = self.static_inputs["cache_dir"]
-        self.tagger = Wd14Tagger(
-            model_name=tagger, 
-            general_treshold=general_threshold, 
-            character_treshold=character_threshold, 
-            device=device, 
-            include_rating=include_rating,
-            cache_dir=cache_dir)
+        # imported on first load, so processes that only run the tag nodes of this package skip onnxruntime
+        from .wd14tagger import Wd14Tagger
+        with MODEL_MANAGER.measure() as load:
+            self.tagger = Wd14Tagger(
+                model_name=tagger, 
+                general_treshold=general_threshold, 
+                character_treshold=character_threshold, 
+                device=device, 
+                include_rating=include_rating,
+                cache_dir=cache_dir)
+        MODEL_MANAGER.register(self, tagger, self.unload_model, load.ram, load.vram)
+        if self.unload_model_button is not None and dpg.does_item_exist(self.unload_model_button):
+            dpg.show_item(self.unload_model_button)
 
     def run(self, **kwargs) -> dict[str, object]:
         return {"out": self.tagger}
\ No newline at end of file
@@ -0,0 +1,365 @@
+'''
+Runs a graph without the GUI.
+
+    python -m src.runner example-workflows/workflow.yaml
+
+With --shards the list produced by one node, for example the files of a Files From Folder node,
+is split into consecutive shards and the graph runs once per shard in its own worker process.
+The values of the Graph Output nodes are merged in shard order.
+
+    python -m src.runner workflow.yaml --shards 8 --shard-node "Files From Folder_28" --output results.json
+'''
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import time
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait
+
+import dearpygui.dearpygui as dpg
+
+from src.graph.graph import Graph
+from src.graph.execution import execute_node
+from src.settings import SETTINGS
+from src.nodes.graph.graph_node import GraphInputNode, GraphOutputNode
+from src.nodes.progress_node import ProgressMonitor, format_progress
+
+
+class TerminalProgress:
+    '''
+    Prints the progress of running nodes, sampled from the same counters as the GUI progress bars.
+    '''
+
+    def __init__(self, graph: Graph, stream=sys.stderr, interval: float = 0.1):
+        self.graph = graph
+        self.stream = stream
+        self.is_tty = stream.isatty()
+        # without a terminal every update becomes a line of its own
+        self.monitor = ProgressMonitor(interval if self.is_tty else max(interval, 1.0))
+        self.__last_line = ""
+        self.__last_print = 0.0
+
+    def __node_name(self, node) -> str:
+        for name, graph_node in self.graph.nodes.items():
+            if graph_node is node:
+                return name
+        return node.name()
+
+    def update(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self.__last_print < self.monitor.interval:
+            return
+        self.__last_print = now
+
+        parts = [f"{self.__node_name(node)}: {format_progress(current, total, show_eta, eta)}" for node, current, total, show_eta, eta in self.monitor.sample()]
+        line = " | ".join(parts)
+        if line == self.__last_line:
+            return
+
+        if self.is_tty:
+            width = shutil.get_terminal_size().columns - 1
+            self.stream.write("\r" + line[:width].ljust(min(width, len(self.__last_line))))
+        elif line != "":
+            self.stream.write(line + "\n")
+        self.stream.flush()
+        self.__last_line = line
+
+    def close(self):
+        if self.is_tty and self.__last_line != "":
+            self.stream.write("\n")
+            self.stream.flush()
+
+
+def load_graph(path: str) -> Graph:
+    graph = Graph()
+    graph.register_modules("src/nodes")
+    graph.register_modules("custom_nodes")
+    graph.load_from_file(path)
+    return graph
+
+
+def execute_graph(graph: Graph, show_progress: bool = True, interval: float = 0.1) -> list[tuple[str, Exception]]:
+    '''
+    Returns:
+        list: node name and error of every node that failed
+    '''
+    errors = []
+    graph.on_error += lambda error: errors.append(("graph", error))
+    for name, node in graph.nodes.items():
+        node._on_error += lambda error, name=name: errors.append((name, error))
+
+    progress = TerminalProgress(graph, interval=interval) if show_progress else None
+    future = graph.run()
+    try:
+        while not future.done():
+            if progress is not None:
+                progress.update()
+            wait([future], timeout=interval)
+    except KeyboardInterrupt:
+        graph.stop()
+        wait([future])
+    finally:
+        if progress is not None:
+            progress.update(force=True)
+            progress.close()
+    return errors
+
+
+def run_graph(path: str, show_progress: bool = True, interval: float = 0.1) -> list[tuple[str, Exception]]:
+    '''
+    Returns:
+        list: node name and error of every node that failed
+    '''
+    return execute_graph(load_graph(path), show_progress, interval)
+
+
+def graph_outputs(graph: Graph) -> dict[str, object]:
+    '''
+    Returns the values of the Graph Output nodes that ran, by their name.
+    '''
+    outputs = {}
+    for node in graph.nodes.values():
+        if isinstance(node, GraphOutputNode):
+            if node.has_out():
+                outputs[node.static_inputs.get("name", "")] = node.get_out()
+    return outputs
+
+
+def find_shard_node(graph: Graph, shard_node: str | None) -> str:
+    '''
+    Returns the graph name of the node whose output is sharded, given its graph name or the name of a Graph Input node.
+    Without a name the only Graph Input node of the graph is used.
+    '''
+    if shard_node is not None and shard_node in graph.nodes:
+        return shard_node
+
+    inputs = [name for name, node in graph.nodes.items() if isinstance(node, GraphInputNode) and (shard_node is None or node.static_inputs.get("name") == shard_node)]
+    if len(inputs) == 1:
+        return inputs[0]
+    if shard_node is None:
+        raise ValueError("The graph does not have exactly one Graph Input node, select the node to shard with --shard-node")
+    raise ValueError(f"Node {shard_node} not found")
+
+
+def split_shards(values: list, shards: int) -> list[tuple[int, int]]:
+    '''
+    Returns the start and end of shards consecutive slices of values with sizes differing by at most one.
+    '''
+    size, remainder = divmod(len(values), shards)
+    bounds = []
+    start = 0
+    for index in range(shards):
+        end = start + size + (1 if index < remainder else 0)
+        bounds.append((start, end))
+        start = end
+    return bounds
+
+
+def merge_outputs(shard_outputs: list[dict[str, object]]) -> dict[str, object]:
+    '''
+    Concatenates list outputs in shard order, any other output becomes the list of its per shard values.
+    '''
+    merged = {}
+    names = []
+    for outputs in shard_outputs:
+        names += [name for name in outputs if name not in names]
+    for name in names:
+        values = [outputs[name] for outputs in shard_outputs if name in outputs]
+        if all(isinstance(value, list) for value in values):
+            merged[name] = [item for value in values for item in value]
+        else:
+            merged[name] = values
+    return merged
+
+
+# thread pools of numpy and onnxruntime read these when they are imported
+THREAD_VARIABLES = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS")
+
+
+@contextmanager
+def worker_environment(threads: int):
+    '''
+    Sets the thread counts in the environment while the worker processes are spawned.
+    Spawned workers import the graph modules before any of their code runs, so an initializer would be too late.
+    '''
+    previous = {name: os.environ.get(name) for name in THREAD_VARIABLES}
+    os.environ.update({name: str(threads) for name in THREAD_VARIABLES})
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def pin_worker(index: int, shards: int, gpu: str | None, threads: int, node_workers: int = 0):
+    '''
+    Gives worker index its own cores, thread counts and GPU, called before any model is loaded.
+    '''
+    if gpu is not None:
+        # CUDA reads it when the first session is created, not on import
+        os.environ["CUDA_VISIBLE_DEVICES"] = gpu
+
+    if hasattr(os, "sched_setaffinity"):
+        cores = sorted(os.sched_getaffinity(0))
+        if len(cores) >= shards * threads:
+            cores = cores[index * threads:(index + 1) * threads]
+            # threads started on import keep their affinity, pin every thread of the process
+            tasks = [int(task) for task in os.listdir("/proc/self/task")] if os.path.isdir("/proc/self/task") else [0]
+            for task in tasks:
+                try:
+                    os.sched_setaffinity(task, cores)
+                except OSError:
+                    pass
+
+    SETTINGS.set("onnx_threads", threads)
+    if node_workers > 0:
+        SETTINGS.set("process_workers", node_workers)
+
+
+def inject_shard(graph: Graph, shard_node: str, shard_result: dict):
+    '''
+    Replaces the outputs of shard_node with the values of its shard, the rest of the graph runs unchanged.
+    A Graph Input node gets the shard as its value, any other node is replaced by a Graph Input node per connected output.
+    '''
+    node = graph.nodes[shard_node]
+    if isinstance(node, GraphInputNode):
+        node.set_in(shard_result.get("in"))
+        return
+
+    inputs = {}
+    for connection in graph.get_output_connections_for_node(shard_node):
+        if connection.output_name not in inputs:
+            inputs[connection.output_name] = GraphInputNode()
+            inputs[connection.output_name].set_static_input("name", f"{shard_node}.{connection.output_name}")
+            inputs[connection.output_name].set_in(shard_result.get(connection.output_name))
+            graph.add_node(inputs[connection.output_name])
+        # replaces the connection from shard_node
+        graph.add_connection(inputs[connection.output_name], "in", connection.input_node_name, connection.input_name)
+    graph.remove_node(shard_node)
+
+
+def _run_shard(path: str, index: int, shards: int, shard_node: str, shard_result: dict, provider: str | None, gpu: str | None,
+               threads: int, node_workers: int) -> tuple[dict, list]:
+    pin_worker(index, shards, gpu, threads, node_workers)
+
+    dpg.create_context()
+    try:
+        graph = load_graph(path)
+        inject_shard(graph, shard_node, shard_result)
+
+        if provider is not None:
+            for graph_node in graph.nodes.values():
+                if "device" in graph_node.static_inputs and str(graph_node.static_inputs["device"]).endswith("ExecutionProvider"):
+                    graph_node.set_static_input("device", provider)
+
+        errors = execute_graph(graph, show_progress=False)
+        return graph_outputs(graph), [(f"shard {index}: {name}", error) for name, error in errors]
+    finally:
+        dpg.destroy_context()
+
+
+def run_sharded(path: str, shards: int, shard_node: str | None = None, shard_output: str | None = None,
+                providers: list[str] | None = None, gpus: list[str] | None = None, threads: int = 0, node_workers: int = 0) -> tuple[dict, list]:
+    '''
+    Runs the graph once per shard of the list output of shard_node in its own worker process.
+    Providers and GPUs are assigned to the workers round robin.
+    node_workers sets the size of the process pool of the nodes in every shard, 0 keeps the Node Workers setting.
+
+    Returns:
+        tuple: merged Graph Output values and node name and error of every node that failed
+    '''
+    graph = load_graph(path)
+    shard_node = find_shard_node(graph, shard_node)
+    node = graph.nodes[shard_node]
+    if len(graph.get_input_connections_for_node(shard_node)) > 0:
+        raise ValueError(f"{shard_node} must not have connected inputs to be sharded")
+
+    node.init()
+    result = execute_node(node, dict(node.default_inputs))
+    if shard_output is None:
+        list_outputs = [name for name, value in result.items() if isinstance(value, list)]
+        if len(list_outputs) != 1:
+            raise ValueError(f"Select the output of {shard_node} to shard with --shard-output, one of {', '.join(result)}")
+        shard_output = list_outputs[0]
+    values = result.get(shard_output)
+    if not isinstance(values, list):
+        raise ValueError(f"Output {shard_output} of {shard_node} is not a list")
+
+    shards = max(1, min(shards, len(values)))
+    if threads <= 0:
+        threads = max(1, (os.cpu_count() or 1) // shards)
+
+    def shard_of(start: int, end: int) -> dict:
+        # outputs of the same length, such as files and their tags, are split together
+        return {name: value[start:end] if isinstance(value, list) and len(value) == len(values) else value for name, value in result.items()}
+
+    print(f"Running {len(values)} items of {shard_node}.{shard_output} in {shards} shards with {threads} threads each", file=sys.stderr)
+    shard_outputs = [None] * shards
+    errors = []
+    with worker_environment(threads), ProcessPoolExecutor(max_workers=shards, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = {}
+        for index, (start, end) in enumerate(split_shards(values, shards)):
+            provider = providers[index % len(providers)] if providers else None
+            gpu = gpus[index % len(gpus)] if gpus else None
+            future = pool.submit(_run_shard, path, index, shards, shard_node, shard_of(start, end), provider, gpu, threads, node_workers)
+            futures[future] = index
+
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                shard_outputs[index], shard_errors = future.result()
+                errors += shard_errors
+            except Exception as e:
+                shard_outputs[index] = {}
+                errors.append((f"shard {index}", e))
+            print(f"Shard {index} finished", file=sys.stderr)
+
+    return merge_outputs(shard_outputs), errors
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Run a graph without the GUI")
+    parser.add_argument("graph", help="path of the graph yaml file")
+    parser.add_argument("--no-progress", action="store_true", help="do not print progress")
+    parser.add_argument("--progress-interval", type=float, default=0.1, help="seconds between progress updates")
+    parser.add_argument("--shards", type=int, default=1, help="split the list of --shard-node between this many worker processes")
+    parser.add_argument("--shard-node", help="node whose list output is sharded, a node name or the name of a Graph Input node")
+    parser.add_argument("--shard-output", help="output of --shard-node to shard, needed if it has several list outputs")
+    parser.add_argument("--providers", help="comma separated ONNX execution providers assigned to the shards round robin")
+    parser.add_argument("--gpus", help="comma separated CUDA devices assigned to the shards round robin")
+    parser.add_argument("--threads", type=int, default=0, help="cores per shard, 0 divides all cores between the shards")
+    parser.add_argument("--node-workers", type=int, default=0, help="worker processes of the nodes in each shard, 0 keeps the Node Workers setting")
+    parser.add_argument("--output", help="write the merged Graph Output values to this json file")
+    args = parser.parse_args(argv)
+
+    # nodes may touch dpg items, a context without a viewport keeps those calls valid
+    dpg.create_context()
+    try:
+        if args.shards > 1:
+            providers = args.providers.split(",") if args.providers else None
+            gpus = args.gpus.split(",") if args.gpus else None
+            outputs, errors = run_sharded(args.graph, args.shards, args.shard_node, args.shard_output, providers, gpus, args.threads, args.node_workers)
+        else:
+            graph = load_graph(args.graph)
+            errors = execute_graph(graph, not args.no_progress, args.progress_interval)
+            outputs = graph_outputs(graph)
+    finally:
+        dpg.destroy_context()
+
+    if args.output is not None:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(outputs, file, indent=1, default=str)
+
+    for name, error in errors:
+        print(f"{name}: {error}", file=sys.stderr)
+    return 1 if len(errors) > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,166 @@
+import os
+import hashlib
+import threading
+from typing import Callable
+
+import numpy as np
+import PIL.Image as Image
+import dearpygui.dearpygui as dpg
+
+from .settings import SETTINGS
+from .helpers import pillow_from_any_string, default_thumbnail_size
+
+
+def _grid_size(count: int) -> tuple[int, int]:
+    if count <= 1:
+        return (1, 1)
+    elif count <= 4:
+        return (2, 2)
+    elif count <= 6:
+        return (3, 2)
+    elif count <= 9:
+        return (3, 3)
+    return (4, 4)
+
+
+class ThumbnailService:
+    '''
+    Builds display textures on a background thread.
+
+    Image files are decoded at reduced resolution and their thumbnails are cached on disk,
+    keyed by path and modification time. Requests for the same texture are coalesced, so
+    only the latest one is rendered and display nodes never wait for image decoding.
+    '''
+
+    MAX_IMAGES = 16
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        self.__condition = threading.Condition()
+        self.__pending: dict[int | str, tuple] = {}
+        self.__buffers: dict[tuple[int, int], np.ndarray] = {}
+        self.__thread = None
+
+    def __ensure_worker(self):
+        if self.__thread is None or not self.__thread.is_alive():
+            self.__thread = threading.Thread(target=self.__worker, name="thumbnails", daemon=True)
+            self.__thread.start()
+
+    def __cache_path(self, path: str, size: tuple[int, int]) -> str:
+        stat = os.stat(path)
+        key = f"{os.path.abspath(path)}:{stat.st_mtime_ns}:{stat.st_size}:{size[0]}x{size[1]}"
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], digest + ".png")
+
+    def __load_path(self, path: str, size: tuple[int, int]) -> Image.Image:
+        cache_path = self.__cache_path(path, size)
+        if os.path.exists(cache_path):
+            try:
+                image = Image.open(cache_path)
+                image.load()
+                return image
+            except OSError:
+                pass
+
+        image = Image.open(path)
+        # decode jpegs at the smallest scale that still covers the thumbnail
+        image.draft("RGB", size)
+        image.thumbnail(size)
+
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            image.save(cache_path, format="PNG", compress_level=1)
+        except OSError:
+            pass
+        return image
+
+    def thumbnail(self, image: str | Image.Image, size: tuple[int, int] = default_thumbnail_size) -> Image.Image | None:
+        '''
+        Returns an image that fits in size, keeping the aspect ratio.
+        '''
+        if isinstance(image, str):
+            if os.path.isfile(image):
+                return self.__load_path(image, size)
+            image = pillow_from_any_string(image)
+            if image is None:
+                return None
+        elif not isinstance(image, Image.Image):
+            return None
+
+        image = image.copy()
+        image.thumbnail(size)
+        return image
+
+    def render(self, images: list[str | Image.Image], size: tuple[int, int] = default_thumbnail_size) -> Image.Image:
+        '''
+        Returns a RGBA image of size with up to 16 images laid out in a grid.
+        '''
+        images = images[:self.MAX_IMAGES]
+        columns, rows = _grid_size(len(images))
+        cell = (size[0] // columns, size[1] // rows) if len(images) > 1 else size
+
+        canvas = Image.new("RGBA", size, (0, 0, 0, 255))
+        offset_x = (size[0] - cell[0] * columns) // 2
+        offset_y = (size[1] - cell[1] * rows) // 2
+        for i, image in enumerate(images):
+            try:
+                thumbnail = self.thumbnail(image, cell)
+            except Exception:
+                # a broken image leaves its cell empty, the rest of the grid is still shown
+                if len(images) == 1:
+                    raise
+                continue
+            if thumbnail is None:
+                continue
+            if thumbnail.mode not in ("RGB", "RGBA"):
+                thumbnail = thumbnail.convert("RGBA")
+            x = offset_x + cell[0] * (i % columns) + (cell[0] - thumbnail.size[0]) // 2
+            y = offset_y + cell[1] * (i // columns) + (cell[1] - thumbnail.size[1]) // 2
+            canvas.paste(thumbnail, (x, y))
+        return canvas
+
+    def to_texture(self, image: Image.Image) -> np.ndarray:
+        '''
+        Converts a RGBA image into DPG texture data in a single pass, reusing one float buffer per texture size.
+        '''
+        size = image.size
+        buffer = self.__buffers.get(size)
+        if buffer is None:
+            buffer = self.__buffers[size] = np.empty(size[0] * size[1] * 4, dtype=np.float32)
+        pixels = np.asarray(image, dtype=np.uint8).reshape(-1)
+        np.multiply(pixels, np.float32(1.0 / 255.0), out=buffer, casting="unsafe")
+        return buffer
+
+    def submit(self, texture: int | str, images: list[str | Image.Image] | str | Image.Image, size: tuple[int, int] = default_thumbnail_size, on_error: Callable[[Exception], None] | None = None):
+        '''
+        Schedules rendering images into the dynamic texture. A newer request for the same texture replaces a pending one.
+        '''
+        if not isinstance(images, list):
+            images = [images]
+        with self.__condition:
+            self.__pending[texture] = (images[:self.MAX_IMAGES], tuple(size), on_error)
+            self.__ensure_worker()
+            self.__condition.notify()
+
+    def __worker(self):
+        while True:
+            with self.__condition:
+                while len(self.__pending) == 0:
+                    self.__condition.wait()
+                texture = next(iter(self.__pending))
+                images, size, on_error = self.__pending.pop(texture)
+
+            try:
+                image = self.render(images, size)
+                data = self.to_texture(image)
+                if dpg.does_item_exist(texture):
+                    dpg.set_value(texture, data)
+            except Exception as e:
+                if on_error is not None:
+                    try:
+                        on_error(e)
+                    except Exception:
+                        pass
+
+
+THUMBNAILS = ThumbnailService(os.path.join(SETTINGS.get("cache_dir", "cache"), "thumbnails"))
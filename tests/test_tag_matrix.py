@@ -0,0 +1,112 @@
+'''
+Compares the TagMatrix operations with the same operations on lists of tag dictionaries.
+'''
+import random
+
+import numpy as np
+import pytest
+
+from src.nodes.tagger.tag_matrix import TagMatrix
+
+
+def random_tags(images: int, seed: int, vocabulary: int = 12) -> list[dict[str, float]]:
+    rng = random.Random(seed)
+    words = [f"tag_{i}" for i in range(vocabulary)]
+    # few distinct values, so sorting has ties
+    return [{word: rng.choice([0.1, 0.25, 0.5, 0.75, 1.0]) for word in rng.sample(words, rng.randint(0, 8))} for _ in range(images)]
+
+
+def combine(value_mode: str, first: float, second: float) -> float:
+    return {
+        "sum": first + second,
+        "max": max(first, second),
+        "min": min(first, second),
+        "average": (first + second) / 2,
+        "replace": second,
+        "skip": second,
+    }[value_mode]
+
+
+def sort_dict(tags: dict[str, float], by: str, descending: bool) -> dict[str, float]:
+    key = (lambda item: item[1]) if by == "value" else (lambda item: item[0])
+    return dict(sorted(tags.items(), key=key, reverse=descending))
+
+
+def join_dicts(first: dict[str, float], second: dict[str, float], value_mode: str, position: str) -> dict[str, float]:
+    joined = {tag: combine(value_mode, first[tag], value) if tag in first else value for tag, value in second.items()}
+    only_first = {tag: value for tag, value in first.items() if tag not in second}
+    if position == "before":
+        joined = {**dict(reversed(only_first.items())), **joined}
+    else:
+        joined = {**joined, **only_first}
+    if position.startswith("alphabetical") or position.startswith("value"):
+        by, _, direction = position.partition(" ")
+        joined = sort_dict(joined, by, direction == "desc")
+    return joined
+
+
+def assert_same(matrix: TagMatrix, expected: list[dict[str, float]]):
+    result = matrix.to_dicts()
+    assert [list(tags) for tags in result] == [list(tags) for tags in expected]
+    for tags, expected_tags in zip(result, expected):
+        assert tags == pytest.approx(expected_tags)
+
+
+def test_round_trip():
+    tags = random_tags(50, 0)
+    assert_same(TagMatrix.from_dicts(tags), tags)
+
+
+@pytest.mark.parametrize("value_mode", ["sum", "max", "min", "average", "replace", "skip"])
+@pytest.mark.parametrize("position", ["before", "after", "alphabetical desc", "alphabetical asc", "value desc", "value asc"])
+def test_join(value_mode: str, position: str):
+    first = random_tags(50, 1)
+    second = random_tags(50, 2)
+    joined = TagMatrix.from_dicts(first).join(TagMatrix.from_dicts(second), value_mode, position)
+    assert_same(joined, [join_dicts(a, b, value_mode, position) for a, b in zip(first, second)])
+
+
+@pytest.mark.parametrize("by", ["value", "alphabetical"])
+@pytest.mark.parametrize("descending", [True, False])
+def test_sort_rows(by: str, descending: bool):
+    tags = random_tags(50, 3)
+    assert_same(TagMatrix.from_dicts(tags).sort_rows(by, descending), [sort_dict(item, by, descending) for item in tags])
+
+
+def test_sort_rows_long_image():
+    # one image much longer than the others sorts without the padded rows
+    tags = random_tags(50, 4) + [{f"tag_{i}": float(i % 7) for i in range(2000)}]
+    assert_same(TagMatrix.from_dicts(tags).sort_rows("value", True), [sort_dict(item, "value", True) for item in tags])
+
+
+def test_deduplicate():
+    rng = random.Random(5)
+    entries = [[(f"tag_{rng.randint(0, 5)}", rng.random()) for _ in range(rng.randint(0, 10))] for _ in range(50)]
+    vocabulary = [f"tag_{i}" for i in range(6)]
+    indptr = np.cumsum([0] + [len(row) for row in entries])
+    indices = [vocabulary.index(tag) for row in entries for tag, _ in row]
+    values = [value for row in entries for _, value in row]
+    matrix = TagMatrix(vocabulary, indptr, indices, values).deduplicate()
+    assert_same(matrix, [dict(row) for row in entries])
+
+
+def test_map_vocabulary_merges_tags():
+    tags = [{"a_b": 0.5, "c": 0.2, "a b": 0.7}, {"a b": 0.1}]
+    assert_same(TagMatrix.from_dicts(tags).map_vocabulary(lambda tag: tag.replace("_", " ")), [{"a b": 0.7, "c": 0.2}, {"a b": 0.1}])
+
+
+@pytest.mark.parametrize("keep_values", [True, False])
+def test_to_strings(keep_values: bool):
+    tags = random_tags(50, 6)
+    if keep_values:
+        expected = [", ".join(f"({tag}:{value})" for tag, value in item.items()) for item in tags]
+    else:
+        expected = [", ".join(item) for item in tags]
+    assert TagMatrix.from_dicts(tags).to_strings(keep_values) == expected
+
+
+def test_concatenate():
+    first = random_tags(20, 7)
+    second = random_tags(30, 8, vocabulary=20)
+    matrix = TagMatrix.concatenate([TagMatrix.from_dicts(first), TagMatrix.from_dicts(second)])
+    assert_same(matrix, first + second)